@@ -0,0 +1,89 @@
+"""
+Growth-model memory across worker processes: private copies vs shared memory maps.
+
+Run from the repository root (Linux; reads /proc/<pid>/smaps_rollup):
+
+    python -m benchmarks.bench_memory [--rows 5000] [--workers 1 4 8]
+
+A forest fitted on the 111-row training CSV is under 1 MB, so by default the
+model is refit on a jittered resample of ``--rows`` rows to stand in for a
+production-sized forest. For each worker count, that many fresh interpreters
+load the model and make one prediction, then hold it while their
+proportional set size (PSS, shared pages split between the processes that
+map them) is summed. "model" is that total minus the same number of idle
+workers that only imported ``growth_model``.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from growth_model import FEATURES, MODEL_CONFIG, load_or_train
+
+WORKER = ("import sys, growth_model; mode, dataset, directory = sys.argv[1:]; "
+          "m = None if mode == 'idle' else growth_model.load_or_train(dataset, directory=directory, "
+          "mmap=mode == 'mmap'); m is None or m.predict([[8, 1.8, 18, 2700, 0.12, 16.5, 2650]]); "
+          "print('ready', flush=True); sys.stdin.read()")
+
+
+def pss_kb(pid: int) -> int:
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            if line.startswith("Pss:"):
+                return int(line.split()[1])
+    raise RuntimeError(f"no Pss for {pid}")
+
+
+def total_pss(mode: str, workers: int, dataset: str, directory: str) -> float:
+    """Summed PSS (MB) of ``workers`` processes holding the model in ``mode``."""
+    procs = [subprocess.Popen([sys.executable, "-c", WORKER, mode, dataset, directory],
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+             for _ in range(workers)]
+    try:
+        for p in procs:
+            if p.stdout.readline().strip() != "ready":
+                raise RuntimeError(f"worker {p.pid} failed to load the model")
+        return sum(pss_kb(p.pid) for p in procs) / 1024
+    finally:
+        for p in procs:
+            p.stdin.close()
+            p.wait()
+
+
+def resampled(path: str, rows: int, seed: int = 0) -> pd.DataFrame:
+    df = pd.read_csv(path).sample(rows, replace=True, random_state=seed).reset_index(drop=True)
+    rng = np.random.default_rng(seed)
+    for col in FEATURES:
+        df[col] = df[col] * rng.uniform(0.95, 1.05, rows)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=5000, help="0 uses the training CSV as is")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dataset = MODEL_CONFIG["dataset"]
+        if args.rows:
+            dataset = os.path.join(tmp, "training.csv")
+            resampled(MODEL_CONFIG["dataset"], args.rows).to_csv(dataset, index=False)
+        model = load_or_train(dataset, directory=tmp, mmap=True)   # writes both artifacts once
+        print(f"forest: {model.estimator.nbytes / 2**20:.1f} MB of node arrays "
+              f"({len(model.estimator.left):,} nodes)\n")
+
+        print(f"{'workers':>8}{'private (MB)':>15}{'mmap (MB)':>12}{'model, private':>17}{'model, mmap':>14}")
+        for n in args.workers:
+            idle = total_pss("idle", n, dataset, tmp)
+            private = total_pss("private", n, dataset, tmp)
+            mapped = total_pss("mmap", n, dataset, tmp)
+            print(f"{n:>8}{private:>15.1f}{mapped:>12.1f}{private - idle:>17.1f}{mapped - idle:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Per-solve latency: PuLP/CBC subprocess vs in-process HiGHS.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_solver [--repeats 50]
+
+Each species catalogue is solved at its default optimiser targets, plus a
+synthetic 2,000-ingredient catalogue resampled from the poultry table.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from formulation_engine import IngredientMatrix, NutrientTargets, formulate, highspy
+
+CASES = {
+    "rabbit":  ("rabbit_ingredients.csv",  NutrientTargets(minimum={"CP": 17, "Energy": 2600})),
+    "poultry": ("poultry_ingredients.csv", NutrientTargets(minimum={"CP": 21, "Energy": 3200},
+                                                           maximum={"Fiber": 5})),
+    "cattle":  ("cattle_ingredients.csv",  NutrientTargets(minimum={"CP": 17, "Energy": 2900})),
+}
+
+
+def synthetic_catalogue(path: str, n: int, seed: int = 0) -> pd.DataFrame:
+    base = pd.read_csv(path)
+    rng = np.random.default_rng(seed)
+    df = base.sample(n, replace=True, random_state=seed).reset_index(drop=True)
+    for col in ["CP", "Energy", "Fiber", "Cost"]:
+        df[col] = df[col] * rng.uniform(0.9, 1.1, n)
+    df["Ingredient"] = [f"{name} #{i}" for i, name in enumerate(df["Ingredient"])]
+    return df
+
+
+def time_solver(matrix, targets, solver, repeats):
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        formulate(matrix, targets, solver=solver)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return np.median(samples), np.percentile(samples, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    cases = {k: (pd.read_csv(p), t) for k, (p, t) in CASES.items()}
+    cases["poultry x2000"] = (synthetic_catalogue("poultry_ingredients.csv", 2000), CASES["poultry"][1])
+
+    solvers = ["cbc"] + (["highs"] if highspy is not None else [])
+    print(f"{'catalogue':<15}{'n':>6}" + "".join(f"{s + ' p50 ms':>16}{s + ' p95 ms':>16}" for s in solvers))
+    for name, (df, targets) in cases.items():
+        matrix = IngredientMatrix.from_frame(df)
+        row = f"{name:<15}{matrix.size:>6}"
+        for solver in solvers:
+            p50, p95 = time_solver(matrix, targets, solver, args.repeats)
+            row += f"{p50:>16.2f}{p95:>16.2f}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
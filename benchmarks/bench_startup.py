@@ -0,0 +1,62 @@
+"""
+Cold-start cost of the growth model: retraining vs loading the saved artifact.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_startup [--repeats 5]
+
+Each sample is a fresh interpreter (as on a new server process) that imports
+``growth_model`` and makes one prediction. "train" points the artifact
+directory at an empty temp dir so every start refits; "artifact" reuses one
+saved model.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+SNIPPET = ("import time; t0 = time.perf_counter(); import growth_model; t1 = time.perf_counter(); "
+           "m = growth_model.load_or_train(); m.predict([[8, 1.8, 18, 2700, 0.12, 16.5, 2650]]); "
+           "print(t1 - t0, time.perf_counter() - t1)")
+
+
+def cold_start(model_dir: str) -> tuple:
+    """Seconds for (the whole process, importing scikit-learn & co, load/train + first prediction)."""
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", SNIPPET], capture_output=True, text=True, check=True,
+                         env={**os.environ, "GROWTH_MODEL_DIR": model_dir})
+    imports, model = map(float, out.stdout.strip().splitlines()[-1].split())
+    return time.perf_counter() - t0, imports, model
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as saved:
+        cold_start(saved)   # write the artifact once
+        for label in ("train", "artifact"):
+            samples = []
+            for _ in range(args.repeats):
+                if label == "train":
+                    with tempfile.TemporaryDirectory() as empty:
+                        samples.append(cold_start(empty))
+                else:
+                    samples.append(cold_start(saved))
+            rows.append((label, *np.median(np.array(samples), axis=0)))
+
+    print(f"{'start':<10}{'process (s)':>14}{'imports (s)':>14}{'model (s)':>12}")
+    for label, wall, imports, model in rows:
+        print(f"{label:<10}{wall:>14.3f}{imports:>14.3f}{model:>12.3f}")
+    print(f"model load vs retrain: {rows[0][3] / rows[1][3]:.0f}x faster, "
+          f"{rows[0][1] - rows[1][1]:.2f} s off every cold start")
+
+
+if __name__ == "__main__":
+    main()
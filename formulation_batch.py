@@ -0,0 +1,297 @@
+"""
+Batch least-cost formulation.
+
+Solves many nutrient targets against a shared ingredient matrix in one call —
+e.g. the nightly price sheet covering every species × production stage ×
+breed — many price scenarios against one target (Monte Carlo price risk),
+and grids of nutrient targets (cost frontier sweeps). Each worker loads the
+model once and re-solves it per target or price vector
+(``FormulationSession``), and work can optionally be fanned out across a
+process pool. Run headless with:
+
+    python -m formulation_batch --out price_sheet.csv [--processes 4]
+"""
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+
+import numpy as np
+import pandas as pd
+
+from formulation_engine import (DEFAULT_SOLVER, INCLUSION_THRESHOLD, FormulationSession,
+                                IngredientMatrix, NutrientTargets, load_composition, load_rules, stage_rules)
+from formulation_robust import formulate_robust, load_variability, nutrient_sd
+from ingredient_store import load_catalogues
+from reference_data import get_breed_database, get_nutrient_requirements, stage_targets
+
+# Default weekly price volatility (σ of log-price), in line with the ±15-20%
+# regional/seasonal swings noted in the README.
+PRICE_VOLATILITY = 0.15
+
+
+@dataclass
+class BatchJob:
+    """One target to solve; ``labels`` become the leading columns of the output."""
+    labels: dict
+    targets: NutrientTargets
+
+
+def _pool(workers: int) -> ProcessPoolExecutor:
+    # Spawned workers import only the engine, never a running Streamlit script
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _chunks(items, n_chunks: int) -> list:
+    bounds = np.linspace(0, len(items), n_chunks + 1).astype(int)
+    return [items[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+# ─────────────────────────────────────────────
+#  BATCH TARGETS
+# ─────────────────────────────────────────────
+def _solve_chunk(matrix: IngredientMatrix, jobs: list, solver: str, robust: dict = None) -> list:
+    if robust:
+        # Chance constraints change the model's shape, so each job is its own solve
+        return [formulate_robust(matrix, job.targets, solver=solver, **robust) for job in jobs]
+    session = FormulationSession(matrix, solver=solver)
+    return [session.solve(job.targets) for job in jobs]
+
+
+def _tidy(jobs: list, results: list) -> pd.DataFrame:
+    # Built from flat column lists: one DataFrame per job costs more than the solves.
+    rows = {key: [] for key in ["Status", "Cost/kg (₦)", "Ingredient", "Proportion (%)", "Cost Contribution (₦)"]}
+    labels = {key: [] for job in jobs for key in job.labels}
+    for job, res in zip(jobs, results):
+        sel = res.included if res.optimal else np.array([-1])
+        sel = sel[np.argsort(-res.proportions[sel], kind="stable")] if res.optimal else sel
+        n = len(sel)
+        for key in labels:
+            labels[key].extend([job.labels.get(key)] * n)
+        rows["Status"].extend([res.status] * n)
+        rows["Cost/kg (₦)"].extend([res.cost_per_kg if res.optimal else np.nan] * n)
+        if res.optimal:
+            prop = res.proportions[sel]
+            rows["Ingredient"].extend(res.matrix.ingredients[j] for j in sel)
+            rows["Proportion (%)"].extend((prop * 100).round(2))
+            rows["Cost Contribution (₦)"].extend((prop * res.matrix.cost[sel]).round(2))
+        else:
+            rows["Ingredient"].append(None)
+            rows["Proportion (%)"].append(np.nan)
+            rows["Cost Contribution (₦)"].append(np.nan)
+    return pd.DataFrame({**labels, **rows})
+
+
+def formulate_batch(matrix: IngredientMatrix, jobs: list, solver: str = DEFAULT_SOLVER,
+                    processes: int = None, robust: dict = None) -> pd.DataFrame:
+    """Solve every job against ``matrix``; one row per (job, included ingredient).
+
+    With ``processes`` > 1 the jobs are split into contiguous chunks, one per
+    worker, so consecutive targets (usually neighbouring stages) still share a
+    warm-started model inside each worker. ``robust`` holds
+    ``formulate_robust`` options (``sd``, ``confidence``, ``method``) to meet
+    every minimum at a confidence level instead of on average.
+    """
+    if not processes or processes <= 1 or len(jobs) < 2:
+        return _tidy(jobs, _solve_chunk(matrix, jobs, solver, robust))
+    n_chunks = min(processes, len(jobs))
+    chunks = _chunks(jobs, n_chunks)
+    with _pool(n_chunks) as pool:
+        parts = pool.map(_solve_chunk, [matrix] * n_chunks, chunks, [solver] * n_chunks, [robust] * n_chunks)
+        results = [r for part in parts for r in part]
+    return _tidy(jobs, results)
+
+
+# ─────────────────────────────────────────────
+#  MONTE CARLO PRICE RISK
+# ─────────────────────────────────────────────
+@dataclass
+class PriceRiskResult:
+    """Outcome of a price simulation: one row per scenario in each array."""
+    matrix: IngredientMatrix
+    prices: np.ndarray        # (scenarios, ingredients) sampled ₦/kg
+    costs: np.ndarray         # (scenarios,) least cost ₦/kg, NaN where infeasible
+    proportions: np.ndarray   # (scenarios, ingredients) optimal mix
+
+    def cost_summary(self) -> dict:
+        ok = self.costs[np.isfinite(self.costs)]
+        if ok.size == 0:
+            return {"Scenarios": len(self.costs), "Feasible": 0}
+        p5, p50, p95 = np.percentile(ok, [5, 50, 95])
+        return {"Scenarios": len(self.costs), "Feasible": int(ok.size), "Mean": float(ok.mean()),
+                "Std": float(ok.std()), "P5": float(p5), "P50": float(p50), "P95": float(p95),
+                "Min": float(ok.min()), "Max": float(ok.max())}
+
+    def ingredient_frequency(self) -> pd.DataFrame:
+        """How often each ingredient enters the optimal mix, and at what share."""
+        feasible = np.isfinite(self.costs)
+        props = self.proportions[feasible]
+        used = props > INCLUSION_THRESHOLD
+        n = max(int(feasible.sum()), 1)
+        out = pd.DataFrame({
+            "Ingredient":              list(self.matrix.ingredients),
+            "In Mix (% of scenarios)": (used.sum(axis=0) / n * 100).round(1),
+            "Mean Proportion (%)":     (props.mean(axis=0) * 100).round(2) if len(props) else 0.0,
+            "P95 Proportion (%)":      (np.percentile(props, 95, axis=0) * 100).round(2) if len(props) else 0.0,
+        })
+        return out[out["In Mix (% of scenarios)"] > 0].sort_values(
+            "In Mix (% of scenarios)", ascending=False).reset_index(drop=True)
+
+
+def sample_prices(cost: np.ndarray, volatility, n_scenarios: int, seed: int = None) -> np.ndarray:
+    """Mean-preserving lognormal price draws; ``volatility`` is a scalar or per-ingredient σ."""
+    rng = np.random.default_rng(seed)
+    sigma = np.broadcast_to(np.asarray(volatility, dtype=float), cost.shape)
+    z = rng.standard_normal((n_scenarios, cost.size))
+    return cost * np.exp(sigma * z - 0.5 * sigma ** 2)
+
+
+def _solve_prices(matrix: IngredientMatrix, targets: NutrientTargets, prices: np.ndarray,
+                  solver: str) -> tuple:
+    session = FormulationSession(matrix, solver=solver, sensitivity=False)
+    costs = np.full(len(prices), np.nan)
+    proportions = np.zeros((len(prices), matrix.size))
+    for s, price in enumerate(prices):
+        res = session.solve(targets, cost=price)
+        if res.optimal:
+            costs[s], proportions[s] = res.cost_per_kg, res.proportions
+    return costs, proportions
+
+
+def simulate_price_risk(matrix: IngredientMatrix, targets: NutrientTargets, volatility=PRICE_VOLATILITY,
+                        n_scenarios: int = 10_000, seed: int = None, solver: str = DEFAULT_SOLVER,
+                        processes: int = None) -> PriceRiskResult:
+    """Re-solve ``targets`` under ``n_scenarios`` sampled price vectors.
+
+    ``volatility`` may be a scalar, a per-ingredient array, or a dict of
+    ingredient name → σ (others use ``PRICE_VOLATILITY``). Consecutive
+    scenarios only change the cost vector, so each worker's model warm-starts
+    from the previous basis.
+    """
+    if isinstance(volatility, dict):
+        volatility = np.array([volatility.get(name, PRICE_VOLATILITY) for name in matrix.ingredients])
+    prices = sample_prices(matrix.cost, volatility, n_scenarios, seed)
+    if not processes or processes <= 1:
+        costs, proportions = _solve_prices(matrix, targets, prices, solver)
+    else:
+        chunks = _chunks(prices, min(processes, n_scenarios))
+        with _pool(len(chunks)) as pool:
+            parts = list(pool.map(_solve_prices, [matrix] * len(chunks), [targets] * len(chunks),
+                                  chunks, [solver] * len(chunks)))
+        costs = np.concatenate([c for c, _ in parts])
+        proportions = np.vstack([p for _, p in parts])
+    return PriceRiskResult(matrix, prices, costs, proportions)
+
+
+# ─────────────────────────────────────────────
+#  PARAMETRIC COST FRONTIER
+# ─────────────────────────────────────────────
+def sweep_targets(matrix: IngredientMatrix, base: NutrientTargets, axes: dict,
+                  solver: str = DEFAULT_SOLVER) -> pd.DataFrame:
+    """Least cost over a 1-D or 2-D grid of nutrient minimums.
+
+    ``axes`` maps nutrient → grid values, e.g. ``{"CP": np.arange(14, 24.5, .5)}``
+    or CP × Energy. Only the swept rows' bounds change between solves, and the
+    grid is walked in serpentine order so every solve warm-starts from its
+    neighbour's basis. A swept nutrient's cap in ``base`` rises to the swept
+    level where it is lower, so a stage cap cannot cut the grid off.
+    ``Breakpoint`` marks points whose ingredient set differs from the
+    previous point along the last axis.
+    """
+    names = list(axes)
+    grids = [np.asarray(axes[n], dtype=float) for n in names]
+    session = FormulationSession(matrix, solver=solver, sensitivity=False)
+    outer = grids[0] if len(grids) == 2 else [None]
+    inner = grids[-1]
+    records = []
+    for i, outer_val in enumerate(outer):
+        walk = inner if i % 2 == 0 else inner[::-1]
+        row = []
+        for inner_val in walk:
+            targets = NutrientTargets(dict(base.minimum), dict(base.maximum), base.rules)
+            point = {names[-1]: float(inner_val)}
+            if outer_val is not None:
+                point[names[0]] = float(outer_val)
+            targets.minimum.update(point)
+            for nutrient, level in point.items():
+                # A stage cap below the swept level would make the point infeasible, not dearer
+                if nutrient in targets.maximum:
+                    targets.maximum[nutrient] = max(level, targets.maximum[nutrient])
+            res = session.solve(targets)
+            mix = tuple(res.matrix.ingredients[j] for j in res.included) if res.optimal else ()
+            row.append({**point, "Status": res.status,
+                        "Cost/kg (₦)": res.cost_per_kg if res.optimal else np.nan, "Mix": mix})
+        records.extend(row if i % 2 == 0 else row[::-1])
+    out = pd.DataFrame(records)[[*names, "Status", "Cost/kg (₦)", "Mix"]]
+    group = out[names[0]] if len(names) == 2 else pd.Series(0, index=out.index)
+    prev_mix = out.groupby(group, sort=False)["Mix"].shift()
+    out["Breakpoint"] = prev_mix.notna() & (out["Mix"] != prev_mix)
+    out["Mix"] = out["Mix"].map(", ".join)
+    return out
+
+
+# ─────────────────────────────────────────────
+#  STAGE PRICE SHEET
+# ─────────────────────────────────────────────
+def stage_jobs(species: str, use_fiber: bool = False, with_breeds: bool = True,
+               rules: pd.DataFrame = None) -> list:
+    """Jobs for every production stage of ``species`` (× each breed when requested).
+
+    With a ``rules`` table (see ``load_rules``) each stage's inclusion rules
+    apply; the breeds of a stage share one rules object, so a worker's
+    session only reloads its model when the stage changes.
+    """
+    stages = get_nutrient_requirements()[species]
+    breeds = get_breed_database()[species] if with_breeds else {}
+    jobs = []
+    for stage, stage_data in stages.items():
+        limits = stage_rules(rules, species, stage) if rules is not None else None
+        jobs.append(BatchJob({"Species": species, "Stage": stage, "Breed": None},
+                             replace(stage_targets(stage_data, use_fiber=use_fiber), rules=limits)))
+        for breed, info in breeds.items():
+            jobs.append(BatchJob({"Species": species, "Stage": stage, "Breed": breed},
+                                 replace(stage_targets(stage_data, info, use_fiber=use_fiber), rules=limits)))
+    return jobs
+
+
+def price_sheet(catalogues: dict = None, use_fiber: bool = False, with_breeds: bool = True,
+                solver: str = DEFAULT_SOLVER, processes: int = None, confidence: float = None,
+                with_rules: bool = True) -> pd.DataFrame:
+    """Least-cost formula for every species × stage (× breed) in one tidy table.
+
+    With ``confidence`` each minimum is met at that probability given the
+    ingredient variability in ``ingredient_variability.csv``. ``with_rules``
+    applies the inclusion limits and ratios in ``inclusion_rules.csv``.
+    """
+    catalogues = catalogues or load_catalogues()
+    composition = load_composition()
+    rules = load_rules() if with_rules else None
+    variability = load_variability() if confidence else None
+    sheets = []
+    for species, df in catalogues.items():
+        matrix = IngredientMatrix.from_frame(df, composition=composition)
+        robust = dict(sd=nutrient_sd(matrix, variability), confidence=confidence) if confidence else None
+        sheets.append(formulate_batch(matrix, stage_jobs(species, use_fiber, with_breeds, rules),
+                                      solver=solver, processes=processes, robust=robust))
+    return pd.concat(sheets, ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Nightly least-cost price sheet for every stage and breed.")
+    parser.add_argument("--out", default="price_sheet.csv")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--fiber", action="store_true", help="bound fiber by each stage's range")
+    parser.add_argument("--no-breeds", action="store_true", help="stage defaults only")
+    parser.add_argument("--confidence", type=float, default=None,
+                        help="meet each minimum with this probability given ingredient variability, e.g. 0.85")
+    parser.add_argument("--no-rules", action="store_true", help="ignore the inclusion limits in inclusion_rules.csv")
+    args = parser.parse_args()
+    sheet = price_sheet(use_fiber=args.fiber, with_breeds=not args.no_breeds, processes=args.processes,
+                        confidence=args.confidence, with_rules=not args.no_rules)
+    sheet.to_csv(args.out, index=False)
+    summary = sheet.drop_duplicates(["Species", "Stage", "Breed"])
+    print(f"{len(summary)} formulas ({(summary['Status'] == 'Optimal').sum()} optimal) → {args.out}")
+
+
+if __name__ == "__main__":
+    main()
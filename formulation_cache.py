@@ -0,0 +1,140 @@
+"""
+Cross-session, disk-backed cache of formulation results.
+
+Results are keyed on a content hash of the ingredient matrix (names, nutrient
+values, costs), the nutrient targets and any solve options, and stored in a
+SQLite file so every Streamlit session and worker process on the host shares
+them. The store is size-bounded with least-recently-used eviction. Because the
+catalogue contents are part of the key, editing a species CSV can never serve
+a stale formula; ``invalidate(species)`` additionally drops that species'
+entries so they stop taking up space.
+"""
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from dataclasses import replace
+
+import numpy as np
+
+from formulation_engine import (DEFAULT_SOLVER, FormulationResult, IngredientMatrix,
+                                NutrientTargets, formulate)
+
+CACHE_CONFIG = {
+    "path":        os.environ.get("FORMULATION_CACHE_PATH", "formulation_cache.sqlite3"),
+    "max_entries": 5000,
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key       TEXT PRIMARY KEY,
+    species   TEXT,
+    catalogue TEXT NOT NULL,
+    payload   BLOB NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);
+CREATE INDEX IF NOT EXISTS results_species ON results (species);
+"""
+
+
+def catalogue_hash(matrix: IngredientMatrix) -> str:
+    h = hashlib.sha256()
+    h.update(json.dumps([matrix.ingredients, matrix.nutrients]).encode())
+    h.update(np.ascontiguousarray(matrix.values, dtype=float).tobytes())
+    h.update(np.ascontiguousarray(matrix.cost, dtype=float).tobytes())
+    return h.hexdigest()
+
+
+def _option_repr(value) -> str:
+    # Arrays (e.g. nutrient SDs) by content: numpy's repr elides large ones
+    if isinstance(value, np.ndarray):
+        return hashlib.sha256(np.ascontiguousarray(value, dtype=float).tobytes()).hexdigest()
+    return repr(value)
+
+
+def result_key(matrix: IngredientMatrix, targets: NutrientTargets, **options) -> str:
+    """Content hash of everything that determines the solve's outcome."""
+    spec = {
+        "min": sorted(targets.minimum.items()),
+        "max": sorted(targets.maximum.items()),
+        "options": sorted((k, _option_repr(v)) for k, v in options.items()),
+    }
+    if targets.rules is not None:
+        r = targets.rules
+        spec["rules"] = [r.names, r.term_rule.tolist(), r.term_ingredient.tolist(), r.coef.tolist(),
+                         r.lower.tolist(), r.upper.tolist()]
+    h = hashlib.sha256(catalogue_hash(matrix).encode())
+    h.update(json.dumps(spec, default=float).encode())
+    return h.hexdigest()
+
+
+class FormulationCache:
+    """SQLite-backed LRU store of ``FormulationResult`` objects."""
+
+    def __init__(self, path: str = None, max_entries: int = None):
+        self.path = path or CACHE_CONFIG["path"]
+        self.max_entries = max_entries or CACHE_CONFIG["max_entries"]
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; WAL lets readers proceed while another process writes.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str, matrix: IngredientMatrix):
+        conn = self._conn()
+        row = conn.execute("SELECT payload FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        with conn:
+            conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        return replace(pickle.loads(row[0]), matrix=matrix)
+
+    def put(self, key: str, result: FormulationResult, species: str = None) -> None:
+        # The matrix is the caller's to supply on read; storing it would bloat every row.
+        payload = pickle.dumps(replace(result, matrix=None), protocol=pickle.HIGHEST_PROTOCOL)
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, species, catalogue, payload, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, species, catalogue_hash(result.matrix), payload, time.time()),
+            )
+            conn.execute(
+                "DELETE FROM results WHERE key IN ("
+                "SELECT key FROM results ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def invalidate(self, species: str = None) -> int:
+        """Drop cached results for ``species`` (every species when ``None``)."""
+        with self._conn() as conn:
+            if species is None:
+                cur = conn.execute("DELETE FROM results")
+            else:
+                cur = conn.execute("DELETE FROM results WHERE species = ?", (species,))
+        return cur.rowcount
+
+    def __len__(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def formulate(self, matrix: IngredientMatrix, targets: NutrientTargets, species: str = None,
+                  solver: str = DEFAULT_SOLVER, **options) -> tuple:
+        """Cached ``formulate``; returns ``(result, hit)``. Only proven outcomes are stored."""
+        key = result_key(matrix, targets, **options)
+        cached = self.get(key, matrix)
+        if cached is not None:
+            return cached, True
+        result = formulate(matrix, targets, solver=solver, **options)
+        if result.proven:   # a time-limited MILP might do better next time
+            self.put(key, result, species)
+        return result, False
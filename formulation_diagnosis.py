@@ -0,0 +1,167 @@
+"""
+Why a formulation is infeasible, and the smallest change that fixes it.
+
+``bound_check`` is a vectorised screen run before any solve: a blend can
+never exceed its richest ingredient nor fall below its poorest, so a target
+outside ``[min, max]`` of a nutrient's row is rejected outright.
+
+``diagnose`` handles the targets that pass the screen but still conflict
+with each other. It solves one elastic LP in which every nutrient bound may
+be violated at a penalty proportional to the relative violation, so the
+solver returns the smallest relaxation that restores feasibility. The
+elastic LP's duals pick out the targets that are actually in conflict,
+including ones that need no relaxation themselves. When only the ingredient
+cap makes the MILP infeasible, the smallest workable cap is found by
+bisection.
+"""
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from formulation_engine import (DEFAULT_SOLVER, FormulationResult, IngredientMatrix, NutrientTargets,
+                                _csr, build_model, formulate, solve_sparse_lp)
+
+# Relaxations below this (relative to the target) count as zero
+RELAX_TOL = 1e-7
+
+
+def bound_check(matrix: IngredientMatrix, targets: NutrientTargets) -> pd.DataFrame:
+    """Targets no blend of ``matrix`` can meet, with the achievable limit.
+
+    Empty when every target lies within its nutrient's ingredient range.
+    """
+    names = [n for n in targets.nutrients if n in matrix.nutrients]
+    values = matrix.values[[matrix.nutrients.index(n) for n in names]].reshape(len(names), -1)
+    lo, hi = values.min(axis=1), values.max(axis=1)
+    t_min = np.array([targets.minimum.get(n, -np.inf) for n in names], dtype=float)
+    t_max = np.array([targets.maximum.get(n, np.inf) for n in names], dtype=float)
+    out = pd.concat([
+        pd.DataFrame({"Nutrient": names, "Bound": "Min", "Target": t_min, "Achievable": hi})[t_min > hi],
+        pd.DataFrame({"Nutrient": names, "Bound": "Max", "Target": t_max, "Achievable": lo})[t_max < lo],
+        pd.DataFrame({"Nutrient": names, "Bound": "Min > Max", "Target": t_min, "Achievable": t_max})[t_min > t_max],
+    ], ignore_index=True)
+    return out
+
+
+@dataclass
+class Diagnosis:
+    """Outcome of ``diagnose``.
+
+    ``conflicts`` lists every target in the conflict with the relaxation it
+    needs (zero for targets that conflict but are best left alone);
+    ``relaxed`` is the nearest feasible set of targets and ``result`` the
+    least-cost formula under them. ``max_ingredients`` is the smallest
+    workable ingredient cap when the cap was the cause.
+    """
+    conflicts: pd.DataFrame
+    relaxed: NutrientTargets
+    result: FormulationResult = None
+    max_ingredients: int = None
+    screened: bool = False
+    notes: list = field(default_factory=list)
+
+    @property
+    def feasible(self) -> bool:
+        return self.conflicts.empty and self.max_ingredients is None
+
+
+def _elastic(matrix: IngredientMatrix, targets: NutrientTargets, solver: str) -> pd.DataFrame:
+    """One elastic LP: each finite nutrient bound gets a slack priced at 1/|target|."""
+    model = build_model(matrix, targets)
+    labels = model.row_labels[1:]
+    k, n = len(labels), matrix.size
+    # Split ranges into one-sided rows so each side has its own slack column
+    sides = [(i, "Min", model.row_lower[i + 1]) for i in range(k) if np.isfinite(model.row_lower[i + 1])] + \
+            [(i, "Max", model.row_upper[i + 1]) for i in range(k) if np.isfinite(model.row_upper[i + 1])]
+    m = len(sides)
+    A = np.zeros((1 + m, n + m))
+    A[0, :n] = 1.0
+    row_lower, row_upper = np.full(1 + m, -np.inf), np.full(1 + m, np.inf)
+    row_lower[0] = row_upper[0] = 1.0
+    for r, (i, bound, target) in enumerate(sides, start=1):
+        A[r, :n] = model.A[i + 1]
+        if bound == "Min":
+            A[r, n + r - 1], row_lower[r] = 1.0, target
+        else:
+            A[r, n + r - 1], row_upper[r] = -1.0, target
+    scale = np.array([abs(t) if t != 0 else 1.0 for _, _, t in sides])
+    cost = np.concatenate([np.zeros(n), 1.0 / scale])
+    col_upper = np.concatenate([model.col_upper, np.full(m, np.inf)])
+    status, x, _, duals = solve_sparse_lp(cost, np.zeros(n + m), col_upper, row_lower, row_upper,
+                                          _csr(A), solver=solver)
+    if status != "Optimal":
+        raise RuntimeError(f"elastic model could not be solved ({status})")
+    slack = x[n:]
+    out = pd.DataFrame({
+        "Nutrient":   [labels[i] for i, _, _ in sides],
+        "Bound":      [b for _, b, _ in sides],
+        "Target":     [t for _, _, t in sides],
+        "Relaxation": slack,
+        "In Conflict": (np.abs(duals[1:]) > RELAX_TOL) | (slack > RELAX_TOL * scale),
+    })
+    out.insert(3, "Relaxed To", np.where(out["Bound"] == "Min", out["Target"] - slack, out["Target"] + slack))
+    out["Relaxation (%)"] = slack / scale * 100
+    return out
+
+
+def _relax(targets: NutrientTargets, conflicts: pd.DataFrame) -> NutrientTargets:
+    relaxed = NutrientTargets(dict(targets.minimum), dict(targets.maximum), targets.rules)
+    rule_names = targets.rules.names if targets.rules is not None else ()
+    for nutrient, bound, level in zip(conflicts["Nutrient"], conflicts["Bound"], conflicts["Relaxed To"]):
+        if nutrient in rule_names:
+            relaxed.rules = relaxed.rules.relax(nutrient, bound, level)
+            continue
+        # "Min > Max" is fixed by bringing the minimum down to the maximum
+        (relaxed.maximum if bound == "Max" else relaxed.minimum)[nutrient] = level
+    return relaxed
+
+
+def _smallest_cap(matrix: IngredientMatrix, targets: NutrientTargets, lo: int, min_inclusion: float,
+                  solver: str, time_limit: float) -> tuple:
+    """Bisect for the fewest ingredients that still give a feasible MILP."""
+    hi, best = matrix.size, None
+    while lo <= hi:
+        cap = (lo + hi) // 2
+        res = formulate(matrix, targets, solver=solver, max_ingredients=cap,
+                        min_inclusion=min_inclusion, time_limit=time_limit)
+        if res.feasible:
+            hi, best = cap - 1, (cap, res)
+        else:
+            lo = cap + 1
+    return best or (None, None)
+
+
+def diagnose(matrix: IngredientMatrix, targets: NutrientTargets, solver: str = DEFAULT_SOLVER,
+             max_ingredients: int = None, min_inclusion: float = 0.0, time_limit: float = 2.0,
+             **_options) -> Diagnosis:
+    """Explain an infeasible formulation and propose the smallest fix.
+
+    Extra solve options (e.g. ``mip_gap``) are accepted and ignored so callers
+    can pass the options of the failed run straight through.
+    """
+    screened = bound_check(matrix, targets)
+    if not screened.empty:
+        # Relaxing to the achievable limit is the smallest fix for a bound violation
+        conflicts = screened.rename(columns={"Achievable": "Relaxed To"})
+        conflicts["Relaxation"] = (conflicts["Target"] - conflicts["Relaxed To"]).abs()
+        conflicts["Relaxation (%)"] = conflicts["Relaxation"] / conflicts["Target"].abs().clip(lower=1e-9) * 100
+        return Diagnosis(conflicts, _relax(targets, conflicts), screened=True,
+                         notes=["Rejected before solving: no blend of these ingredients can reach the target."])
+
+    elastic = _elastic(matrix, targets, solver)
+    needed = elastic["Relaxation (%)"] > RELAX_TOL * 100
+    conflicts = elastic[elastic["In Conflict"]] if needed.any() else elastic.iloc[0:0]
+    relaxed = _relax(targets, elastic[needed])
+    diagnosis = Diagnosis(conflicts.drop(columns="In Conflict").reset_index(drop=True), relaxed,
+                          formulate(matrix, relaxed, solver=solver))
+    if not diagnosis.conflicts.empty or (max_ingredients is None and min_inclusion <= 0):
+        return diagnosis
+
+    # The nutrient targets are jointly feasible, so the ingredient cap is what fails
+    cap, res = _smallest_cap(matrix, targets, (max_ingredients or 0) + 1, min_inclusion, solver, time_limit)
+    diagnosis.max_ingredients, diagnosis.result = cap, res
+    diagnosis.notes.append(
+        f"The targets can be met with {cap} ingredients." if cap is not None
+        else "No ingredient cap works at this minimum inclusion; lower the minimum inclusion.")
+    return diagnosis
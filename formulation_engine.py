@@ -0,0 +1,705 @@
+"""
+Least-cost feed formulation engine.
+
+Headless counterpart of the optimiser tab in ``streamlit_app.py``. The
+ingredient catalogue is held as a dense nutrient matrix plus a cost vector,
+and every nutrient target becomes one row of a ``lower <= A·x <= upper``
+constraint system built in a single vectorised step, so model size no longer
+depends on per-ingredient DataFrame lookups.
+"""
+import time
+from dataclasses import dataclass, field, replace
+
+import numpy as np
+import pandas as pd
+from pulp import (LpProblem, LpMinimize, LpVariable, LpAffineExpression,
+                  LpSolutionIntegerFeasible, LpStatus, PULP_CBC_CMD, value)
+
+from formulation_metrics import record
+
+try:
+    import highspy
+except ImportError:  # fall back to PuLP's bundled CBC
+    highspy = None
+
+# Nutrients the optimiser can constrain. CP/Energy/Fiber are columns of the
+# species catalogues (rabbit/poultry/cattle CSVs); the minerals, amino acids
+# and TDN are mostly zero, so they live in a long (Ingredient, Nutrient, Value)
+# table that lists non-zero entries only.
+NUTRIENT_COLUMNS = ("CP", "Energy", "Fiber", "Calcium", "Phosphorus", "Lysine", "Methionine", "TDN")
+COMPOSITION_FILE = "ingredient_nutrients.csv"
+
+# Per-species, per-stage inclusion limits and ratio rules (Stage "All" applies
+# to every stage of the species; a stage row overrides an "All" rule of the same name)
+RULES_FILE = "inclusion_rules.csv"
+
+# "highs" solves in-process via highspy; "cbc" goes through PuLP's CBC command
+# (temp LP file + subprocess per solve) and is kept as a fallback.
+DEFAULT_SOLVER = "highs" if highspy is not None else "cbc"
+
+# Proportions below this are treated as "not in the mix" when reporting
+INCLUSION_THRESHOLD = 0.001
+
+# Budgets for mixed-integer solves (ingredient-count limits, minimum inclusions)
+# so they stay interactive on large catalogues: seconds, and relative MIP gap.
+MIP_CONFIG = {"time_limit": 10.0, "mip_gap": 0.01}
+
+# A MILP stopped by its time limit with an incumbent: a usable formula, not a proven optimum
+TIME_LIMIT_FEASIBLE = "Time limit (feasible)"
+# Outcomes the solver proved; anything else may change with a longer budget
+PROVEN_STATUSES = ("Optimal", "Infeasible", "Unbounded")
+
+
+# ─────────────────────────────────────────────
+#  INGREDIENT MATRIX & TARGETS
+# ─────────────────────────────────────────────
+@dataclass(frozen=True)
+class IngredientMatrix:
+    """Catalogue as arrays: ``values[k, j]`` is nutrient ``k`` of ingredient ``j``."""
+    ingredients: tuple
+    nutrients: tuple
+    values: np.ndarray
+    cost: np.ndarray
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, nutrients=NUTRIENT_COLUMNS,
+                   composition: pd.DataFrame = None) -> "IngredientMatrix":
+        """Build from a catalogue; ``composition`` (see ``load_composition``) supplies
+        nutrients that are not columns of ``df``, matched on ingredient name.
+        """
+        names = df["Ingredient"].astype(str).tolist()
+        cols = [c for c in nutrients if c in df.columns]
+        extra = []
+        if composition is not None:
+            present = set(composition["Nutrient"])
+            extra = [c for c in nutrients if c not in cols and c in present]
+        values = np.zeros((len(cols) + len(extra), len(names)))
+        values[:len(cols)] = df[cols].apply(pd.to_numeric, errors="coerce").fillna(0.0).to_numpy(dtype=float).T
+        if extra:
+            # Scatter the sparse (ingredient, nutrient) entries into their matrix cells
+            pos = pd.DataFrame({"Ingredient": names, "col": np.arange(len(names))}).merge(
+                composition[composition["Nutrient"].isin(extra)], on="Ingredient")
+            row = pos["Nutrient"].map({n: len(cols) + k for k, n in enumerate(extra)}).to_numpy()
+            values[row, pos["col"].to_numpy()] = pos["Value"].to_numpy(dtype=float)
+        cost = pd.to_numeric(df["Cost"], errors="coerce").fillna(0.0).to_numpy(dtype=float)
+        return cls(tuple(names), tuple(cols + extra), values, cost)
+
+    @property
+    def size(self) -> int:
+        return len(self.ingredients)
+
+    def row(self, nutrient: str) -> np.ndarray:
+        return self.values[self.nutrients.index(nutrient)]
+
+
+def load_composition(path: str = COMPOSITION_FILE) -> pd.DataFrame:
+    """Sparse nutrient table: one row per non-zero (Ingredient, Nutrient, Value)."""
+    comp = pd.read_csv(path)
+    comp["Value"] = pd.to_numeric(comp["Value"], errors="coerce").fillna(0.0)
+    return comp[comp["Value"] != 0]
+
+
+@dataclass(frozen=True)
+class InclusionRules:
+    """Linear limits on ingredient use: ``lower <= Σ coef·x <= upper`` per rule.
+
+    Bounds are fractions of the mix. A plain inclusion limit is a rule with
+    one term; "soybean meal ≥ 2× groundnut cake" is ``SBM - 2·GNC >= 0`` and
+    "animal protein ≤ 8%" sums several ingredients. The terms are kept as one
+    long list so any number of rules becomes a single matrix block.
+    """
+    names: tuple
+    term_rule: np.ndarray         # rule index of each term
+    term_ingredient: np.ndarray   # ingredient name of each term
+    coef: np.ndarray
+    lower: np.ndarray
+    upper: np.ndarray
+
+    def block(self, matrix: IngredientMatrix) -> tuple:
+        """``(A, lower, upper, labels)`` rows over ``matrix``'s ingredient columns.
+
+        Terms naming ingredients outside the catalogue are dropped, and so are
+        rules left with no terms at all.
+        """
+        j = pd.Index(matrix.ingredients).get_indexer(self.term_ingredient)
+        hit = j >= 0
+        A = np.zeros((len(self.names), matrix.size))
+        np.add.at(A, (self.term_rule[hit], j[hit]), self.coef[hit])
+        keep = A.any(axis=1)
+        return A[keep], self.lower[keep], self.upper[keep], [n for n, k in zip(self.names, keep) if k]
+
+    def relax(self, name: str, bound: str, level: float) -> "InclusionRules":
+        """Copy with one rule's ``"Min"`` or ``"Max"`` bound moved to ``level``."""
+        i = self.names.index(name)
+        lower, upper = self.lower.copy(), self.upper.copy()
+        (upper if bound == "Max" else lower)[i] = level
+        return replace(self, lower=lower, upper=upper)
+
+    def to_frame(self) -> pd.DataFrame:
+        """One row per rule, bounds in % of the mix, e.g. ``Soybean Meal - 2×Groundnut Cake``."""
+        terms = pd.DataFrame({"rule": self.term_rule, "Ingredient": self.term_ingredient, "coef": self.coef})
+        size = terms["coef"].abs()
+        terms["term"] = np.where(terms["coef"] < 0, "- ", "+ ") + \
+            np.where(size == 1, "", size.map("{:g}×".format)) + terms["Ingredient"]
+        expr = terms.groupby("rule")["term"].agg(" ".join).str.removeprefix("+ ")
+        return pd.DataFrame({
+            "Rule":    list(self.names),
+            "Limits":  expr.reindex(range(len(self.names))).to_numpy(),
+            "Min (%)": self.lower * 100,
+            "Max (%)": self.upper * 100,
+        }).replace([np.inf, -np.inf], np.nan)
+
+
+def load_rules(path: str = RULES_FILE) -> pd.DataFrame:
+    """Rule table: one row per (Species, Stage, Rule, Ingredient) term."""
+    rules = pd.read_csv(path)
+    rules["Coefficient"] = pd.to_numeric(rules["Coefficient"], errors="coerce").fillna(1.0)
+    return rules
+
+
+def stage_rules(rules: pd.DataFrame, species: str, stage: str = None) -> InclusionRules:
+    """The rules of one species and stage as an ``InclusionRules`` block; None if there are none."""
+    sel = rules[(rules["Species"] == species) & rules["Stage"].isin(["All", stage])]
+    # A stage-specific rule replaces the species-wide rule of the same name
+    specific = sel.loc[sel["Stage"] != "All", "Rule"].unique()
+    sel = sel[(sel["Stage"] != "All") | ~sel["Rule"].isin(specific)]
+    if sel.empty:
+        return None
+    term_rule, names = pd.factorize(sel["Rule"])
+    bounds = sel.groupby(term_rule)[["Min (%)", "Max (%)"]].first()
+    return InclusionRules(
+        names=tuple(names), term_rule=term_rule, term_ingredient=sel["Ingredient"].to_numpy(dtype=object),
+        coef=sel["Coefficient"].to_numpy(dtype=float),
+        lower=bounds["Min (%)"].fillna(-np.inf).to_numpy(dtype=float) / 100,
+        upper=bounds["Max (%)"].fillna(np.inf).to_numpy(dtype=float) / 100,
+    )
+
+
+@dataclass
+class NutrientTargets:
+    """Per-nutrient bounds on the finished feed, e.g. ``minimum={"CP": 18}``,
+    plus optional ingredient ``rules`` (see ``InclusionRules``)."""
+    minimum: dict = field(default_factory=dict)
+    maximum: dict = field(default_factory=dict)
+    rules: InclusionRules = None
+
+    @property
+    def nutrients(self) -> list:
+        return list(dict.fromkeys([*self.minimum, *self.maximum]))
+
+
+@dataclass
+class FormulationModel:
+    """LP in row form: minimise ``cost·x`` s.t. ``row_lower <= A·x <= row_upper``."""
+    matrix: IngredientMatrix
+    A: np.ndarray
+    row_lower: np.ndarray
+    row_upper: np.ndarray
+    row_labels: list
+    col_lower: np.ndarray
+    col_upper: np.ndarray
+    # Cardinality block: binary y_j with x_j <= y_j, x_j >= min_inclusion·y_j, Σy <= max_ingredients
+    max_ingredients: int = None
+    min_inclusion: float = 0.0
+
+    @property
+    def cost(self) -> np.ndarray:
+        return self.matrix.cost
+
+    @property
+    def is_mip(self) -> bool:
+        return self.max_ingredients is not None or self.min_inclusion > 0
+
+    def size(self) -> dict:
+        """Column, row and nonzero counts as handed to the solver, cardinality block included."""
+        n = self.matrix.size
+        rows, cols, nnz = len(self.row_labels), n, int(np.count_nonzero(self.A))
+        if self.is_mip:
+            cols += n
+            rows += n + (n if self.min_inclusion > 0 else 0) + (self.max_ingredients is not None)
+            nnz += 2 * n + (2 * n if self.min_inclusion > 0 else 0) + (n if self.max_ingredients is not None else 0)
+        return {"rows": rows, "cols": cols, "nonzeros": nnz, "integers": n if self.is_mip else 0}
+
+
+def build_model(matrix: IngredientMatrix, targets: NutrientTargets, nutrients=None) -> FormulationModel:
+    """Stack the mass balance and every nutrient target into one constraint matrix.
+
+    ``nutrients`` forces a row per listed nutrient even when unconstrained, so a
+    persistent model can later have its bounds changed in place. Ingredient
+    rules follow the nutrient rows as one block.
+    """
+    names = [n for n in (nutrients or targets.nutrients) if n in matrix.nutrients]
+    idx = [matrix.nutrients.index(n) for n in names]
+    A = np.vstack([np.ones((1, matrix.size)), matrix.values[idx]])
+    row_lower = np.array([1.0] + [targets.minimum.get(n, -np.inf) for n in names], dtype=float)
+    row_upper = np.array([1.0] + [targets.maximum.get(n, np.inf) for n in names], dtype=float)
+    labels = ["Total"] + names
+    if targets.rules is not None:
+        B, lo, hi, rule_labels = targets.rules.block(matrix)
+        A, row_lower, row_upper = np.vstack([A, B]), np.concatenate([row_lower, lo]), np.concatenate([row_upper, hi])
+        labels += rule_labels
+    return FormulationModel(
+        matrix=matrix, A=A, row_lower=row_lower, row_upper=row_upper,
+        row_labels=labels,
+        col_lower=np.zeros(matrix.size), col_upper=np.ones(matrix.size),
+    )
+
+
+# ─────────────────────────────────────────────
+#  RESULT
+# ─────────────────────────────────────────────
+@dataclass
+class Sensitivity:
+    """LP duals and cost ranging read back from the optimal basis.
+
+    ``row_duals`` are ₦/kg of feed per unit of each constraint's bound,
+    ``reduced_costs`` are ₦/kg an ingredient's price must fall before it
+    enters the mix, and ``cost_lower``/``cost_upper`` bound each ingredient's
+    price over which the current formula stays optimal (NaN when the solver
+    does not report ranging). ``rhs_lower``/``rhs_upper`` bound the
+    constraint level over which its dual stays valid.
+    """
+    row_labels: list
+    row_lower: np.ndarray
+    row_upper: np.ndarray
+    row_activity: np.ndarray
+    row_duals: np.ndarray
+    reduced_costs: np.ndarray
+    cost_lower: np.ndarray
+    cost_upper: np.ndarray
+    rhs_lower: np.ndarray
+    rhs_upper: np.ndarray
+
+
+@dataclass
+class FormulationResult:
+    """Outcome of one solve. ``status`` uses PuLP's ``LpStatus`` vocabulary."""
+    status: str
+    matrix: IngredientMatrix
+    proportions: np.ndarray
+    cost_per_kg: float
+    sensitivity: Sensitivity = None
+    # Phase timings (s), model size and solver counters (see formulation_metrics), plus "mip_gap" for MILP solves
+    stats: dict = field(default_factory=dict)
+
+    @property
+    def optimal(self) -> bool:
+        """A formula proven optimal."""
+        return self.status == "Optimal"
+
+    @property
+    def feasible(self) -> bool:
+        """A formula meeting every target: proven optimal, or the best found within a MILP time limit."""
+        return self.status in ("Optimal", TIME_LIMIT_FEASIBLE)
+
+    @property
+    def proven(self) -> bool:
+        """The outcome cannot change with a longer time limit, so it is safe to cache."""
+        return self.status in PROVEN_STATUSES
+
+    @property
+    def nutrient_levels(self) -> dict:
+        levels = self.matrix.values @ self.proportions
+        return dict(zip(self.matrix.nutrients, levels.tolist()))
+
+    @property
+    def included(self) -> np.ndarray:
+        return np.flatnonzero(self.proportions > INCLUSION_THRESHOLD)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Formula table in the column layout used by the optimiser tab and reports."""
+        sel = self.included
+        prop = self.proportions[sel]
+        out = pd.DataFrame({
+            "Ingredient": [self.matrix.ingredients[j] for j in sel],
+            "Proportion": prop,
+        })
+        out["Proportion (%)"]        = (prop * 100).round(2)
+        out["Cost/kg (₦)"]           = self.matrix.cost[sel]
+        out["Cost Contribution (₦)"] = (prop * self.matrix.cost[sel]).round(2)
+        for k, nutrient in enumerate(self.matrix.nutrients):
+            out[f"{nutrient} Contribution"] = self.matrix.values[k, sel] * prop
+        return out.sort_values("Proportion", ascending=False).reset_index(drop=True)
+
+    def nutrient_profile(self, targets: NutrientTargets) -> pd.DataFrame:
+        """Achieved level of every nutrient in the matrix beside its min/max target."""
+        levels = self.nutrient_levels
+        return pd.DataFrame({
+            "Nutrient": list(levels),
+            "Level":    np.round(list(levels.values()), 3),
+            "Min":      [targets.minimum.get(n, np.nan) for n in levels],
+            "Max":      [targets.maximum.get(n, np.nan) for n in levels],
+        })
+
+    def ingredient_sensitivity(self) -> pd.DataFrame:
+        """Per-ingredient reduced cost and the price range keeping this formula optimal.
+
+        "Entry Price" is the price at which an ingredient left out of the mix
+        would start to come in; it is blank for ingredients already used.
+        """
+        sens = self.sensitivity
+        if sens is None:
+            return pd.DataFrame()
+        in_mix = self.proportions > INCLUSION_THRESHOLD
+        return pd.DataFrame({
+            "Ingredient":          list(self.matrix.ingredients),
+            "In Mix":              in_mix,
+            "Proportion (%)":      (self.proportions * 100).round(2),
+            "Cost/kg (₦)":         self.matrix.cost,
+            "Reduced Cost (₦)":    sens.reduced_costs.round(2),
+            "Entry Price (₦/kg)":  np.where(in_mix, np.nan, (self.matrix.cost - sens.reduced_costs).round(2)),
+            "Price Range Low (₦)": sens.cost_lower.round(2),
+            "Price Range High (₦)": sens.cost_upper.round(2),
+        }).sort_values(["In Mix", "Reduced Cost (₦)"], ascending=[False, True]).reset_index(drop=True)
+
+    def constraint_sensitivity(self) -> pd.DataFrame:
+        """Shadow price of every bounded constraint: ₦/kg per extra unit of the bound."""
+        sens = self.sensitivity
+        if sens is None:
+            return pd.DataFrame()
+        bounded = np.isfinite(sens.row_lower) | np.isfinite(sens.row_upper)
+        out = pd.DataFrame({
+            "Constraint":         sens.row_labels,
+            "Level":              sens.row_activity.round(3),
+            "Min":                sens.row_lower,
+            "Max":                sens.row_upper,
+            "Shadow Price (₦/kg)": sens.row_duals.round(4),
+            "Binding":            np.abs(sens.row_duals) > 1e-9,
+            "Valid From":         sens.rhs_lower.round(3),
+            "Valid To":           sens.rhs_upper.round(3),
+        })[bounded]
+        return out.replace([np.inf, -np.inf], np.nan).reset_index(drop=True)
+
+
+# ─────────────────────────────────────────────
+#  SOLVE
+# ─────────────────────────────────────────────
+def _solve_pulp(model: FormulationModel, time_limit: float = None, mip_gap: float = None) -> tuple:
+    prob = LpProblem("FeedMix", LpMinimize)
+    x = [LpVariable(f"x{j}", lowBound=lo, upBound=hi)
+         for j, (lo, hi) in enumerate(zip(model.col_lower, model.col_upper))]
+    prob += LpAffineExpression(zip(x, model.cost.tolist()))
+    if model.is_mip:
+        y = [LpVariable(f"y{j}", cat="Binary") for j in range(model.matrix.size)]
+        for j, (xj, yj) in enumerate(zip(x, y)):
+            prob += xj <= float(model.col_upper[j]) * yj, f"link_max_{j}"
+            if model.min_inclusion > 0:
+                prob += xj >= model.min_inclusion * yj, f"link_min_{j}"
+        if model.max_ingredients is not None:
+            prob += LpAffineExpression((yj, 1.0) for yj in y) <= model.max_ingredients, "Ingredient_count"
+    # Rows are named by index: PuLP rewrites spaces and symbols in free-text labels such as rule names
+    for r in range(len(model.row_labels)):
+        nz = np.flatnonzero(model.A[r])
+        expr = LpAffineExpression((x[j], float(model.A[r, j])) for j in nz)
+        lo, hi = model.row_lower[r], model.row_upper[r]
+        if lo == hi:
+            prob += (expr == lo), f"row{r}"
+            continue
+        if np.isfinite(lo):
+            prob += (expr >= lo), f"row{r}_min"
+        if np.isfinite(hi):
+            prob += (expr <= hi), f"row{r}_max"
+    prob.solve(PULP_CBC_CMD(msg=False, timeLimit=time_limit if model.is_mip else None,
+                            gapRel=mip_gap if model.is_mip else None))
+    status = _pulp_status(prob, model.is_mip)
+    proportions = np.array([v.value() or 0.0 for v in x])
+    # CBC's iteration and node counts are not exposed through PuLP
+    stats = {"solve_time": prob.solutionTime, "iterations": None, "nodes": None}
+    sens = None
+    if status == "Optimal" and not model.is_mip:
+        # CBC reports duals and reduced costs but no ranging; split min/max rows share one dual
+        duals = np.array([sum((prob.constraints[name].pi or 0.0)
+                              for name in (f"row{r}", f"row{r}_min", f"row{r}_max") if name in prob.constraints)
+                          for r in range(len(model.row_labels))])
+        nan = np.full(model.matrix.size, np.nan)
+        sens = Sensitivity(model.row_labels, model.row_lower, model.row_upper, model.A @ proportions, duals,
+                           np.array([v.dj or 0.0 for v in x]), nan, nan,
+                           np.full(len(duals), np.nan), np.full(len(duals), np.nan))
+    return status, proportions, float(value(prob.objective) or 0.0), sens, stats
+
+
+# HiGHS model status → PuLP LpStatus string, so callers see one vocabulary
+_HIGHS_STATUS = {
+    "kOptimal":               "Optimal",
+    "kInfeasible":            "Infeasible",
+    "kUnboundedOrInfeasible": "Infeasible",
+    "kUnbounded":             "Unbounded",
+    "kTimeLimit":             "Not Solved",
+    "kIterationLimit":        "Not Solved",
+    "kInterrupt":             "Not Solved",
+}
+
+
+def _highs_status(model_status) -> str:
+    return _HIGHS_STATUS.get(model_status.name, "Undefined")
+
+
+def _pulp_status(prob: LpProblem, is_mip: bool) -> str:
+    # CBC reports a time-limited incumbent as "Optimal" with an integer-feasible solution status
+    status = LpStatus[prob.status]
+    if is_mip and status == "Optimal" and prob.sol_status == LpSolutionIntegerFeasible:
+        return TIME_LIMIT_FEASIBLE
+    return status
+
+
+def _csr(A: np.ndarray) -> tuple:
+    """Row-wise sparse triplet (starts, indices, values) of a dense matrix."""
+    rows, cols = np.nonzero(A)
+    starts = np.searchsorted(rows, np.arange(A.shape[0])).astype(np.int32)
+    return starts, cols.astype(np.int32), A[rows, cols].astype(float)
+
+
+def _load_highs(model: FormulationModel) -> "highspy.Highs":
+    h = highspy.Highs()
+    h.setOptionValue("output_flag", False)
+    n = model.matrix.size
+    h.addVars(n, model.col_lower, model.col_upper)
+    h.changeColsCost(n, np.arange(n, dtype=np.int32), model.cost)
+    starts, index, vals = _csr(model.A)
+    h.addRows(len(model.row_labels), model.row_lower, model.row_upper, len(vals), starts, index, vals)
+    if model.is_mip:
+        _add_cardinality(h, model)
+    return h
+
+
+def _add_cardinality(h: "highspy.Highs", model: FormulationModel) -> None:
+    """Append binary inclusion columns and their linking rows as sparse blocks."""
+    n = model.matrix.size
+    ids = np.arange(n, dtype=np.int32)
+    h.addVars(n, np.zeros(n), np.ones(n))
+    h.changeColsIntegrality(n, ids + n, np.full(n, highspy.HighsVarType.kInteger))
+    # x_j - u_j·y_j <= 0   and   x_j - m·y_j >= 0: two nonzeros per row
+    pair_starts = (2 * ids).astype(np.int32)
+    pair_index = np.column_stack([ids, ids + n]).ravel().astype(np.int32)
+    h.addRows(n, np.full(n, -np.inf), np.zeros(n), 2 * n, pair_starts, pair_index,
+              np.column_stack([np.ones(n), -model.col_upper]).ravel())
+    if model.min_inclusion > 0:
+        h.addRows(n, np.zeros(n), np.full(n, np.inf), 2 * n, pair_starts, pair_index,
+                  np.column_stack([np.ones(n), np.full(n, -model.min_inclusion)]).ravel())
+    if model.max_ingredients is not None:
+        h.addRow(-np.inf, float(model.max_ingredients), n, ids + n, np.ones(n))
+
+
+def _highs_sensitivity(h: "highspy.Highs", model: FormulationModel) -> Sensitivity:
+    sol = h.getSolution()
+    _, rg = h.getRanging()
+    n_cols, n_rows = model.matrix.size, len(model.row_labels)
+    if rg.valid:
+        cost_lower = np.asarray(rg.col_cost_dn.value_[:n_cols])
+        cost_upper = np.asarray(rg.col_cost_up.value_[:n_cols])
+        rhs_lower = np.asarray(rg.row_bound_dn.value_[:n_rows])
+        rhs_upper = np.asarray(rg.row_bound_up.value_[:n_rows])
+    else:
+        cost_lower = cost_upper = np.full(n_cols, np.nan)
+        rhs_lower = rhs_upper = np.full(n_rows, np.nan)
+    return Sensitivity(model.row_labels, model.row_lower, model.row_upper,
+                       np.asarray(sol.row_value), np.asarray(sol.row_dual), np.asarray(sol.col_dual),
+                       cost_lower, cost_upper, rhs_lower, rhs_upper)
+
+
+def _read_highs(h: "highspy.Highs", model: FormulationModel, with_sensitivity: bool = True) -> tuple:
+    info = h.getInfo()
+    status = _highs_status(h.getModelStatus())
+    stats = {"solve_time": h.getRunTime(), "iterations": info.simplex_iteration_count,
+             "nodes": info.mip_node_count if model.is_mip else None}
+    if model.is_mip:
+        stats["mip_gap"] = info.mip_gap
+        # A budget stop with an incumbent still yields that formula, flagged as unproven
+        if status == "Not Solved" and info.primal_solution_status == 2:
+            status = TIME_LIMIT_FEASIBLE
+    proportions = np.asarray(h.getSolution().col_value, dtype=float)[:model.matrix.size]
+    sens = None
+    if with_sensitivity and status == "Optimal" and not model.is_mip:
+        sens = _highs_sensitivity(h, model)
+    return status, proportions, float(info.objective_function_value), sens, stats
+
+
+def _solve_highs(model: FormulationModel, time_limit: float = None, mip_gap: float = None) -> tuple:
+    h = _load_highs(model)
+    if model.is_mip:
+        if time_limit is not None:
+            h.setOptionValue("time_limit", float(time_limit))
+        if mip_gap is not None:
+            h.setOptionValue("mip_rel_gap", float(mip_gap))
+    h.run()
+    return _read_highs(h, model)
+
+
+SOLVERS = {"highs": _solve_highs, "cbc": _solve_pulp}
+
+
+def solve_sparse_lp(cost: np.ndarray, col_lower: np.ndarray, col_upper: np.ndarray,
+                    row_lower: np.ndarray, row_upper: np.ndarray, csr: tuple,
+                    solver: str = DEFAULT_SOLVER, integrality: np.ndarray = None,
+                    time_limit: float = None, mip_gap: float = None) -> tuple:
+    """Minimise ``cost·x`` for an LP given as a row-wise sparse triplet.
+
+    Used by models larger than a single formula (e.g. whole-mill planning).
+    ``integrality`` marks integer columns (True/1), making it a MILP solved
+    within ``time_limit`` and ``mip_gap``; duals are then zero.
+    Returns ``(status, x, objective, row_duals)``.
+    """
+    starts, index, vals = csr
+    n, m = len(cost), len(row_lower)
+    is_mip = integrality is not None and np.any(integrality)
+    if _resolve_solver(solver) == "highs":
+        h = highspy.Highs()
+        h.setOptionValue("output_flag", False)
+        h.addVars(n, np.asarray(col_lower, dtype=float), np.asarray(col_upper, dtype=float))
+        h.changeColsCost(n, np.arange(n, dtype=np.int32), np.asarray(cost, dtype=float))
+        h.addRows(m, np.asarray(row_lower, dtype=float), np.asarray(row_upper, dtype=float),
+                  len(vals), np.asarray(starts, dtype=np.int32), np.asarray(index, dtype=np.int32),
+                  np.asarray(vals, dtype=float))
+        if is_mip:
+            ints = np.flatnonzero(integrality).astype(np.int32)
+            h.changeColsIntegrality(len(ints), ints, np.full(len(ints), highspy.HighsVarType.kInteger))
+            if time_limit is not None:
+                h.setOptionValue("time_limit", float(time_limit))
+            if mip_gap is not None:
+                h.setOptionValue("mip_rel_gap", float(mip_gap))
+        h.run()
+        status = _highs_status(h.getModelStatus())
+        info = h.getInfo()
+        if is_mip and status == "Not Solved" and info.primal_solution_status == 2:
+            status = TIME_LIMIT_FEASIBLE
+        sol = h.getSolution()
+        duals = np.zeros(m) if is_mip else np.asarray(sol.row_dual, dtype=float)
+        return (status, np.asarray(sol.col_value, dtype=float), float(info.objective_function_value), duals)
+    prob = LpProblem("SparseLP", LpMinimize)
+    x = [LpVariable(f"x{j}", lowBound=lo if np.isfinite(lo) else None, upBound=hi if np.isfinite(hi) else None,
+                    cat="Integer" if is_mip and integrality[j] else "Continuous")
+         for j, (lo, hi) in enumerate(zip(col_lower, col_upper))]
+    prob += LpAffineExpression(zip(x, np.asarray(cost, dtype=float).tolist()))
+    ends = np.append(starts[1:], len(vals))
+    for r in range(m):
+        expr = LpAffineExpression((x[j], float(v)) for j, v in zip(index[starts[r]:ends[r]], vals[starts[r]:ends[r]]))
+        lo, hi = row_lower[r], row_upper[r]
+        if lo == hi:
+            prob += (expr == lo), f"r{r}"
+            continue
+        if np.isfinite(lo):
+            prob += (expr >= lo), f"r{r}_min"
+        if np.isfinite(hi):
+            prob += (expr <= hi), f"r{r}_max"
+    prob.solve(PULP_CBC_CMD(msg=False, timeLimit=time_limit if is_mip else None,
+                            gapRel=mip_gap if is_mip else None))
+    duals = np.zeros(m) if is_mip else np.array([
+        sum((prob.constraints[name].pi or 0.0) for name in (f"r{r}", f"r{r}_min", f"r{r}_max")
+            if name in prob.constraints) for r in range(m)])
+    return (_pulp_status(prob, is_mip), np.array([v.value() or 0.0 for v in x]),
+            float(value(prob.objective) or 0.0), duals)
+
+
+def _result(matrix: IngredientMatrix, status: str, proportions: np.ndarray, cost: float,
+            sensitivity: Sensitivity = None, stats: dict = None) -> FormulationResult:
+    if status not in ("Optimal", TIME_LIMIT_FEASIBLE):
+        proportions = np.zeros(matrix.size)
+        cost = 0.0
+    return FormulationResult(status, matrix, proportions, cost, sensitivity, stats or {})
+
+
+def _instrument(result: FormulationResult, solver: str, size: dict, t0: float, t1: float, t2: float,
+                source: str = "formulate") -> None:
+    """Fill ``result.stats`` with phase timings and model size, then record it.
+
+    ``solve_time`` is the wall time around the solver call (model load
+    included); the solver's own figure is kept as ``solver_time``. ``source``
+    names the call path, so session sweeps don't swamp one-off solves in the
+    latency percentiles.
+    """
+    t3 = time.perf_counter()
+    stats = result.stats
+    if "solve_time" in stats:
+        stats["solver_time"] = stats.pop("solve_time")
+    stats.update(source=source, solver=solver, status=result.status, build_time=t1 - t0, solve_time=t2 - t1,
+                 post_time=t3 - t2, total_time=t3 - t0, **size)
+    record(stats)
+
+
+def _resolve_solver(solver: str) -> str:
+    return "cbc" if solver == "highs" and highspy is None else solver
+
+
+def formulate(matrix: IngredientMatrix, targets: NutrientTargets, solver: str = DEFAULT_SOLVER,
+              max_ingredients: int = None, min_inclusion: float = 0.0,
+              time_limit: float = None, mip_gap: float = None) -> FormulationResult:
+    """Find the least-cost blend of ``matrix`` meeting ``targets``.
+
+    ``max_ingredients`` caps how many ingredients the formula may use and
+    ``min_inclusion`` (a fraction, e.g. 0.01) forbids dust inclusions below it;
+    either turns the LP into a MILP solved within ``time_limit`` seconds and a
+    relative ``mip_gap`` (defaults from ``MIP_CONFIG``).
+    """
+    return _formulate(matrix, targets, solver, max_ingredients, min_inclusion, time_limit, mip_gap)
+
+
+def _formulate(matrix: IngredientMatrix, targets: NutrientTargets, solver: str, max_ingredients: int = None,
+               min_inclusion: float = 0.0, time_limit: float = None, mip_gap: float = None,
+               source: str = "formulate") -> FormulationResult:
+    t0 = time.perf_counter()
+    solver = _resolve_solver(solver)
+    model = build_model(matrix, targets)
+    model.max_ingredients = max_ingredients
+    model.min_inclusion = min_inclusion
+    time_limit = MIP_CONFIG["time_limit"] if time_limit is None else time_limit
+    mip_gap = MIP_CONFIG["mip_gap"] if mip_gap is None else mip_gap
+    t1 = time.perf_counter()
+    status, x, cost, sens, stats = SOLVERS[solver](model, time_limit, mip_gap)
+    t2 = time.perf_counter()
+    result = _result(matrix, status, x, cost, sens, stats)
+    _instrument(result, solver, model.size(), t0, t1, t2, source)
+    return result
+
+
+class FormulationSession:
+    """Persistent model over one ingredient matrix for many consecutive solves.
+
+    The constraint matrix is loaded once with a row per catalogue nutrient;
+    each ``solve`` only rewrites row bounds (and the cost vector when one is
+    passed), so HiGHS restarts from the previous optimal basis instead of
+    solving from scratch. Without highspy every call falls back to a fresh
+    ``formulate``. ``sensitivity=False`` skips the ranging pass for hot loops
+    that only need the formula and its cost. The model is reloaded only when
+    a solve brings a different ``InclusionRules`` object.
+    """
+
+    def __init__(self, matrix: IngredientMatrix, solver: str = DEFAULT_SOLVER, sensitivity: bool = True):
+        self.matrix = matrix
+        self.solver = _resolve_solver(solver)
+        self.sensitivity = sensitivity
+        self._highs = None
+        if self.solver == "highs":
+            self._load(None)
+
+    def _load(self, rules: InclusionRules) -> None:
+        self._rules = rules
+        self._model = build_model(self.matrix, NutrientTargets(rules=rules), nutrients=self.matrix.nutrients)
+        self._highs = _load_highs(self._model)
+        self._size = self._model.size()
+
+    def solve(self, targets: NutrientTargets, cost: np.ndarray = None) -> FormulationResult:
+        matrix = self.matrix if cost is None else replace(self.matrix, cost=np.asarray(cost, dtype=float))
+        if self._highs is None:
+            return _formulate(matrix, targets, self.solver, source="session")
+        t0 = time.perf_counter()
+        if targets.rules is not self._rules:
+            self._load(targets.rules)
+        if self._model.matrix.cost is not matrix.cost:
+            # The model keeps the last prices written to it: this call's, or the catalogue's when none are passed
+            n = matrix.size
+            self._highs.changeColsCost(n, np.arange(n, dtype=np.int32), matrix.cost)
+            self._model.matrix = matrix
+        k = len(self.matrix.nutrients)
+        lower = np.array([targets.minimum.get(n, -np.inf) for n in self.matrix.nutrients], dtype=float)
+        upper = np.array([targets.maximum.get(n, np.inf) for n in self.matrix.nutrients], dtype=float)
+        self._highs.changeRowsBounds(k, np.arange(1, k + 1, dtype=np.int32), lower, upper)
+        # Fresh arrays, not in-place writes: earlier results' Sensitivity still holds the old ones
+        row_lower, row_upper = self._model.row_lower.copy(), self._model.row_upper.copy()
+        row_lower[1:k + 1], row_upper[1:k + 1] = lower, upper
+        self._model.row_lower, self._model.row_upper = row_lower, row_upper
+        t1 = time.perf_counter()
+        self._highs.run()
+        t2 = time.perf_counter()
+        result = _result(matrix, *_read_highs(self._highs, self._model, self.sensitivity))
+        _instrument(result, self.solver, self._size, t0, t1, t2, "session")
+        return result
@@ -0,0 +1,167 @@
+"""
+Growth-aware formulation: the feed with the lowest cost per kg of gain.
+
+Least-cost formulation meets fixed CP and energy minimums at the lowest ₦/kg
+of feed, but a denser diet can pay for itself in faster growth.
+``optimize_cost_per_gain`` searches the diet's CP × energy levels with the
+growth model as a surrogate: every candidate level is a least-cost solve
+(other targets and inclusion rules as given), and the animal is then
+simulated on the formula's achieved CP and energy. The objective is feed
+₦/kg × FCR over ``days``, i.e. feed cost per kg of predicted gain.
+
+Each round solves a grid of candidates, then simulates all of them together,
+so every simulated day is one batched ``predict`` over the whole grid. The
+next round refines a narrower grid around the best point. LP solves
+warm-start along the grid in one ``FormulationSession``; grids of at least
+``min_parallel`` points are split across a process pool.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from formulation_batch import _chunks, _pool
+from formulation_engine import (DEFAULT_SOLVER, FormulationResult, FormulationSession, IngredientMatrix,
+                                NutrientTargets, formulate)
+from growth_simulation import simulate_growth
+
+GROWTH_SEARCH_CONFIG = {
+    "cp_span":      (-2.0, 4.0),      # default CP search range around the base minimum (% points)
+    "energy_span":  (-150.0, 300.0),  # default energy search range around the base minimum (kcal/kg)
+    "steps":        11,               # grid points per axis per round
+    "rounds":       3,                # each round refines around the previous best
+    "shrink":       0.3,              # next round's span as a fraction of this one's
+    "days":         90,
+    "min_parallel": 20000,            # warm-started solves take ~0.1 ms; smaller grids finish before a pool spawns
+}
+
+
+@dataclass
+class GrowthSearchResult:
+    """Every evaluated candidate plus the winning formula and its targets."""
+    candidates: pd.DataFrame
+    best: FormulationResult
+    targets: NutrientTargets
+    baseline: pd.Series   # the least-cost formula at the base targets, for comparison
+
+    @property
+    def optimal(self) -> bool:
+        return self.best is not None and self.best.optimal
+
+    @property
+    def summary(self) -> pd.Series:
+        return self.candidates.iloc[0]
+
+
+def candidate_targets(base: NutrientTargets, cp: float, energy: float) -> NutrientTargets:
+    """``base`` with CP/energy minimums moved to ``cp``/``energy``; caps rise to match, as in the app."""
+    targets = NutrientTargets(dict(base.minimum), dict(base.maximum), base.rules)
+    targets.minimum.update({"CP": cp, "Energy": energy})
+    for nutrient, level in (("CP", cp), ("Energy", energy)):
+        if nutrient in targets.maximum:
+            targets.maximum[nutrient] = max(level, targets.maximum[nutrient])
+    return targets
+
+
+def _grid(cp_range: tuple, energy_range: tuple, steps: int) -> np.ndarray:
+    # Serpentine order, so each solve warm-starts from a neighbouring grid point
+    cps, energies = np.linspace(*cp_range, steps), np.linspace(*energy_range, steps)
+    return np.array([(cp, e) for i, cp in enumerate(cps) for e in (energies if i % 2 == 0 else energies[::-1])])
+
+
+def _solve_points(matrix: IngredientMatrix, base: NutrientTargets, points: np.ndarray, solver: str) -> tuple:
+    session = FormulationSession(matrix, solver=solver, sensitivity=False)
+    costs = np.full(len(points), np.nan)
+    proportions = np.zeros((len(points), matrix.size))
+    for i, (cp, energy) in enumerate(points):
+        res = session.solve(candidate_targets(base, cp, energy))
+        if res.optimal:
+            costs[i], proportions[i] = res.cost_per_kg, res.proportions
+    return costs, proportions
+
+
+def solve_points(matrix: IngredientMatrix, base: NutrientTargets, points: np.ndarray,
+                 solver: str = DEFAULT_SOLVER, processes: int = None) -> tuple:
+    """Least cost (NaN if infeasible) and mix at each (CP, energy) point."""
+    if not processes or processes <= 1 or len(points) < GROWTH_SEARCH_CONFIG["min_parallel"]:
+        return _solve_points(matrix, base, points, solver)
+    chunks = _chunks(points, min(processes, len(points)))
+    with _pool(len(chunks)) as pool:
+        parts = list(pool.map(_solve_points, [matrix] * len(chunks), [base] * len(chunks),
+                              chunks, [solver] * len(chunks)))
+    return np.concatenate([c for c, _ in parts]), np.vstack([p for _, p in parts])
+
+
+def evaluate_candidates(model, matrix: IngredientMatrix, costs: np.ndarray, proportions: np.ndarray,
+                        animal: dict, days: int) -> pd.DataFrame:
+    """Simulate growth on every feasible candidate formula in one batch.
+
+    ``animal`` holds the other growth-model inputs: ``age_weeks``, ``weight``,
+    ``cp_req``, ``energy_req`` and ``feed_intake``.
+    """
+    ok = np.isfinite(costs)
+    diet = matrix.values @ proportions.T
+    diet_cp, diet_energy = diet[matrix.nutrients.index("CP")], diet[matrix.nutrients.index("Energy")]
+    out = pd.DataFrame({"Feed Cost/kg (₦)": costs, "Diet CP (%)": diet_cp, "Diet Energy (kcal/kg)": diet_energy,
+                        "Daily Gain (g)": np.nan, "Final Weight (kg)": np.nan, "FCR": np.nan})
+    if ok.any():
+        trajectory = simulate_growth(model, animal["age_weeks"], animal["weight"], animal["cp_req"],
+                                     animal["energy_req"], animal["feed_intake"], diet_cp[ok], diet_energy[ok],
+                                     days=days)
+        out.loc[ok, "Daily Gain (g)"] = trajectory.gain[:, 0]
+        out.loc[ok, "Final Weight (kg)"] = trajectory.weight_at(days)
+        out.loc[ok, "FCR"] = trajectory.fcr(days)
+    out["Cost per kg Gain (₦)"] = out["Feed Cost/kg (₦)"] * out["FCR"]
+    return out
+
+
+def optimize_cost_per_gain(model, matrix: IngredientMatrix, base: NutrientTargets, animal: dict,
+                           cp_range: tuple = None, energy_range: tuple = None, steps: int = None,
+                           rounds: int = None, days: int = None, solver: str = DEFAULT_SOLVER,
+                           processes: int = None) -> GrowthSearchResult:
+    """Search CP × energy levels for the lowest feed cost per kg of predicted gain.
+
+    ``model`` is the growth model (see ``growth_model``); ``base`` supplies
+    every other target and the inclusion rules. Ranges default to
+    ``GROWTH_SEARCH_CONFIG`` spans around the base minimums. ``candidates``
+    lists every point evaluated, best first; ties (a forest predicts the same
+    gain over a region) go to the cheaper feed.
+    """
+    cfg = GROWTH_SEARCH_CONFIG
+    steps = steps or cfg["steps"]
+    rounds = rounds or cfg["rounds"]
+    days = days or cfg["days"]
+    cp0, energy0 = base.minimum.get("CP", 16.0), base.minimum.get("Energy", 2600.0)
+    cp_range = cp_range or (max(0.0, cp0 + cfg["cp_span"][0]), cp0 + cfg["cp_span"][1])
+    energy_range = energy_range or (max(0.0, energy0 + cfg["energy_span"][0]), energy0 + cfg["energy_span"][1])
+    lo, hi = np.array([cp_range[0], energy_range[0]]), np.array([cp_range[1], energy_range[1]])
+
+    frames = []
+    # Round 0 is the least-cost formula at the base targets themselves
+    points, a, b = np.array([[cp0, energy0]]), lo, hi
+    for r in range(rounds + 1):
+        if r > 0:
+            points = _grid((a[0], b[0]), (a[1], b[1]), steps)
+        costs, proportions = solve_points(matrix, base, points, solver, processes)
+        frame = evaluate_candidates(model, matrix, costs, proportions, animal, days)
+        frame.insert(0, "Round", r)
+        frame.insert(1, "CP Target (%)", points[:, 0])
+        frame.insert(2, "Energy Target (kcal/kg)", points[:, 1])
+        frames.append(frame)
+        scored = frame["Cost per kg Gain (₦)"]
+        if r > 0:
+            if scored.isna().all():
+                break
+            centre, half = points[int(scored.idxmin())], (b - a) * cfg["shrink"] / 2
+            a, b = np.maximum(lo, centre - half), np.minimum(hi, centre + half)
+
+    candidates = pd.concat(frames, ignore_index=True)
+    baseline = candidates.iloc[0]
+    ranked = candidates.sort_values(["Cost per kg Gain (₦)", "Feed Cost/kg (₦)"], na_position="last",
+                                    kind="stable").reset_index(drop=True)
+    best = targets = None
+    if ranked["Cost per kg Gain (₦)"].notna().any():
+        top = ranked.iloc[0]
+        targets = candidate_targets(base, top["CP Target (%)"], top["Energy Target (kcal/kg)"])
+        best = formulate(matrix, targets, solver=solver)   # full result, sensitivity included
+    return GrowthSearchResult(ranked, best, targets, baseline)
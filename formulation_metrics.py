@@ -0,0 +1,96 @@
+"""
+Per-solve instrumentation: phase timings, model size and solver counters.
+
+Every ``formulate`` / ``FormulationSession.solve`` / ``formulate_robust``
+call fills ``FormulationResult.stats`` with a record like
+
+    {"source": "formulate", "solver": "highs", "status": "Optimal", "build_time": 0.0002,
+     "solve_time": 0.0011, "post_time": 0.0001, "total_time": 0.0014,
+     "rows": 9, "cols": 25, "nonzeros": 168, "integers": 0,
+     "iterations": 7, "nodes": None}
+
+and passes it to ``record``, which writes one JSON line to the
+``formulation.metrics`` logger (silent unless the host configures it, e.g.
+``logging.basicConfig(level=logging.INFO)``) and keeps it in a bounded
+in-memory window for latency percentiles. ``source`` is the call path
+("formulate", "session", "robust", "batch_sheet"): percentiles are kept
+apart per source, so a batch sweep's thousands of warm-started session
+solves don't stand in for the latency of an interactive solve.
+"""
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("formulation.metrics")
+
+METRICS_CONFIG = {
+    "window": 2000,   # most recent solves kept for percentiles, per source
+}
+
+PHASES = ("build_time", "solve_time", "post_time", "total_time")
+
+
+class SolveMetrics:
+    """Thread-safe rolling windows of solve records, one per source."""
+
+    def __init__(self, window: int = None):
+        self.window = window or METRICS_CONFIG["window"]
+        self._records = {}   # source -> deque of records
+        self._lock = threading.Lock()
+
+    def observe(self, stats: dict) -> None:
+        with self._lock:
+            records = self._records.setdefault(stats.get("source", "?"), deque(maxlen=self.window))
+            records.append({"time": time.time(), **stats})
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records.clear()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(records) for records in self._records.values())
+
+    def _all(self) -> list:
+        with self._lock:
+            records = [r for window in self._records.values() for r in window]
+        return sorted(records, key=lambda r: r["time"])
+
+    def recent(self, n: int = 50) -> pd.DataFrame:
+        return pd.DataFrame(self._all()[-n:])
+
+    def summary(self) -> pd.DataFrame:
+        """p50 / p95 / max milliseconds per phase, per source and solver, over the windows."""
+        records = self._all()
+        if not records:
+            return pd.DataFrame(columns=["Source", "Solver", "Phase", "Solves", "p50 (ms)", "p95 (ms)", "Max (ms)"])
+        df = pd.DataFrame(records)
+        keys = [df.get(key, pd.Series("?", index=df.index)).fillna("?") for key in ("source", "solver")]
+        rows = []
+        for (source, solver), group in df.groupby(keys):
+            for phase in PHASES:
+                if phase not in group:
+                    continue
+                ms = group[phase].dropna().to_numpy(dtype=float) * 1000
+                if len(ms):
+                    rows.append({"Source": source, "Solver": solver, "Phase": phase.replace("_time", ""),
+                                 "Solves": len(ms),
+                                 "p50 (ms)": round(float(np.percentile(ms, 50)), 3),
+                                 "p95 (ms)": round(float(np.percentile(ms, 95)), 3),
+                                 "Max (ms)": round(float(ms.max()), 3)})
+        return pd.DataFrame(rows)
+
+
+METRICS = SolveMetrics()
+
+
+def record(stats: dict) -> None:
+    """Log one solve as a JSON line and add it to ``METRICS``."""
+    METRICS.observe(stats)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps(stats, default=float))
@@ -0,0 +1,278 @@
+"""
+Chance-constrained formulation for ingredient nutrient variability.
+
+Catalogue values are batch means; real maize or groundnut cake deliveries
+scatter around them, so a formula sized exactly at a minimum meets it only
+about half the time. With independent normal nutrient levels of standard
+deviation ``σ`` a target holds with probability ``confidence`` when
+
+    μ·x − z·‖σ ∘ x‖₂ ≥ min        μ·x + z·‖σ ∘ x‖₂ ≤ max
+
+where ``z`` is the normal quantile of ``confidence``. The margin goes on
+minimums only, plus the maximums named in ``caps``: a stage's other maximums
+are the top of its recommended range, not a safety limit, and a margin on
+both sides of a narrow range (CP 19–20%) squeezes it shut. Higher confidence
+costs more and leaves fewer stages feasible: with the bundled catalogues and
+variability table, 0.85 keeps every stage but the cattle Calf Starter
+feasible (its formula already sits on its calcium cap), while 0.90 loses
+another stage, and 0.90 with margins on every maximum loses six.
+
+Two ways to enforce it:
+
+* ``"linear"`` — since ``x ≥ 0``, ``‖σ ∘ x‖₂ ≤ σ·x``, so shifting each
+  coefficient by ``z·σ`` gives a conservative LP of the same size as the
+  nominal one: one solve, slightly over-safe.
+* ``"soc"`` — the second-order cone itself, written as one larger LP: the
+  norm is built from a tree of 2-D norms, each bounded by a fine polygon,
+  with ``z`` nudged up to cover the polygon's error. Within about 1% of the
+  exact cone, always on the safe side, and solved by the same LP solvers.
+"""
+import time
+from dataclasses import replace
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from formulation_engine import (DEFAULT_SOLVER, MIP_CONFIG, SOLVERS, FormulationResult, IngredientMatrix,
+                                NutrientTargets, _instrument, _resolve_solver, _result, build_model,
+                                solve_sparse_lp)
+
+VARIABILITY_FILE = "ingredient_variability.csv"
+
+ROBUST_CONFIG = {
+    "confidence": 0.85,
+    "method":     "soc",
+    "caps":       (),     # nutrients whose maximum is a safety limit and also gets a margin
+    "segments":   16,     # polygon sides per quadrant in the "soc" cone approximation
+}
+
+
+def load_variability(path: str = VARIABILITY_FILE) -> pd.DataFrame:
+    """Long table of per-ingredient standard deviations: (Ingredient, Nutrient, SD)."""
+    table = pd.read_csv(path)
+    table["SD"] = pd.to_numeric(table["SD"], errors="coerce").fillna(0.0)
+    return table
+
+
+def nutrient_sd(matrix: IngredientMatrix, variability: pd.DataFrame = None, default_cv: float = 0.0) -> np.ndarray:
+    """Standard deviations aligned with ``matrix.values``.
+
+    Pairs missing from ``variability`` get ``default_cv`` × their mean level
+    (zero by default: synthetic amino acids and minerals hardly vary).
+    """
+    sd = default_cv * np.abs(matrix.values)
+    if variability is not None and len(variability):
+        pos = pd.DataFrame({"Ingredient": matrix.ingredients, "col": np.arange(matrix.size)}).merge(
+            variability[variability["Nutrient"].isin(matrix.nutrients)], on="Ingredient")
+        sd[pos["Nutrient"].map(matrix.nutrients.index).to_numpy(), pos["col"].to_numpy()] = pos["SD"].to_numpy()
+    return sd
+
+
+def safety_factor(confidence: float) -> float:
+    return NormalDist().inv_cdf(confidence)
+
+
+def _sides(model, sd: np.ndarray, matrix: IngredientMatrix, caps) -> list:
+    """One-sided chance constraints as ``(label, sign, mean_row, sd_row, bound)``; sign +1 for a minimum.
+
+    Every minimum gets one; a maximum only when its nutrient is in ``caps``.
+    """
+    out = []
+    for i, label in enumerate(model.row_labels[1:], start=1):
+        # Ingredient rules carry no composition uncertainty
+        if label not in matrix.nutrients:
+            continue
+        k = matrix.nutrients.index(label)
+        if not sd[k].any():
+            continue
+        if np.isfinite(model.row_lower[i]):
+            out.append((label, 1.0, matrix.values[k], sd[k], model.row_lower[i]))
+        if np.isfinite(model.row_upper[i]) and label in caps:
+            out.append((label, -1.0, matrix.values[k], sd[k], model.row_upper[i]))
+    return out
+
+
+def _linear_model(model, sides: list, z: float):
+    """Each chance-constrained side moved off its nominal row onto a row shifted by z·σ.
+
+    The nominal row keeps any side without a margin (a maximum not in ``caps``).
+    """
+    lower, upper = model.row_lower.copy(), model.row_upper.copy()
+    for label, sign, *_ in sides:
+        i = model.row_labels.index(label)
+        if sign > 0:
+            lower[i] = -np.inf
+        else:
+            upper[i] = np.inf
+    rows = [model.A] + [(mean - sign * z * sdev)[None, :] for _, sign, mean, sdev, _ in sides]
+    lower = [lower] + [[b if sign > 0 else -np.inf] for _, sign, _, _, b in sides]
+    upper = [upper] + [[b if sign < 0 else np.inf] for _, sign, _, _, b in sides]
+    return replace(model, A=np.vstack(rows), row_lower=np.concatenate(lower), row_upper=np.concatenate(upper),
+                   row_labels=list(model.row_labels) + [label for label, *_ in sides])
+
+
+def _cone_model(model, sides: list, z: float, segments: int) -> tuple:
+    """Sparse LP with each ``‖σ ∘ x‖₂`` replaced by a tree of polygonal 2-D norms.
+
+    Leaves ``σ_j·x_j`` are paired up; each pair ``(a, b)`` gets a column
+    ``c >= a·cosθ + b·sinθ`` for ``segments + 1`` angles over the quadrant, so
+    ``c`` is within a factor ``cos(π / 4·segments)`` of ``‖(a, b)‖``. Inflating
+    ``z`` by that factor per tree level keeps the result on the safe side.
+    Returns ``(n_cols, rows, cols, vals, lower, upper)`` in COO form.
+    """
+    n = model.matrix.size
+    theta = np.linspace(0.0, np.pi / 2, segments + 1)
+    br, bc = np.nonzero(model.A)
+    rows, cols, vals = [br], [bc], [model.A[br, bc]]
+    lower, upper = list(model.row_lower), list(model.row_upper)
+    r, n_cols = len(lower), n
+
+    def add_row(terms, lo, hi):
+        nonlocal r
+        rows.append(np.full(len(terms), r))
+        cols.append(np.array([c for c, _ in terms], dtype=int))
+        vals.append(np.array([v for _, v in terms], dtype=float))
+        lower.append(lo)
+        upper.append(hi)
+        r += 1
+
+    for _, sign, mean, sdev, bound in sides:
+        level = [[(j, sdev[j])] for j in np.flatnonzero(sdev)]
+        depth = 0
+        while len(level) > 1:
+            depth += 1
+            nxt = []
+            for a, b in zip(level[0::2], level[1::2]):
+                c, n_cols = n_cols, n_cols + 1
+                # One row per angle: c - cosθ·a - sinθ·b >= 0
+                k = len(theta)
+                ka, va = np.array([t[0] for t in a]), np.array([t[1] for t in a])
+                kb, vb = np.array([t[0] for t in b]), np.array([t[1] for t in b])
+                rows.append(np.repeat(np.arange(r, r + k), 1 + len(a) + len(b)))
+                cols.append(np.tile(np.concatenate([[c], ka, kb]), k))
+                vals.append(np.column_stack([np.ones(k), -np.outer(np.cos(theta), va),
+                                             -np.outer(np.sin(theta), vb)]).ravel())
+                lower.extend([0.0] * k)
+                upper.extend([np.inf] * k)
+                r += k
+                nxt.append([(c, 1.0)])
+            if len(level) % 2:
+                nxt.append(level[-1])
+            level = nxt
+        z_safe = z / np.cos(np.pi / (4 * segments)) ** depth
+        terms = [(j, sign * mean[j]) for j in np.flatnonzero(mean)] + [(k, -z_safe * v) for k, v in level[0]]
+        add_row(terms, sign * bound, np.inf)
+    return n_cols, rows, cols, vals, lower, upper
+
+
+def formulate_robust(matrix: IngredientMatrix, targets: NutrientTargets, sd: np.ndarray,
+                     confidence: float = None, method: str = None, solver: str = DEFAULT_SOLVER,
+                     max_ingredients: int = None, min_inclusion: float = 0.0,
+                     time_limit: float = None, mip_gap: float = None, caps=None) -> FormulationResult:
+    """Least-cost blend meeting every minimum with probability ``confidence``.
+
+    ``sd`` holds nutrient standard deviations aligned with ``matrix.values``
+    (see ``nutrient_sd``). Maximums of the nutrients in ``caps`` (default
+    ``ROBUST_CONFIG["caps"]``) are held at ``confidence`` too; the others
+    hold on average. Other options are as for ``formulate``. No
+    sensitivity report is produced: the duals of the margin rows do not map
+    back onto the nominal targets.
+    """
+    t0 = time.perf_counter()
+    confidence = ROBUST_CONFIG["confidence"] if confidence is None else confidence
+    method = method or ROBUST_CONFIG["method"]
+    solver = _resolve_solver(solver)
+    z = safety_factor(confidence)
+    model = build_model(matrix, targets)
+    model.max_ingredients, model.min_inclusion = max_ingredients, min_inclusion
+    time_limit = MIP_CONFIG["time_limit"] if time_limit is None else time_limit
+    mip_gap = MIP_CONFIG["mip_gap"] if mip_gap is None else mip_gap
+    caps = ROBUST_CONFIG["caps"] if caps is None else caps
+    sides = _sides(model, np.asarray(sd, dtype=float), matrix, set(caps))
+
+    if method == "linear":
+        linear = _linear_model(model, sides, z)
+        t1 = time.perf_counter()
+        status, x, cost, _, stats = SOLVERS[solver](linear, time_limit, mip_gap)
+        t2 = time.perf_counter()
+        result = _result(matrix, status, x, cost, None, {**stats, "confidence": confidence})
+        _instrument(result, solver, linear.size(), t0, t1, t2, "robust")
+        return result
+    if method != "soc":
+        raise ValueError(f"unknown robust method {method!r}")
+
+    n = matrix.size
+    n_cols, rows, cols, vals, lower, upper = _cone_model(model, sides, z, ROBUST_CONFIG["segments"])
+    integrality = None
+    if model.is_mip:
+        # Binary y_j (appended after the cone columns) with x_j <= y_j, x_j >= m·y_j, Σy <= max_ingredients
+        y = np.arange(n) + n_cols
+        r0 = len(lower)
+        rows += [np.repeat(np.arange(n) + r0, 2)]
+        cols += [np.column_stack([np.arange(n), y]).ravel()]
+        vals += [np.column_stack([np.ones(n), -model.col_upper]).ravel()]
+        lower += [-np.inf] * n
+        upper += [0.0] * n
+        if min_inclusion > 0:
+            rows += [np.repeat(np.arange(n) + len(lower), 2)]
+            cols += [np.column_stack([np.arange(n), y]).ravel()]
+            vals += [np.column_stack([np.ones(n), np.full(n, -min_inclusion)]).ravel()]
+            lower += [0.0] * n
+            upper += [np.inf] * n
+        if max_ingredients is not None:
+            rows += [np.full(n, len(lower))]
+            cols += [y]
+            vals += [np.ones(n)]
+            lower += [-np.inf]
+            upper += [float(max_ingredients)]
+        integrality = np.zeros(n_cols + n, dtype=bool)
+        integrality[n_cols:] = True
+        n_cols += n
+    rows, cols, vals = np.concatenate(rows), np.concatenate(cols), np.concatenate(vals)
+    order = np.lexsort((cols, rows))
+    rows, cols, vals = rows[order], cols[order], vals[order]
+    starts = np.searchsorted(rows, np.arange(len(lower)))
+    col_lower, col_upper = np.zeros(n_cols), np.full(n_cols, np.inf)
+    col_lower[:n], col_upper[:n] = model.col_lower, model.col_upper
+    if integrality is not None:
+        col_upper[integrality] = 1.0
+    t1 = time.perf_counter()
+    status, x, cost, _ = solve_sparse_lp(
+        np.concatenate([matrix.cost, np.zeros(n_cols - n)]), col_lower, col_upper,
+        np.array(lower), np.array(upper), (starts, cols, vals), solver=solver,
+        integrality=integrality, time_limit=time_limit, mip_gap=mip_gap)
+    t2 = time.perf_counter()
+    result = _result(matrix, status, x[:n], cost, None, {"confidence": confidence})
+    _instrument(result, solver, {"rows": len(lower), "cols": n_cols, "nonzeros": len(vals),
+                                 "integers": int(integrality.sum()) if integrality is not None else 0},
+                t0, t1, t2, "robust")
+    return result
+
+
+def delivery_profile(result: FormulationResult, targets: NutrientTargets, sd: np.ndarray,
+                     confidence: float = None) -> pd.DataFrame:
+    """Expected level, spread and probability of meeting each target for a formula."""
+    confidence = ROBUST_CONFIG["confidence"] if confidence is None else confidence
+    z = safety_factor(confidence)
+    x = result.proportions
+    mean = result.matrix.values @ x
+    spread = np.sqrt((np.asarray(sd) ** 2) @ (x ** 2))
+    dist = NormalDist()
+    lo = np.array([targets.minimum.get(n, -np.inf) for n in result.matrix.nutrients])
+    hi = np.array([targets.maximum.get(n, np.inf) for n in result.matrix.nutrients])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p_lo = np.where(np.isfinite(lo), [dist.cdf(v) for v in np.where(spread > 0, (mean - lo) / spread,
+                                                                        np.where(mean >= lo - 1e-9, np.inf, -np.inf))], 1.0)
+        p_hi = np.where(np.isfinite(hi), [dist.cdf(v) for v in np.where(spread > 0, (hi - mean) / spread,
+                                                                        np.where(mean <= hi + 1e-9, np.inf, -np.inf))], 1.0)
+    return pd.DataFrame({
+        "Nutrient":              list(result.matrix.nutrients),
+        "Expected":              mean.round(3),
+        "SD":                    spread.round(3),
+        f"Low ({confidence:.0%})":  (mean - z * spread).round(3),
+        f"High ({confidence:.0%})": (mean + z * spread).round(3),
+        "Min":                   np.where(np.isfinite(lo), lo, np.nan),
+        "Max":                   np.where(np.isfinite(hi), hi, np.nan),
+        "P(within target)":      np.clip(p_lo + p_hi - 1.0, 0.0, 1.0).round(3),
+    })
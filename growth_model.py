@@ -0,0 +1,341 @@
+"""
+Growth-prediction model persisted as a versioned artifact.
+
+Fitting the 200-tree random forest takes seconds, and ``st.cache_resource``
+only lasts for one server process, so every cold start and autoscaled
+replica used to retrain it. ``load_or_train`` instead keys the fitted model
+by a hash of the training CSV, the feature list, the estimator and its
+hyperparameters and the scikit-learn version, loads ``models/growth-<key>.joblib`` when it
+exists and otherwise trains once and writes it atomically. Change the data
+or ``MODEL_CONFIG`` and the key changes, so the next load retrains.
+
+``MODEL_CONFIG["estimator"]`` (``GROWTH_MODEL_ESTIMATOR``) picks the
+production model from ``CANDIDATES``; ``growth_selection`` compares them.
+
+With ``GROWTH_MODEL_MMAP=1`` (``MODEL_CONFIG["mmap"]``) a random forest is also
+exported as flat node arrays in ``growth-<key>.forest/`` and served by
+``MappedForest`` straight from read-only memory maps. Every worker process
+then shares one copy of the trees through the OS page cache instead of
+unpickling its own.
+
+Artifacts are pickles: only load them from a directory you control.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass
+from functools import cached_property
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import GradientBoostingRegressor, HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.linear_model import Ridge
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import PolynomialFeatures, StandardScaler
+
+logger = logging.getLogger("growth_model")
+
+MODEL_CONFIG = {
+    "dataset":  "livestock_feed_training_dataset.csv",
+    "dir":      os.environ.get("GROWTH_MODEL_DIR", "models"),
+    "keep":     3,   # newest artifacts kept per directory; older versions are pruned
+    "mmap":     os.environ.get("GROWTH_MODEL_MMAP", "0") == "1",
+    "estimator": os.environ.get("GROWTH_MODEL_ESTIMATOR", "random_forest"),
+    "params":   None,   # overrides of the chosen candidate's defaults
+    "interval": 0.8,    # central coverage of prediction intervals (per-tree quantiles)
+    "forest_rows": 256, # up to this many rows, forests predict by the node-array walk
+}
+
+FEATURES = ["Age_Weeks", "Body_Weight_kg", "CP_Requirement_%", "Energy_Requirement_Kcal",
+            "Feed_Intake_kg", "Ingredient_CP_%", "Ingredient_Energy"]
+TARGET = "Expected_Daily_Gain_g"
+
+
+def _ridge_interactions(alpha: float = 1.0):
+    return make_pipeline(StandardScaler(), PolynomialFeatures(2, interaction_only=True, include_bias=False),
+                         StandardScaler(), Ridge(alpha=alpha))
+
+
+# name -> (factory, default hyperparameters)
+CANDIDATES = {
+    "random_forest":      (RandomForestRegressor, {"n_estimators": 200, "random_state": 42}),
+    "small_forest":       (RandomForestRegressor, {"n_estimators": 40, "min_samples_leaf": 2, "random_state": 42}),
+    "hist_gbm":           (HistGradientBoostingRegressor, {"max_iter": 200, "learning_rate": 0.05,
+                                                           "min_samples_leaf": 5, "random_state": 42}),
+    "gbm":                (GradientBoostingRegressor, {"n_estimators": 150, "max_depth": 3, "learning_rate": 0.05,
+                                                       "random_state": 42}),
+    "ridge_interactions": (_ridge_interactions, {"alpha": 1.0}),
+}
+
+FOREST_ARRAYS = ("roots", "left", "right", "feature", "threshold", "value")
+
+
+class MappedForest:
+    """Random-forest regressor evaluated from flat node arrays.
+
+    All trees' nodes are concatenated; ``roots`` holds each tree's first
+    node and leaves point at themselves, so ``depth`` vectorised steps take
+    every (sample, tree) pair to its leaf. Predictions match
+    ``RandomForestRegressor.predict``, which also compares in float32.
+    """
+
+    def __init__(self, roots, left, right, feature, threshold, value, depth: int):
+        self.roots, self.left, self.right = roots, left, right
+        self.feature, self.threshold, self.value = feature, threshold, value
+        self.depth = depth
+
+    @classmethod
+    def from_estimator(cls, estimator: RandomForestRegressor) -> "MappedForest":
+        trees = [e.tree_ for e in estimator.estimators_]
+        offsets = np.cumsum([0] + [t.node_count for t in trees])
+        parts = {name: [] for name in FOREST_ARRAYS[1:]}
+        for t, off in zip(trees, offsets):
+            leaf = t.children_left < 0
+            own = np.arange(t.node_count) + off
+            parts["left"].append(np.where(leaf, own, t.children_left + off))
+            parts["right"].append(np.where(leaf, own, t.children_right + off))
+            parts["feature"].append(np.where(leaf, 0, t.feature))
+            parts["threshold"].append(t.threshold)
+            parts["value"].append(t.value[:, 0, 0])
+        arrays = {name: np.concatenate(v) for name, v in parts.items()}
+        arrays["left"] = arrays["left"].astype(np.int64)
+        arrays["right"] = arrays["right"].astype(np.int64)
+        arrays["feature"] = arrays["feature"].astype(np.int32)
+        return cls(offsets[:-1].astype(np.int64), depth=max(t.max_depth for t in trees), **arrays)
+
+    def save(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        for name in FOREST_ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+
+    @classmethod
+    def open(cls, directory: str, depth: int) -> "MappedForest":
+        return cls(depth=depth, **{name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+                                   for name in FOREST_ARRAYS})
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in FOREST_ARRAYS)
+
+    def apply(self, X) -> np.ndarray:
+        """Leaf node (global index) of every sample in every tree, shape (n, trees)."""
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for _ in range(self.depth):
+            node = np.where(X[rows, self.feature[node]] <= self.threshold[node],
+                            self.left[node], self.right[node])
+        return node
+
+    def predict_trees(self, X) -> np.ndarray:
+        """Every tree's prediction, shape (n, trees)."""
+        return self.value[self.apply(X)]
+
+    def predict(self, X) -> np.ndarray:
+        return self.predict_trees(X).mean(axis=1)
+
+
+@dataclass
+class GrowthModel:
+    """A fitted regressor (or its ``MappedForest``) and the provenance of the artifact it came from."""
+    estimator: object
+    key: str
+    meta: dict
+
+    @cached_property
+    def forest(self) -> MappedForest:
+        """Node-array view of a random forest, the fast path for many small ``predict``
+        calls; None for other estimators."""
+        if isinstance(self.estimator, MappedForest):
+            return self.estimator
+        if isinstance(self.estimator, RandomForestRegressor):
+            return MappedForest.from_estimator(self.estimator)
+        return None
+
+    @property
+    def has_intervals(self) -> bool:
+        return self.forest is not None
+
+    def _small(self, X) -> bool:
+        # sklearn's ~25 ms per-call overhead dominates small batches, the numpy walk large ones
+        return isinstance(self.estimator, MappedForest) or len(X) <= MODEL_CONFIG["forest_rows"]
+
+    def predict(self, X) -> np.ndarray:
+        X = _frame(X)
+        if self.forest is not None and self._small(X):
+            return self.forest.predict(X.to_numpy())
+        return self.estimator.predict(X)
+
+    def predict_trees(self, X) -> np.ndarray:
+        """Every tree's prediction, shape (n, trees), in one vectorised pass: the
+        node-array walk, or one ``apply`` call gathering leaf values by index."""
+        if self.forest is None:
+            raise TypeError(f"{type(self.estimator).__name__} has no per-tree predictions")
+        X = _frame(X)
+        if self._small(X):
+            return self.forest.predict_trees(X.to_numpy())
+        return self.forest.value[self.estimator.apply(X) + self.forest.roots]
+
+    def predict_interval(self, X, level: float = None) -> tuple:
+        """``(point, lower, upper)``: the forest mean and the central ``level``
+        quantiles of the individual trees' predictions, widened where needed
+        to contain the mean (a few outlying trees can pull it past a quantile)."""
+        return interval_bounds(self.predict_trees(X), level)
+
+
+def interval_bounds(trees: np.ndarray, level: float = None) -> tuple:
+    """``(point, lower, upper)`` of per-tree predictions, shape (n, trees)."""
+    level = MODEL_CONFIG["interval"] if level is None else level
+    point = trees.mean(axis=1)
+    lower, upper = np.quantile(trees, [(1 - level) / 2, (1 + level) / 2], axis=1)
+    return point, np.minimum(lower, point), np.maximum(upper, point)
+
+
+def _frame(X) -> pd.DataFrame:
+    if isinstance(X, pd.DataFrame):
+        return X[FEATURES]
+    return pd.DataFrame(np.atleast_2d(X), columns=FEATURES)
+
+
+def estimator_spec(estimator: str = None, params: dict = None) -> tuple:
+    """``(name, hyperparameters)`` of a candidate, defaults overlaid with ``params``."""
+    name = estimator or MODEL_CONFIG["estimator"]
+    if name not in CANDIDATES:
+        raise ValueError(f"unknown growth model {name!r}; choose from {', '.join(CANDIDATES)}")
+    return name, {**CANDIDATES[name][1], **(params or MODEL_CONFIG["params"] or {})}
+
+
+def model_key(dataset: str = None, params: dict = None, estimator: str = None) -> str:
+    """Hash of everything the fitted model depends on."""
+    name, params = estimator_spec(estimator, params)
+    h = hashlib.sha256()
+    with open(dataset or MODEL_CONFIG["dataset"], "rb") as f:
+        h.update(f.read())
+    spec = {"features": FEATURES, "target": TARGET, "estimator": name, "params": params,
+            "sklearn": sklearn.__version__}
+    h.update(json.dumps(spec, sort_keys=True).encode())
+    return h.hexdigest()[:16]
+
+
+def artifact_path(key: str, directory: str = None) -> str:
+    return os.path.join(directory or MODEL_CONFIG["dir"], f"growth-{key}.joblib")
+
+
+def make_estimator(estimator: str = None, params: dict = None):
+    name, params = estimator_spec(estimator, params)
+    return CANDIDATES[name][0](**params)
+
+
+def train(data: pd.DataFrame, params: dict = None, estimator: str = None):
+    model = make_estimator(estimator, params)
+    model.fit(data[FEATURES], data[TARGET])
+    return model
+
+
+def _save(model: GrowthModel, path: str) -> None:
+    # Write beside the target and rename, so a concurrent reader never sees half a file
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            joblib.dump({"estimator": model.estimator, "key": model.key, "meta": model.meta}, f)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _export(model: GrowthModel, forest: str) -> None:
+    """Write the node arrays and metadata to ``forest`` (a directory), swapping it in whole."""
+    mapped = MappedForest.from_estimator(model.estimator)
+    tmp = tempfile.mkdtemp(dir=os.path.dirname(forest) or ".", suffix=".tmp")
+    try:
+        mapped.save(tmp)
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump({**model.meta, "key": model.key, "depth": mapped.depth}, f)
+        if os.path.isdir(forest):
+            # Workers that already mapped the old files keep valid pages after they are unlinked
+            old = forest + ".old"
+            shutil.rmtree(old, ignore_errors=True)   # left by an export that died mid-swap
+            os.replace(forest, old)
+            shutil.rmtree(old, ignore_errors=True)
+        os.replace(tmp, forest)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _open_mapped(forest: str) -> GrowthModel:
+    with open(os.path.join(forest, "meta.json")) as f:
+        meta = json.load(f)
+    return GrowthModel(MappedForest.open(forest, meta["depth"]), meta.pop("key"), {**meta, "loaded_from": forest})
+
+
+def _prune(directory: str, keep: int) -> None:
+    paths = sorted((os.path.join(directory, name) for name in os.listdir(directory)
+                    if name.startswith("growth-") and name.endswith(".joblib")),
+                   key=os.path.getmtime, reverse=True)
+    for path in paths[keep:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        shutil.rmtree(path[:-len(".joblib")] + ".forest", ignore_errors=True)
+
+
+def load_or_train(dataset: str = None, params: dict = None, directory: str = None,
+                  retrain: bool = False, mmap: bool = None, estimator: str = None) -> GrowthModel:
+    """The artifact for the current data and config, training and saving it if missing.
+
+    ``retrain=True`` refits and overwrites even when a matching artifact
+    exists. ``mmap`` (default ``MODEL_CONFIG["mmap"]``) returns a
+    ``MappedForest`` over the shared node arrays instead of the unpickled
+    forest; other estimators ignore it. ``estimator`` names a ``CANDIDATES``
+    entry (default ``MODEL_CONFIG["estimator"]``).
+    """
+    dataset = dataset or MODEL_CONFIG["dataset"]
+    estimator, params = estimator_spec(estimator, params)
+    directory = directory or MODEL_CONFIG["dir"]
+    mmap = (MODEL_CONFIG["mmap"] if mmap is None else mmap) and CANDIDATES[estimator][0] is RandomForestRegressor
+    key = model_key(dataset, params, estimator)
+    path = artifact_path(key, directory)
+    forest = path[:-len(".joblib")] + ".forest"
+    if mmap and not retrain and os.path.isdir(forest):
+        try:
+            return _open_mapped(forest)
+        except (OSError, ValueError, KeyError):
+            pass   # partial or stale export: rebuild it below
+    model = None
+    if not retrain and os.path.exists(path):
+        try:
+            saved = joblib.load(path)
+            model = GrowthModel(saved["estimator"], saved["key"], {**saved["meta"], "loaded_from": path})
+        except Exception:
+            pass   # unreadable or from an incompatible build: fall through and retrain
+    if model is None:
+        t0 = time.perf_counter()
+        data = pd.read_csv(dataset)
+        fitted = train(data, params, estimator)
+        meta = {"dataset": os.path.basename(dataset), "rows": len(data), "estimator": estimator, "params": params,
+                "sklearn": sklearn.__version__, "trained_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "train_time": time.perf_counter() - t0}
+        model = GrowthModel(fitted, key, meta)
+        try:
+            _save(model, path)
+            _prune(directory, MODEL_CONFIG["keep"])
+        except OSError:
+            pass       # read-only deployments still get a working (in-memory) model
+    if mmap:
+        try:
+            _export(model, forest)
+            return _open_mapped(forest)
+        except OSError as exc:
+            logger.warning("memory-mapped export to %s failed (%s); using the in-memory model", forest, exc)
+    return model
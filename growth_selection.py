@@ -0,0 +1,117 @@
+"""
+Growth-model selection: accuracy, latency, size and fit time of every candidate.
+
+``compare_models`` cross-validates each entry of ``growth_model.CANDIDATES``
+on the training CSV (repeated shuffled K-fold, folds run in parallel), then
+refits it on all rows and times what production pays for: a one-row
+``predict`` (one growth prediction, one small simulation step), a batched
+``predict``, a batched ``predict_interval`` (forests only) and the pickled
+size. The production model stays a config choice,
+``MODEL_CONFIG["estimator"]`` / ``GROWTH_MODEL_ESTIMATOR``; ``recommend``
+suggests one.
+
+Run from the repository root:
+
+    python -m growth_selection [--folds 5] [--repeats 3] [--jobs -1] [--out growth_models.csv]
+"""
+import argparse
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import RepeatedKFold, cross_validate
+
+from growth_model import CANDIDATES, FEATURES, MODEL_CONFIG, TARGET, GrowthModel, estimator_spec, make_estimator
+
+SELECTION_CONFIG = {
+    "folds":        5,
+    "repeats":      3,
+    "n_jobs":       -1,    # cross-validation fits in parallel across all cores
+    "batch_rows":   1000,
+    "latency_runs": 50,
+    "tolerance":    0.05,  # recommend the fastest model within this fraction of the best CV MAE
+}
+
+SCORING = {"mae": "neg_mean_absolute_error", "rmse": "neg_root_mean_squared_error", "r2": "r2",
+           "mape": "neg_mean_absolute_percentage_error"}
+
+
+def _latency(predict, X, runs: int) -> float:
+    predict(X)   # warm-up
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        predict(X)
+        samples.append(time.perf_counter() - t0)
+    return float(np.median(samples))
+
+
+def evaluate(name: str, data: pd.DataFrame, folds: int = None, repeats: int = None, n_jobs: int = None,
+             seed: int = 0) -> dict:
+    """Cross-validated accuracy and production costs of one candidate."""
+    cfg = SELECTION_CONFIG
+    X, y = data[FEATURES], data[TARGET]
+    cv = RepeatedKFold(n_splits=folds or cfg["folds"], n_repeats=repeats or cfg["repeats"], random_state=seed)
+    scores = cross_validate(make_estimator(name), X, y, cv=cv, scoring=SCORING,
+                            n_jobs=cfg["n_jobs"] if n_jobs is None else n_jobs)
+    t0 = time.perf_counter()
+    model = make_estimator(name).fit(X, y)
+    fit_time = time.perf_counter() - t0
+    batch = X.sample(cfg["batch_rows"], replace=True, random_state=seed)
+    single = _latency(model.predict, X.iloc[:1], cfg["latency_runs"])
+    batched = _latency(model.predict, batch, max(5, cfg["latency_runs"] // 10))
+    served = GrowthModel(model, name, {})
+    interval = _latency(served.predict_interval, batch, max(5, cfg["latency_runs"] // 10)) \
+        if served.has_intervals else np.nan
+    return {
+        "Model":            name,
+        "CV MAE (g/day)":   -scores["test_mae"].mean(),
+        "CV MAE sd":        scores["test_mae"].std(),
+        "CV RMSE (g/day)":  -scores["test_rmse"].mean(),
+        "CV R²":            scores["test_r2"].mean(),
+        "CV MAPE (%)":      -scores["test_mape"].mean() * 100,
+        "Fit (s)":          fit_time,
+        "1-row predict (ms)": single * 1000,
+        f"{cfg['batch_rows']}-row predict (µs/row)": batched / cfg["batch_rows"] * 1e6,
+        f"{cfg['batch_rows']}-row interval (µs/row)": interval / cfg["batch_rows"] * 1e6,
+        "Size (KB)":        len(pickle.dumps(model)) / 1024,
+        "Params":           estimator_spec(name)[1],
+    }
+
+
+def compare_models(data: pd.DataFrame = None, names=None, **options) -> pd.DataFrame:
+    """``evaluate`` every candidate (all of ``CANDIDATES`` by default), best CV MAE first."""
+    data = pd.read_csv(MODEL_CONFIG["dataset"]) if data is None else data
+    rows = [evaluate(name, data, **options) for name in (names or CANDIDATES)]
+    return pd.DataFrame(rows).sort_values("CV MAE (g/day)").reset_index(drop=True)
+
+
+def recommend(results: pd.DataFrame, tolerance: float = None) -> str:
+    """Fastest single-row model whose CV MAE is within ``tolerance`` of the best."""
+    tolerance = SELECTION_CONFIG["tolerance"] if tolerance is None else tolerance
+    best = results["CV MAE (g/day)"].min()
+    close = results[results["CV MAE (g/day)"] <= best * (1 + tolerance)]
+    return close.sort_values("1-row predict (ms)")["Model"].iloc[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--folds", type=int, default=SELECTION_CONFIG["folds"])
+    parser.add_argument("--repeats", type=int, default=SELECTION_CONFIG["repeats"])
+    parser.add_argument("--jobs", type=int, default=SELECTION_CONFIG["n_jobs"])
+    parser.add_argument("--models", nargs="+", choices=list(CANDIDATES), help="subset of candidates")
+    parser.add_argument("--out", help="also write the table to this CSV")
+    args = parser.parse_args()
+
+    results = compare_models(names=args.models, folds=args.folds, repeats=args.repeats, n_jobs=args.jobs)
+    with pd.option_context("display.width", 200, "display.max_columns", None, "display.precision", 3):
+        print(results.drop(columns="Params").to_string(index=False))
+    if args.out:
+        results.to_csv(args.out, index=False)
+    print(f"\nproduction: {MODEL_CONFIG['estimator']}   recommended: {recommend(results)} "
+          "(set MODEL_CONFIG['estimator'] or GROWTH_MODEL_ESTIMATOR to switch)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Day-by-day growth simulation driven by the growth-prediction model.
+
+The model predicts daily gain from age, body weight, intake and diet, so a
+single prediction extrapolated in a straight line ignores that gain changes
+as the animal grows. ``simulate_growth`` steps one day at a time: it predicts
+the day's gain, adds it to body weight, advances age by a day (optionally
+scaling intake with body weight), then feeds the updated inputs back in.
+Animals or cohorts are rows of one batch, so each day is a single
+``predict`` call however many are simulated, over the distinct rows only.
+
+With ``interval`` set, a forest model also carries a lower and an upper
+path: each day they grow by the band's lower / upper per-tree quantile of
+gain at their own weight, so the band widens as the uncertainty compounds.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from growth_model import GrowthModel, interval_bounds
+
+SIMULATION_CONFIG = {
+    "days":            90,
+    "intake_exponent": 0.0,    # intake ∝ (W / W0)^k, e.g. 0.75 for metabolic weight; 0 keeps it fixed
+}
+
+PATHS = ("point", "lower", "upper")
+
+
+@dataclass
+class GrowthTrajectory:
+    """Daily trajectories of ``n`` animals over ``days`` days.
+
+    ``weight`` has ``days + 1`` columns (day 0 is the start); ``gain`` (g/day)
+    and ``intake`` (kg/day) have one column per simulated day. When
+    simulated with an ``interval``, ``weight_lower`` / ``weight_upper`` and
+    ``gain_lower`` / ``gain_upper`` bound the point path.
+    """
+    age_weeks: np.ndarray
+    weight: np.ndarray
+    gain: np.ndarray
+    intake: np.ndarray
+    interval: float = None
+    weight_lower: np.ndarray = None
+    weight_upper: np.ndarray = None
+    gain_lower: np.ndarray = None
+    gain_upper: np.ndarray = None
+
+    @property
+    def days(self) -> np.ndarray:
+        return np.arange(self.weight.shape[1])
+
+    @property
+    def horizon(self) -> int:
+        return self.gain.shape[1]
+
+    @property
+    def has_band(self) -> bool:
+        return self.weight_lower is not None
+
+    def weights(self, path: str = "point") -> np.ndarray:
+        """Weight paths, shape (n, days + 1): the point estimate or a band edge."""
+        if path not in PATHS:
+            raise ValueError(f"path must be one of {PATHS}")
+        if path != "point" and not self.has_band:
+            raise ValueError("trajectory was simulated without an interval")
+        return {"point": self.weight, "lower": self.weight_lower, "upper": self.weight_upper}[path]
+
+    def weight_at(self, day: int, path: str = "point") -> np.ndarray:
+        return self.weights(path)[:, min(day, self.horizon)]
+
+    def feed_kg(self, day: int = None) -> np.ndarray:
+        """Cumulative feed per animal over the first ``day`` days (all by default)."""
+        return self.intake[:, :self.horizon if day is None else day].sum(axis=1)
+
+    def fcr(self, day: int = None) -> np.ndarray:
+        """Feed conversion ratio over the first ``day`` days: kg feed per kg gained."""
+        day = self.horizon if day is None else min(day, self.horizon)
+        gained = self.weight[:, day] - self.weight[:, 0]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(gained > 0, self.feed_kg(day) / gained, np.nan)
+
+    def days_to(self, target_kg, path: str = "point") -> np.ndarray:
+        """First day each animal reaches ``target_kg``; NaN if not within the horizon."""
+        reached = self.weights(path) >= np.asarray(target_kg, dtype=float).reshape(-1, 1)
+        return np.where(reached.any(axis=1), reached.argmax(axis=1), np.nan)
+
+    def to_frame(self, i: int = 0) -> pd.DataFrame:
+        """One animal's trajectory, a row per day."""
+        out = pd.DataFrame({
+            "Day":               self.days,
+            "Age (weeks)":       (self.age_weeks[i] + self.days / 7).round(2),
+            "Weight (kg)":       self.weight[i].round(3),
+            "Daily Gain (g)":    np.append(self.gain[i], np.nan).round(1),
+            "Intake (kg/day)":   np.append(self.intake[i], np.nan).round(3),
+            "Cumulative Feed (kg)": np.concatenate([[0.0], np.cumsum(self.intake[i])]).round(2),
+        })
+        if self.has_band:
+            pct = f"{self.interval:.0%}"
+            out.insert(3, f"Weight Low {pct} (kg)", self.weight_lower[i].round(3))
+            out.insert(4, f"Weight High {pct} (kg)", self.weight_upper[i].round(3))
+        return out
+
+
+def simulate_growth(model, age_weeks, weight, cp_req, energy_req, feed_intake, ingredient_cp,
+                    ingredient_energy, days: int = None, intake_exponent: float = None,
+                    interval: float = None, stop_at=None, step: int = 1) -> GrowthTrajectory:
+    """Simulate ``days`` days of growth for every animal at once.
+
+    Every input is a scalar or an array over animals; scalars are shared.
+    The diet and intake inputs (``cp_req`` to ``ingredient_energy``) may
+    also be ``(n, days)`` arrays with one value per day, e.g. for phase
+    feeding. ``model`` is a ``GrowthModel`` or anything with ``predict(X)``
+    over the ``growth_model.FEATURES`` columns. ``interval`` (e.g. 0.8) adds
+    the lower/upper paths when the model has per-tree predictions and is
+    ignored otherwise. With ``stop_at`` (kg, scalar or per animal) an animal
+    is sold on reaching that weight: no further gain or intake. The
+    simulation, and the trajectory with it, ends once every animal is sold.
+    ``step`` re-predicts gain every ``step`` days and holds it in between,
+    for long horizons where daily gain changes slowly; the trajectory keeps
+    one column per day.
+    """
+    days = SIMULATION_CONFIG["days"] if days is None else int(days)
+    step = max(1, int(step))
+    k = SIMULATION_CONFIG["intake_exponent"] if intake_exponent is None else intake_exponent
+    inputs = [np.asarray(v, dtype=float) for v in (age_weeks, weight, cp_req, energy_req, feed_intake,
+                                                     ingredient_cp, ingredient_energy)]
+    daily = {i: v for i, v in enumerate(inputs) if v.ndim == 2 and i >= 2}
+    cols = np.broadcast_arrays(*(np.atleast_1d(v[:, 0] if i in daily else v) for i, v in enumerate(inputs)))
+    X = np.column_stack(cols)
+    n = len(X)
+    band = bool(interval) and isinstance(model, GrowthModel) and model.has_intervals
+    paths = len(PATHS) if band else 1
+    # Point, lower and upper paths are stacked so each day is still one predict pass
+    X = np.tile(X, (paths, 1))
+    age, w0, intake0 = X[:, 0].copy(), X[:, 1].copy(), X[:, 4].copy()
+    target = None if stop_at is None else np.tile(np.broadcast_to(np.asarray(stop_at, dtype=float), (n,)), paths)
+    weight_t = np.empty((n * paths, days + 1))
+    gain_t = np.empty((n * paths, days))
+    intake_t = np.empty((n * paths, days))
+    weight_t[:, 0] = w0
+    for d in range(days):
+        w = weight_t[:, d]
+        if target is not None and (w >= target).all():
+            days = d
+            weight_t, gain_t, intake_t = weight_t[:, :d + 1], gain_t[:, :d], intake_t[:, :d]
+            break
+        for i, v in daily.items():
+            X[:, i] = np.tile(v[:, min(d, v.shape[1] - 1)], paths)
+        X[:, 0] = age + d / 7
+        X[:, 1] = w
+        X[:, 4] = (X[:, 4] if 4 in daily else intake0) * (w / w0) ** k
+        # Animals at stop_at are sold: off feed, weight held. Animals in the same state
+        # (e.g. schedules that have not diverged yet) are predicted once.
+        growing = np.ones(len(X), dtype=bool) if target is None else w < target
+        if d % step == 0:
+            U, inverse = np.unique(X[growing], axis=0, return_inverse=True)
+            gain = np.zeros(len(X))
+            if band:
+                trees = model.predict_trees(U)[inverse.ravel()]
+                full = np.zeros((len(X), trees.shape[1]))
+                full[growing] = trees
+                gain = np.concatenate([interval_bounds(full[i * n:(i + 1) * n], interval)[i] for i in range(paths)])
+            elif len(U):
+                gain[growing] = np.asarray(model.predict(U))[inverse.ravel()]
+        else:
+            gain = np.where(growing, gain, 0.0)   # held from the step's first day
+        gain_t[:, d] = np.maximum(gain, 0.0)
+        intake_t[:, d] = np.where(growing, X[:, 4], 0.0)
+        weight_t[:, d + 1] = w + gain_t[:, d] / 1000
+    out = GrowthTrajectory(age[:n], weight_t[:n], gain_t[:n], intake_t[:n])
+    if band:
+        out.interval = interval
+        out.weight_lower, out.weight_upper = weight_t[n:2 * n], weight_t[2 * n:]
+        out.gain_lower, out.gain_upper = gain_t[n:2 * n], gain_t[2 * n:]
+    return out
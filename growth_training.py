@@ -0,0 +1,271 @@
+"""
+Feeding-trial ingestion and incremental retraining of the growth model.
+
+``ingest_trials`` validates new trial rows, appends them to the training CSV
+and brings the model up to date without refitting from scratch: a random
+forest grows ``grow_trees`` new trees on the combined data (``warm_start``)
+and drops its oldest trees past ``max_trees``, so older trials fade out
+gradually; other estimators, or a batch that grows the data by more than
+``refit_ratio``, get a full refit. The artifact for the new data is saved
+before the CSV is swapped in, so any process that sees the new CSV finds
+its model ready instead of retraining.
+
+``LiveModel`` is the per-process handle the app serves from. Loading and
+retraining run on a background thread and the new model replaces the old
+one in a single reference swap, so predictions in flight keep the model
+they started with and no request waits on training. It also notices when
+another process has ingested trials and reloads.
+
+Weekly batches can also be ingested from the command line:
+
+    python -m growth_training new_trials.csv
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+
+import joblib
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+
+from growth_model import (FEATURES, MODEL_CONFIG, TARGET, GrowthModel, _prune, _save, artifact_path,
+                          estimator_spec, load_or_train, make_estimator, model_key)
+
+try:
+    import fcntl
+except ImportError:   # Windows: the in-process lock still serialises one server's ingests
+    fcntl = None
+
+TRAINING_CONFIG = {
+    "grow_trees":     50,     # trees added per incremental update
+    "max_trees":      400,    # oldest trees beyond this are dropped
+    "refit_ratio":    0.5,    # full refit when a batch adds more than this fraction of the model's rows
+    "check_interval": 30.0,   # seconds between checks for trials ingested by other processes
+}
+
+SPECIES = ("Rabbit", "Poultry", "Cattle")
+
+# Plausible ranges for a trial row, inclusive; wider than today's data so real new trials pass
+LIMITS = {
+    "Age_Weeks":               (0.1, 520),
+    "Body_Weight_kg":          (0.01, 1500),
+    "CP_Requirement_%":        (1, 60),
+    "Energy_Requirement_Kcal": (500, 12000),
+    "Feed_Intake_kg":          (0.001, 50),
+    "Ingredient_CP_%":         (0, 100),
+    "Ingredient_Energy":       (0, 12000),
+    TARGET:                    (0, 3000),
+}
+
+COLUMNS = ["Animal_Type", "Breed"] + FEATURES + [TARGET]
+
+_ingest_lock = threading.Lock()
+
+
+def validate_trials(trials: pd.DataFrame) -> tuple:
+    """``(valid, rejected)``: rows fit to append, and the others with a ``Reason``."""
+    missing = [c for c in COLUMNS if c not in trials.columns]
+    if missing:
+        raise ValueError(f"trial data is missing columns: {', '.join(missing)}")
+    df = trials[COLUMNS].copy()
+    df["Animal_Type"] = df["Animal_Type"].astype(str).str.strip().str.title()
+    df["Breed"] = df["Breed"].astype(str).str.strip().str.slice(0, 100)
+    reasons = pd.Series("", index=df.index)
+    reasons[~df["Animal_Type"].isin(SPECIES)] += "unknown Animal_Type; "
+    reasons[df["Breed"].isin(["", "nan"])] += "missing Breed; "
+    for col, (lo, hi) in LIMITS.items():
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+        reasons[df[col].isna()] += f"{col} not a number; "
+        reasons[df[col].notna() & ~df[col].between(lo, hi)] += f"{col} outside {lo}–{hi}; "
+    bad = reasons != ""
+    rejected = trials.loc[bad].assign(Reason=reasons[bad].str.rstrip("; "))
+    return df.loc[~bad].reset_index(drop=True), rejected.reset_index(drop=True)
+
+
+@contextmanager
+def _locked(dataset: str):
+    # One ingest at a time: threads in this process, and other processes on POSIX
+    with _ingest_lock, open(dataset + ".lock", "a") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def update_model(base: GrowthModel, data: pd.DataFrame, estimator: str = None, params: dict = None) -> tuple:
+    """``(fitted, mode)``: ``base`` grown on ``data`` (``"warm_start"``) or a ``"refit"``."""
+    name, params = estimator_spec(estimator, params)
+    grown_rows = len(data) - (base.meta.get("rows", 0) if base is not None else 0)
+    est = base.estimator if base is not None else None
+    if (isinstance(est, RandomForestRegressor) and base.meta.get("estimator", name) == name
+            and grown_rows <= TRAINING_CONFIG["refit_ratio"] * base.meta.get("rows", 0)):
+        cfg = TRAINING_CONFIG
+        generation = base.meta.get("generation", 0) + 1
+        # A fresh seed per generation so trimmed forests do not regrow the same bootstrap samples
+        est.set_params(warm_start=True, n_estimators=len(est.estimators_) + cfg["grow_trees"],
+                       random_state=params.get("random_state", 0) + generation)
+        est.fit(data[FEATURES], data[TARGET])
+        est.estimators_ = est.estimators_[-cfg["max_trees"]:]
+        est.set_params(warm_start=False, n_estimators=len(est.estimators_))
+        return est, "warm_start"
+    fitted = make_estimator(name, params)
+    fitted.fit(data[FEATURES], data[TARGET])
+    return fitted, "refit"
+
+
+def _current(dataset: str, directory: str, estimator: str, params: dict) -> GrowthModel:
+    path = artifact_path(model_key(dataset, params, estimator), directory)
+    try:
+        saved = joblib.load(path)
+        return GrowthModel(saved["estimator"], saved["key"], saved["meta"])
+    except Exception:
+        return None
+
+
+def ingest_trials(trials: pd.DataFrame, dataset: str = None, directory: str = None,
+                  estimator: str = None, params: dict = None) -> dict:
+    """Validate, append and retrain; returns a report of what happened.
+
+    Exact duplicates of rows already in the dataset are skipped. Nothing is
+    written when no new valid row remains.
+    """
+    dataset = dataset or MODEL_CONFIG["dataset"]
+    directory = directory or MODEL_CONFIG["dir"]
+    estimator, params = estimator_spec(estimator, params)
+    valid, rejected = validate_trials(trials)
+    report = {"received": len(trials), "rejected": rejected, "added": 0, "duplicates": 0}
+    if valid.empty:
+        return report
+    with _locked(dataset):
+        existing = pd.read_csv(dataset)
+        received = len(valid)
+        valid = valid.drop_duplicates().reset_index(drop=True)
+        as_float = {c: float for c in LIMITS}
+        seen = existing[COLUMNS].astype(as_float).drop_duplicates().merge(
+            valid.astype(as_float).reset_index(), how="right", indicator=True)
+        new = valid.loc[seen.loc[seen["_merge"] == "right_only", "index"]]
+        report["duplicates"] = received - len(new)
+        if new.empty:
+            return report
+        fd, staged = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(dataset)), suffix=".tmp")
+        try:
+            # A true append: existing bytes unchanged, new rows after them
+            with open(dataset, "rb") as src:
+                head = src.read()
+            with os.fdopen(fd, "wb") as f:
+                f.write(head if head.endswith(b"\n") else head + b"\n")
+                f.write(new.reindex(columns=existing.columns).to_csv(index=False, header=False,
+                                                                     lineterminator="\n").encode())
+            os.chmod(staged, os.stat(dataset).st_mode)
+            combined = pd.read_csv(staged)
+            t0 = time.perf_counter()
+            base = _current(dataset, directory, estimator, params)
+            fitted, mode = update_model(base, combined, estimator, params)
+            key = model_key(staged, params, estimator)
+            meta = {"dataset": os.path.basename(dataset), "rows": len(combined), "estimator": estimator,
+                    "params": params, "mode": mode, "trees": len(getattr(fitted, "estimators_", [])) or None,
+                    "generation": (base.meta.get("generation", 0) + 1) if mode == "warm_start" else 0,
+                    "base": base.key if base is not None else None,
+                    "trained_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "train_time": time.perf_counter() - t0}
+            os.makedirs(directory, exist_ok=True)
+            # Model first, then data: a process that sees the new CSV finds its artifact ready
+            _save(GrowthModel(fitted, key, meta), artifact_path(key, directory))
+            os.replace(staged, dataset)
+        finally:
+            if os.path.exists(staged):
+                os.remove(staged)
+        _prune(directory, MODEL_CONFIG["keep"])
+    report.update(added=len(new), rows=len(combined), key=key, mode=mode, trees=meta["trees"],
+                  train_time=meta["train_time"])
+    return report
+
+
+class LiveModel:
+    """The serving growth model of one process, loaded and replaced in the background."""
+
+    def __init__(self, dataset: str = None, directory: str = None):
+        self.dataset = dataset or MODEL_CONFIG["dataset"]
+        self.directory = directory
+        self._model = None
+        self._stamp = None
+        self._checked = 0.0
+        self._pending = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="growth-model")
+
+    def _stat(self) -> tuple:
+        st = os.stat(self.dataset)
+        return st.st_mtime_ns, st.st_size
+
+    def _load(self) -> GrowthModel:
+        stamp = self._stat()
+        model = load_or_train(self.dataset, directory=self.directory)
+        self._model, self._stamp = model, stamp   # one reference swap; readers never see a partial model
+        return model
+
+    def refresh(self) -> Future:
+        """Reload (training if needed) in the background; returns the pending load."""
+        with self._lock:
+            if self._pending is None or self._pending.done():
+                self._pending = self._executor.submit(self._load)
+            return self._pending
+
+    def warm(self) -> None:
+        """Start loading now so neither the page nor the first prediction waits for it."""
+        if self._model is None:
+            self.refresh()
+
+    @property
+    def ready(self) -> bool:
+        return self._model is not None
+
+    @property
+    def meta(self) -> dict:
+        return dict(self._model.meta) if self._model is not None else {}
+
+    def get(self, timeout: float = None) -> GrowthModel:
+        """The current model; blocks only until the very first load completes."""
+        now = time.time()
+        if self._model is not None and now - self._checked > TRAINING_CONFIG["check_interval"]:
+            self._checked = now
+            if self._stat() != self._stamp:
+                self.refresh()   # trials ingested elsewhere; keep serving the old model meanwhile
+        if self._model is None:
+            return self.refresh().result(timeout=timeout)
+        return self._model
+
+    def ingest(self, trials: pd.DataFrame) -> Future:
+        """``ingest_trials`` in the background, then swap in the updated model."""
+        def run():
+            report = ingest_trials(trials, self.dataset, self.directory)
+            if report["added"]:
+                self._load()
+            return report
+        return self._executor.submit(run)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Append feeding-trial results and update the growth model.")
+    parser.add_argument("trials", help="CSV with the training dataset's columns")
+    parser.add_argument("--dataset", default=MODEL_CONFIG["dataset"])
+    args = parser.parse_args()
+
+    report = ingest_trials(pd.read_csv(args.trials), args.dataset)
+    print(f"received {report['received']}, added {report['added']}, duplicates {report['duplicates']}, "
+          f"rejected {len(report['rejected'])}")
+    if report["added"]:
+        print(f"model {report['key']} ({report['mode']}, {report['trees'] or '-'} trees) "
+              f"trained in {report['train_time']:.2f} s on {report['rows']} rows")
+    if len(report["rejected"]):
+        print(report["rejected"][["Reason"]].to_string())
+
+
+if __name__ == "__main__":
+    main()
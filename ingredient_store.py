@@ -0,0 +1,180 @@
+"""
+Versioned ingredient catalogues, one version counter per species.
+
+Each save appends a snapshot of that species' table to a SQLite file and
+bumps only that species' version, so callers can key their caches on
+``(species, version)``: editing the rabbit catalogue re-reads, re-solves and
+re-predicts for rabbits and leaves poultry and cattle untouched. Snapshots
+are append-only (the newest ``keep`` per species are retained), so an edit
+can be rolled back with ``restore``.
+
+The species CSVs stay the seed and a readable mirror: a save rewrites the
+CSV, and a CSV changed on disk (a new file deployed, a manual edit) is
+imported as the next version the first time the store is read after it.
+"""
+import hashlib
+import io
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+STORE_CONFIG = {
+    "path": os.environ.get("INGREDIENT_STORE_PATH", "ingredient_store.sqlite3"),
+    "keep": 50,   # snapshots retained per species
+}
+
+CATALOGUES = {
+    "Rabbit":  "rabbit_ingredients.csv",
+    "Poultry": "poultry_ingredients.csv",
+    "Cattle":  "cattle_ingredients.csv",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    species   TEXT NOT NULL,
+    version   INTEGER NOT NULL,
+    saved_at  REAL NOT NULL,
+    source    TEXT NOT NULL,
+    note      TEXT,
+    rows      INTEGER NOT NULL,
+    digest    TEXT NOT NULL,
+    payload   TEXT NOT NULL,
+    PRIMARY KEY (species, version)
+);
+"""
+
+
+def _csv_text(frame: pd.DataFrame) -> str:
+    return frame.to_csv(index=False, lineterminator="\n")
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class IngredientStore:
+    """SQLite-backed, per-species versioned snapshots of the ingredient catalogues."""
+
+    def __init__(self, path: str = None, sources: dict = None, keep: int = None):
+        self.path = path or STORE_CONFIG["path"]
+        self.sources = dict(CATALOGUES if sources is None else sources)
+        self.keep = keep or STORE_CONFIG["keep"]
+        self._local = threading.local()
+        self._seen = {}   # species -> (mtime_ns, size) of its CSV when last checked
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; WAL lets readers proceed while another process writes.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _latest(self, conn: sqlite3.Connection, species: str) -> tuple:
+        row = conn.execute("SELECT version, digest FROM snapshots WHERE species = ? ORDER BY version DESC LIMIT 1",
+                           (species,)).fetchone()
+        return row or (0, None)
+
+    def _append(self, species: str, frame: pd.DataFrame, source: str, note: str = None) -> tuple:
+        # (version, appended); content equal to the current version is not a new version
+        text = _csv_text(frame)
+        conn, digest = self._conn(), _digest(text)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version, current = self._latest(conn, species)
+            if digest != current:
+                version += 1
+                conn.execute("INSERT INTO snapshots (species, version, saved_at, source, note, rows, digest, payload) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                             (species, version, time.time(), source, note, len(frame), digest, text))
+                conn.execute("DELETE FROM snapshots WHERE species = ? AND version <= ?",
+                             (species, version - self.keep))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return version, digest != current
+
+    def _sync(self, species: str) -> None:
+        # Import the CSV when it changed on disk since we last looked; a stat per call otherwise
+        path = self.sources.get(species)
+        if path is None or not os.path.exists(path):
+            return
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        if self._seen.get(species) == stamp:
+            return
+        self._append(species, pd.read_csv(path), "import", os.path.basename(path))
+        self._seen[species] = stamp
+
+    def version(self, species: str) -> int:
+        """Current version of ``species``' catalogue (0 when it has none)."""
+        self._sync(species)
+        return self._latest(self._conn(), species)[0]
+
+    def versions(self) -> dict:
+        """Current version of every catalogue; cheap enough to call on every page run."""
+        return {species: self.version(species) for species in self.sources}
+
+    def load(self, species: str, version: int = None) -> pd.DataFrame:
+        """The catalogue at ``version`` (the current one by default)."""
+        if version is None:
+            version = self.version(species)
+        row = self._conn().execute("SELECT payload FROM snapshots WHERE species = ? AND version = ?",
+                                   (species, version)).fetchone()
+        if row is None:
+            raise KeyError(f"no version {version} of the {species} catalogue")
+        return pd.read_csv(io.StringIO(row[0]))
+
+    def load_all(self) -> dict:
+        """Every current catalogue, by species."""
+        return {species: self.load(species) for species in self.sources}
+
+    def save(self, species: str, frame: pd.DataFrame, note: str = None, source: str = "app") -> int:
+        """Store ``frame`` as the next version of ``species`` and mirror it to the CSV; returns the version.
+
+        Saving the current contents again is a no-op and returns the current version.
+        """
+        self._sync(species)   # an unseen CSV edit becomes its own version rather than being overwritten silently
+        version, appended = self._append(species, frame, source, note)
+        path = self.sources.get(species)
+        if appended and path is not None:
+            fd, staged = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+                    f.write(_csv_text(frame))
+                # mkstemp files are owner-only; keep the mirror as readable as the file it replaces
+                os.chmod(staged, os.stat(path).st_mode if os.path.exists(path) else 0o644)
+                os.replace(staged, path)
+            finally:
+                if os.path.exists(staged):
+                    os.remove(staged)
+            st = os.stat(path)
+            self._seen[species] = (st.st_mtime_ns, st.st_size)
+        return version
+
+    def restore(self, species: str, version: int) -> int:
+        """Make an earlier snapshot current again, as a new version."""
+        return self.save(species, self.load(species, version), note=f"restored version {version}", source="restore")
+
+    def history(self, species: str) -> pd.DataFrame:
+        """Retained snapshots of ``species``, newest first."""
+        self._sync(species)
+        rows = self._conn().execute("SELECT version, saved_at, source, note, rows FROM snapshots "
+                                    "WHERE species = ? ORDER BY version DESC", (species,)).fetchall()
+        out = pd.DataFrame(rows, columns=["Version", "Saved", "Source", "Note", "Ingredients"])
+        out["Saved"] = pd.to_datetime(out["Saved"], unit="s").dt.strftime("%Y-%m-%d %H:%M")
+        return out
+
+
+def load_catalogues(store: IngredientStore = None) -> dict:
+    """Current catalogue of every species from the store (seeded from the CSVs on first use)."""
+    return (store or IngredientStore()).load_all()
@@ -0,0 +1,135 @@
+"""
+Multi-product feed-mill planning.
+
+Solves every product the mill is making (broiler, layer, rabbit, cattle
+feed…) as one sparse LP so they compete for the same on-hand ingredient
+stock. Variables are tonnes of ingredient ``j`` in product ``p``; each product
+contributes a block of mass-balance and nutrient rows, and one inventory row
+per stocked ingredient ties the blocks together. Ingredients are matched
+across catalogues by name, so "Maize" in the rabbit and cattle tables draws
+on one silo.
+"""
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from formulation_engine import (DEFAULT_SOLVER, INCLUSION_THRESHOLD, IngredientMatrix,
+                                NutrientTargets, solve_sparse_lp)
+
+
+@dataclass
+class ProductOrder:
+    """One product to mill: ``tonnes`` of feed meeting ``targets`` from ``matrix``."""
+    name: str
+    matrix: IngredientMatrix
+    targets: NutrientTargets
+    tonnes: float
+
+
+@dataclass
+class MillPlan:
+    status: str
+    orders: list
+    quantities: list        # per order: tonnes of each catalogue ingredient
+    total_cost: float       # ₦ for the whole plan
+    stock: dict
+    stock_duals: dict       # ₦ saved per extra tonne of each stocked ingredient
+
+    @property
+    def optimal(self) -> bool:
+        return self.status == "Optimal"
+
+    def formulas(self) -> pd.DataFrame:
+        """Tidy plan: one row per (product, ingredient used)."""
+        rows = []
+        for order, qty in zip(self.orders, self.quantities):
+            for j in np.flatnonzero(qty > INCLUSION_THRESHOLD * order.tonnes):
+                rows.append({
+                    "Product": order.name, "Ingredient": order.matrix.ingredients[j],
+                    "Tonnes": round(float(qty[j]), 3),
+                    "Proportion (%)": round(float(qty[j] / order.tonnes * 100), 2),
+                    "Cost (₦)": round(float(qty[j] * order.matrix.cost[j] * 1000), 2),
+                })
+        return pd.DataFrame(rows, columns=["Product", "Ingredient", "Tonnes", "Proportion (%)", "Cost (₦)"])
+
+    def product_costs(self) -> pd.DataFrame:
+        return pd.DataFrame([{
+            "Product": order.name, "Tonnes": order.tonnes,
+            "Cost/kg (₦)": round(float(order.matrix.cost @ qty / order.tonnes), 2) if order.tonnes else 0.0,
+            "Total Cost (₦)": round(float(order.matrix.cost @ qty * 1000), 2),
+        } for order, qty in zip(self.orders, self.quantities)])
+
+    def inventory(self) -> pd.DataFrame:
+        """Stock drawn per ingredient, what is left, and the value of one more tonne."""
+        used = {}
+        for order, qty in zip(self.orders, self.quantities):
+            for name, q in zip(order.matrix.ingredients, qty):
+                used[name] = used.get(name, 0.0) + float(q)
+        names = sorted(set(used) | set(self.stock))
+        out = pd.DataFrame({
+            "Ingredient": names,
+            "Used (t)":   [round(used.get(n, 0.0), 3) for n in names],
+            "Stock (t)":  [self.stock.get(n, np.inf) for n in names],
+        })
+        out["Remaining (t)"] = (out["Stock (t)"] - out["Used (t)"]).round(3)
+        out["Value of +1 t (₦)"] = [round(self.stock_duals.get(n, 0.0), 2) for n in names]
+        out = out[(out["Used (t)"] > 0) | np.isfinite(out["Stock (t)"])]
+        return out.replace([np.inf], np.nan).sort_values("Used (t)", ascending=False).reset_index(drop=True)
+
+
+def plan_production(orders: list, stock: dict = None, solver: str = DEFAULT_SOLVER) -> MillPlan:
+    """Least total cost production of every order without exceeding ``stock`` (tonnes).
+
+    Ingredients absent from ``stock`` are treated as unlimited (bought in).
+    """
+    stock = {k: float(v) for k, v in (stock or {}).items()}
+    offsets = np.cumsum([0] + [o.matrix.size for o in orders])
+    n_vars = int(offsets[-1])
+
+    rows, cols, vals, lower, upper = [], [], [], [], []
+    r = 0
+    for order, off in zip(orders, offsets[:-1]):
+        names = [n for n in order.targets.nutrients if n in order.matrix.nutrients]
+        block = np.vstack([np.ones((1, order.matrix.size)),
+                           order.matrix.values[[order.matrix.nutrients.index(n) for n in names]]])
+        # Nutrient bounds scale with the product's tonnage: Σ a_kj·x_pj >= min_k·T_p
+        lower.extend([order.tonnes] + [order.targets.minimum.get(n, -np.inf) * order.tonnes for n in names])
+        upper.extend([order.tonnes] + [order.targets.maximum.get(n, np.inf) * order.tonnes for n in names])
+        if order.targets.rules is not None:
+            rule_block, rule_lo, rule_hi, _ = order.targets.rules.block(order.matrix)
+            block = np.vstack([block, rule_block])
+            lower.extend(rule_lo * order.tonnes)
+            upper.extend(rule_hi * order.tonnes)
+        br, bc = np.nonzero(block)
+        rows.append(br + r)
+        cols.append(bc + off)
+        vals.append(block[br, bc])
+        r += block.shape[0]
+
+    stocked = sorted(stock)
+    stock_row = {name: r + i for i, name in enumerate(stocked)}
+    for order, off in zip(orders, offsets[:-1]):
+        idx = [j for j, name in enumerate(order.matrix.ingredients) if name in stock_row]
+        rows.append(np.array([stock_row[order.matrix.ingredients[j]] for j in idx], dtype=int))
+        cols.append(np.array(idx, dtype=int) + off)
+        vals.append(np.ones(len(idx)))
+    lower.extend([-np.inf] * len(stocked))
+    upper.extend([stock[name] for name in stocked])
+    n_rows = r + len(stocked)
+
+    rows, cols, vals = np.concatenate(rows), np.concatenate(cols), np.concatenate(vals)
+    order_idx = np.lexsort((cols, rows))
+    rows, cols, vals = rows[order_idx], cols[order_idx], vals[order_idx]
+    starts = np.searchsorted(rows, np.arange(n_rows))
+
+    cost = np.concatenate([o.matrix.cost * 1000 for o in orders]) if orders else np.zeros(0)
+    status, x, objective, duals = solve_sparse_lp(
+        cost, np.zeros(n_vars), np.full(n_vars, np.inf), np.array(lower), np.array(upper),
+        (starts, cols, vals), solver=solver)
+    if status != "Optimal":
+        x, objective = np.zeros(n_vars), 0.0
+        duals = np.zeros(n_rows)
+    quantities = [x[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+    stock_duals = {name: -float(duals[row]) for name, row in stock_row.items()}
+    return MillPlan(status, list(orders), quantities, float(objective), stock, stock_duals)
@@ -0,0 +1,170 @@
+"""
+Mixer batch sheets: whole packs and weighed kilograms instead of percentages.
+
+The least-cost formula says e.g. 37.41% maize, but the mill mixes a fixed
+batch (500 kg, 1 t) and draws ingredients in packs: 50 kg bags for the bulk,
+the scale for minor ingredients. Rounding the percentages by hand breaks the
+nutrient targets. ``batch_sheet`` instead solves an integer programme in pack
+counts ``u_j``: ``kg_j = pack_j·u_j``, ``Σ kg_j = capacity``, and every
+nutrient target and ingredient rule holds on the batch as mixed. Solves run
+within the MIP budgets of ``MIP_CONFIG`` so the tab stays responsive.
+"""
+import html
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from formulation_engine import (DEFAULT_SOLVER, MIP_CONFIG, TIME_LIMIT_FEASIBLE, FormulationResult, IngredientMatrix,
+                                NutrientTargets, _csr, _instrument, _resolve_solver, _result,
+                                build_model, formulate, solve_sparse_lp)
+
+MIXER_CONFIG = {
+    "capacity": 1000.0,   # kg per mixer batch
+    "bag_kg":   50.0,     # bulk ingredients come in bags of this size
+    "weigh_kg": 0.1,      # scale resolution for ingredients weighed out
+}
+
+
+def default_packs(result: FormulationResult, capacity: float = None, bag_kg: float = None,
+                  weigh_kg: float = None) -> np.ndarray:
+    """Pack size per ingredient: whole bags where the formula uses at least one
+    bag per batch, weighed kilograms for its other ingredients, and 0 (left
+    out) for ingredients the formula does not use."""
+    capacity = capacity or MIXER_CONFIG["capacity"]
+    bag_kg, weigh_kg = bag_kg or MIXER_CONFIG["bag_kg"], weigh_kg or MIXER_CONFIG["weigh_kg"]
+    kg = result.proportions * capacity
+    return np.where(kg >= bag_kg, bag_kg, np.where(kg > 0, weigh_kg, 0.0))
+
+
+@dataclass
+class BatchSheet:
+    """One mixer batch: ``units[j]`` packs of ``packs[j]`` kg of each ingredient.
+
+    Packs no larger than ``weigh_kg`` are scale steps rather than bags.
+    ``result`` is the batch expressed as a formula (proportions of the mix),
+    so nutrient levels and profiles read the same as for any other solve.
+    ``lp_cost_per_kg`` is the exact (fractional) formula's cost, when the
+    packs were derived from it, for showing what whole packs cost extra.
+    """
+    result: FormulationResult
+    capacity: float
+    packs: np.ndarray
+    units: np.ndarray
+    weigh_kg: float = MIXER_CONFIG["weigh_kg"]
+    lp_cost_per_kg: float = None
+
+    @property
+    def status(self) -> str:
+        return self.result.status
+
+    @property
+    def optimal(self) -> bool:
+        return self.result.optimal
+
+    @property
+    def feasible(self) -> bool:
+        return self.result.feasible
+
+    @property
+    def kg(self) -> np.ndarray:
+        return self.packs * self.units
+
+    def to_frame(self) -> pd.DataFrame:
+        """Ingredients in the batch: whole bags or kilograms to weigh, and cost, largest first."""
+        matrix = self.result.matrix
+        sel = np.flatnonzero(self.units > 0)
+        kg = self.kg[sel]
+        bagged = self.packs[sel] > self.weigh_kg
+        out = pd.DataFrame({
+            "Ingredient":     [matrix.ingredients[j] for j in sel],
+            "Bags":           pd.array(np.where(bagged, self.units[sel], 0).astype(int)).astype("Int64"),
+            "Bag (kg)":       np.where(bagged, self.packs[sel], np.nan),
+            "Weigh (kg)":     np.where(bagged, np.nan, kg.round(3)),
+            "Quantity (kg)":  kg.round(3),
+            "Proportion (%)": (kg / self.capacity * 100).round(2),
+            "Cost (₦)":       (kg * matrix.cost[sel]).round(2),
+        })
+        out.loc[~bagged, "Bags"] = pd.NA
+        return out.sort_values("Quantity (kg)", ascending=False).reset_index(drop=True)
+
+    def to_html(self, title: str, targets: NutrientTargets = None) -> str:
+        """Printable batch sheet: weigh-out list with tick boxes, nutrient check and sign-off."""
+        table = self.to_frame()
+        table.insert(0, "✓", "☐")
+        parts = [
+            f"<h2>{html.escape(title)}</h2>",
+            f"<p>Batch size: <b>{self.capacity:,.0f} kg</b> &nbsp;|&nbsp; Cost: <b>₦{self.result.cost_per_kg * self.capacity:,.2f}</b>"
+            f" (₦{self.result.cost_per_kg:,.2f}/kg)</p>",
+            table.to_html(index=False, escape=True, na_rep="", float_format=lambda v: f"{v:,.2f}"),
+        ]
+        if targets is not None:
+            parts += ["<h3>Nutrient check</h3>", self.result.nutrient_profile(targets).to_html(index=False, na_rep="")]
+        parts.append("<p>Mixed by: ____________________ &nbsp; Date: __________ &nbsp; Checked by: ____________________</p>")
+        style = ("body{font-family:sans-serif;margin:2em}table{border-collapse:collapse;margin-bottom:1em}"
+                 "td,th{border:1px solid #888;padding:4px 10px;text-align:right}td:first-child,th:first-child"
+                 "{text-align:center}@media print{button{display:none}}")
+        return f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{html.escape(title)}</title>" \
+               f"<style>{style}</style></head><body>{''.join(parts)}</body></html>"
+
+
+def batch_sheet(matrix: IngredientMatrix, targets: NutrientTargets, capacity: float = None,
+                packs=None, bag_kg: float = None, weigh_kg: float = None, solver: str = DEFAULT_SOLVER,
+                time_limit: float = None, mip_gap: float = None) -> BatchSheet:
+    """Least-cost batch of exactly ``capacity`` kg in whole packs meeting ``targets``.
+
+    ``packs`` gives kg per pack, 0 leaving an ingredient out: an array
+    aligned with ``matrix``, or a dict of ingredient → kg over the automatic
+    choice of ``default_packs`` (bags of ``bag_kg``, scale steps of
+    ``weigh_kg``). With no ``packs`` at all, a batch that whole bags cannot
+    fit falls back to weighing the formula's ingredients, then every one;
+    the attempts share ``time_limit`` rather than each getting all of it.
+    """
+    capacity = float(capacity or MIXER_CONFIG["capacity"])
+    weigh_kg = weigh_kg or MIXER_CONFIG["weigh_kg"]
+    solver = _resolve_solver(solver)
+    time_limit = MIP_CONFIG["time_limit"] if time_limit is None else time_limit
+    if packs is not None and not isinstance(packs, dict):
+        return _solve_batch(matrix, targets, capacity, packs, weigh_kg, solver, time_limit, mip_gap)
+    deadline = time.perf_counter() + time_limit
+    lp = formulate(matrix, targets, solver=solver)
+    auto = default_packs(lp, capacity, bag_kg, weigh_kg)
+    if packs is None:
+        attempts = (auto, np.where(auto > 0, weigh_kg, 0.0), np.full(matrix.size, weigh_kg))
+    else:
+        attempts = (np.array([packs.get(name, a) for name, a in zip(matrix.ingredients, auto)]),)
+    for attempt in attempts:
+        sheet = _solve_batch(matrix, targets, capacity, attempt, weigh_kg, solver,
+                             max(deadline - time.perf_counter(), 0.0), mip_gap)
+        if sheet.feasible or sheet.status == "Not Solved" or time.perf_counter() >= deadline:
+            break
+    sheet.lp_cost_per_kg = lp.cost_per_kg if lp.optimal else None
+    return sheet
+
+
+def _solve_batch(matrix: IngredientMatrix, targets: NutrientTargets, capacity: float, packs, weigh_kg: float,
+                 solver: str, time_limit: float, mip_gap: float = None) -> BatchSheet:
+    t0 = time.perf_counter()
+    mip_gap = MIP_CONFIG["mip_gap"] if mip_gap is None else mip_gap
+    model = build_model(matrix, targets)
+    packs = np.asarray(packs, dtype=float)
+    usable = packs > 0
+    size = np.where(usable, packs, 1.0)
+
+    # Columns are pack counts, so every row scales by pack size and bounds by batch size
+    A = model.A * size
+    col_lower = np.ceil(model.col_lower * capacity / size - 1e-9)
+    col_upper = np.where(usable, np.floor(model.col_upper * capacity / size + 1e-9), 0.0)
+    t1 = time.perf_counter()
+    status, units, cost, _ = solve_sparse_lp(
+        matrix.cost * size, col_lower, col_upper, model.row_lower * capacity, model.row_upper * capacity,
+        _csr(A), solver=solver, integrality=np.ones(matrix.size, dtype=bool),
+        time_limit=time_limit, mip_gap=mip_gap)
+    t2 = time.perf_counter()
+    units = np.round(units) if status in ("Optimal", TIME_LIMIT_FEASIBLE) else np.zeros(matrix.size)
+    result = _result(matrix, status, units * size / capacity, cost / capacity, None, {"capacity": capacity})
+    _instrument(result, solver, {"rows": len(model.row_labels), "cols": matrix.size,
+                                 "nonzeros": int(np.count_nonzero(A)), "integers": matrix.size},
+                t0, t1, t2, "batch_sheet")
+    return BatchSheet(result, capacity, packs, units, weigh_kg)
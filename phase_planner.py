@@ -0,0 +1,282 @@
+"""
+Phase-feeding planner: which formula to feed in each production stage, and for how long.
+
+Producers feed a sequence of diets — starter, grower, finisher — and the
+cheapest programme is not the cheapest formula for each stage on its own: a
+denser starter costs more per kg but gets the animal to the cheaper finisher
+diet sooner. ``plan_phases`` chooses, for a stage sequence from
+``get_nutrient_requirements()``, how many days each phase lasts and which
+formula it feeds, minimising total feed cost per animal to market weight.
+
+Each phase has a small menu of least-cost formulas (lean, standard and dense:
+the bottom, middle and top of the stage's CP and energy ranges), solved once
+per plan — or read from a ``FormulationCache`` — and reused by every
+schedule. A schedule is one formula per phase plus the length of every phase
+but the last, which runs until market weight. All schedules are simulated
+as one batch through ``simulate_growth`` with per-day diet and intake
+columns, split into chunks across a thread pool; the simulation stops as soon
+as every schedule has reached market weight.
+"""
+import itertools
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from formulation_cache import FormulationCache
+from formulation_engine import (DEFAULT_SOLVER, FormulationResult, FormulationSession, IngredientMatrix,
+                                stage_rules)
+from formulation_growth import candidate_targets
+from growth_simulation import simulate_growth
+from reference_data import get_nutrient_requirements, parse_range, stage_targets
+
+PHASE_CONFIG = {
+    "lengths":      (0.5, 0.75, 1.0, 1.25, 1.5),  # candidate phase lengths, as fractions of the stage's age window
+    "default_days": 28,                           # nominal length of a stage without an age window
+    "horizon":      {"Rabbit": 150, "Poultry": 90, "Cattle": 720},   # days simulated before a schedule gives up
+    "step":         {"Rabbit": 1, "Poultry": 1, "Cattle": 7},        # days per growth prediction (see simulate_growth)
+    "market_weight": {"Rabbit": 2.5, "Poultry": 2.0, "Cattle": 300.0},  # default sale weight (kg)
+    "chunk_rows":   256,                          # schedules per simulation chunk
+    "workers":      os.cpu_count() or 1,
+}
+
+# Default stage sequences for growing animals to market weight
+PROGRAMS = {
+    "Rabbit":  {"Meat Rabbit": ("Grower (4-12 weeks)", "Finisher (12-16 weeks)")},
+    "Poultry": {"Broiler": ("Broiler Starter (0-3 weeks)", "Broiler Grower (3-6 weeks)",
+                            "Broiler Finisher (6+ weeks)")},
+    "Cattle":  {"Beef": ("Calf Grower (3-6 months)", "Heifer (6-12 months)", "Beef Finisher")},
+}
+
+LEVELS = ("Lean", "Standard", "Dense")
+UNUSED = "—"   # a phase the animal reaches market weight before
+
+_UNIT_DAYS = {"week": 7, "weeks": 7, "month": 30.4, "months": 30.4}
+
+
+def stage_window(stage: str) -> float:
+    """Nominal length in days from a stage label such as ``"(3-6 weeks)"``; None when open-ended."""
+    match = re.search(r"\((\d+)-(\d+)\s*(weeks?|months?)\)", stage)
+    if match is None:
+        return None
+    lo, hi, unit = match.groups()
+    return (int(hi) - int(lo)) * _UNIT_DAYS[unit]
+
+
+def stage_intake(stage_data: dict) -> float:
+    """Daily feed intake (kg) at the middle of the stage's range."""
+    if "Feed Intake (kg/day)" in stage_data:
+        return float(np.mean(parse_range(stage_data["Feed Intake (kg/day)"])))
+    return float(np.mean(parse_range(stage_data.get("Feed Intake (g/day)", "100-100")))) / 1000
+
+
+@dataclass
+class Phase:
+    """One stage of the programme with its menu of formulas (one per ``LEVELS`` entry)."""
+    stage: str
+    nominal_days: float
+    intake: float
+    cp_req: float
+    energy_req: float
+    formulas: list   # FormulationResult per level; infeasible levels stay in the list
+
+    @property
+    def feasible(self) -> np.ndarray:
+        return np.flatnonzero([f.optimal for f in self.formulas])
+
+    def levels(self, nutrient: str) -> np.ndarray:
+        return np.array([f.nutrient_levels[nutrient] if f.optimal else np.nan for f in self.formulas])
+
+    @property
+    def costs(self) -> np.ndarray:
+        return np.array([f.cost_per_kg if f.optimal else np.nan for f in self.formulas])
+
+
+def phase_menu(matrix: IngredientMatrix, species: str, stage: str, rules: pd.DataFrame = None,
+               cache: FormulationCache = None, solver: str = DEFAULT_SOLVER) -> Phase:
+    """The stage's lean / standard / dense least-cost formulas."""
+    stage_data = get_nutrient_requirements()[species][stage]
+    base = stage_targets(stage_data)
+    if rules is not None:
+        base.rules = stage_rules(rules, species, stage)
+    cp_lo, cp_hi = parse_range(stage_data.get("Crude Protein (%)", "16-18"))
+    en_lo, en_hi = parse_range(stage_data.get("Energy (kcal/kg)", "2500-2700"))
+    points = zip(np.linspace(cp_lo, cp_hi, len(LEVELS)), np.linspace(en_lo, en_hi, len(LEVELS)))
+    if cache is not None:
+        formulas = [cache.formulate(matrix, candidate_targets(base, cp, en), species=species, solver=solver)[0]
+                    for cp, en in points]
+    else:
+        session = FormulationSession(matrix, solver=solver)
+        formulas = [session.solve(candidate_targets(base, cp, en)) for cp, en in points]
+    window = stage_window(stage)
+    return Phase(stage, window or PHASE_CONFIG["default_days"], stage_intake(stage_data),
+                 (cp_lo + cp_hi) / 2, (en_lo + en_hi) / 2, formulas)
+
+
+def schedules(phases: list) -> tuple:
+    """Every (formula per phase, length of each phase but the last) combination.
+
+    Returns ``(choices, lengths)``: ``(S, P)`` level indices and ``(S, P-1)``
+    days. Infeasible formulas are left out.
+    """
+    lengths = [sorted({max(1, int(round(p.nominal_days * f))) for f in PHASE_CONFIG["lengths"]})
+               for p in phases[:-1]]
+    combos = list(itertools.product(*(p.feasible for p in phases), *lengths))
+    if not combos:
+        return np.zeros((0, len(phases)), dtype=int), np.zeros((0, len(phases) - 1), dtype=int)
+    grid = np.array(combos, dtype=int)
+    return grid[:, :len(phases)], grid[:, len(phases):]
+
+
+def _daily(phases: list, choices: np.ndarray, lengths: np.ndarray, horizon: int) -> dict:
+    """Per-day model inputs and feed price of each schedule, ``(S, horizon)`` arrays."""
+    day = np.arange(horizon)
+    phase_of_day = (day[None, :, None] >= np.cumsum(lengths, axis=1)[:, None, :]).sum(axis=2)
+    level = np.take_along_axis(choices, phase_of_day, axis=1)
+
+    def table(values):
+        return np.asarray(values, dtype=float)[phase_of_day, level]
+
+    return {
+        "phase":       phase_of_day,
+        "cp_req":      np.array([p.cp_req for p in phases])[phase_of_day],
+        "energy_req":  np.array([p.energy_req for p in phases])[phase_of_day],
+        "intake":      np.array([p.intake for p in phases])[phase_of_day],
+        "cp":          table([p.levels("CP") for p in phases]),
+        "energy":      table([p.levels("Energy") for p in phases]),
+        "price":       table([p.costs for p in phases]),
+    }
+
+
+def _evaluate_chunk(model, phases: list, choices: np.ndarray, lengths: np.ndarray, age_weeks: float,
+                    weight: float, market_weight: float, horizon: int, step: int) -> np.ndarray:
+    inputs = _daily(phases, choices, lengths, horizon)
+    trajectory = simulate_growth(model, age_weeks, weight, inputs["cp_req"], inputs["energy_req"], inputs["intake"],
+                                 inputs["cp"], inputs["energy"], days=horizon, stop_at=market_weight, step=step)
+    reached = trajectory.days_to(market_weight)
+    # Column d: feed eaten and ₦ spent over the first d days, each day at that day's phase price
+    start = np.zeros((len(choices), 1))
+    spend = np.hstack([start, np.cumsum(trajectory.intake * inputs["price"][:, :trajectory.horizon], axis=1)])
+    feed = np.hstack([start, np.cumsum(trajectory.intake, axis=1)])
+    ok = np.isfinite(reached)
+    rows, day = np.arange(len(choices)), np.where(ok, reached, 0).astype(int)
+    return np.column_stack([reached, np.where(ok, spend[rows, day], np.nan), np.where(ok, feed[rows, day], np.nan)])
+
+
+@dataclass
+class PhasePlan:
+    """Every evaluated schedule (best first) and the phase menus it drew from."""
+    phases: list
+    schedules: pd.DataFrame
+    market_weight: float
+    age_weeks: float
+    weight: float
+    step: int = 1
+
+    @property
+    def feasible(self) -> bool:
+        return len(self.schedules) > 0 and np.isfinite(self.schedules["Feed Cost to Market (₦)"].iloc[0])
+
+    @property
+    def best(self) -> pd.Series:
+        return self.schedules.iloc[0]
+
+    def nominal(self) -> pd.Series:
+        """The standard formula for each stage's nominal length (the textbook programme)."""
+        s = self.schedules
+        mask = np.ones(len(s), dtype=bool)
+        for k, p in enumerate(self.phases):
+            mask &= s[f"{p.stage} Formula"].isin(["Standard", UNUSED])
+            if k < len(self.phases) - 1:
+                days = s[f"{p.stage} Days"]
+                mask &= days.isna() | (days == int(round(p.nominal_days)))
+        return s[mask].iloc[0] if mask.any() else None
+
+    def programme(self, model, schedule: pd.Series = None) -> tuple:
+        """``(table, trajectory)`` for one schedule (the best by default): a row per phase."""
+        schedule = self.best if schedule is None else schedule
+        horizon = int(schedule["Days to Market"]) if np.isfinite(schedule["Days to Market"]) else 1
+        # An open length runs past market weight; an unused phase's formula is never fed
+        formulas = [schedule[f"{p.stage} Formula"] for p in self.phases]
+        choices = np.array([[LEVELS.index(f) if f in LEVELS else 0 for f in formulas]])
+        lengths = np.array([[horizon if pd.isna(schedule[f"{p.stage} Days"]) else int(schedule[f"{p.stage} Days"])
+                             for p in self.phases[:-1]]])
+        inputs = _daily(self.phases, choices, lengths, horizon)
+        trajectory = simulate_growth(model, self.age_weeks, self.weight, inputs["cp_req"], inputs["energy_req"],
+                                     inputs["intake"], inputs["cp"], inputs["energy"], days=horizon,
+                                     stop_at=self.market_weight, step=self.step)
+        rows = []
+        for k, p in enumerate(self.phases):
+            days = np.flatnonzero(inputs["phase"][0, :trajectory.horizon] == k)
+            if not len(days):
+                continue
+            formula = p.formulas[choices[0, k]]
+            feed = trajectory.intake[0, days].sum()
+            rows.append({
+                "Phase":              p.stage,
+                "Formula":            LEVELS[choices[0, k]],
+                "Start Day":          int(days[0]),
+                "Days":               len(days),
+                "Start Weight (kg)":  trajectory.weight[0, days[0]],
+                "End Weight (kg)":    trajectory.weight[0, days[-1] + 1],
+                "Diet CP (%)":        formula.nutrient_levels["CP"],
+                "Diet Energy (kcal/kg)": formula.nutrient_levels["Energy"],
+                "Feed Cost/kg (₦)":   formula.cost_per_kg,
+                "Feed (kg)":          feed,
+                "Feed Cost (₦)":      feed * formula.cost_per_kg,
+            })
+        return pd.DataFrame(rows), trajectory
+
+    def formula(self, stage: str, level: str) -> FormulationResult:
+        return next(p for p in self.phases if p.stage == stage).formulas[LEVELS.index(level)]
+
+
+def plan_phases(model, matrix: IngredientMatrix, species: str, stages, age_weeks: float, weight: float,
+                market_weight: float, rules: pd.DataFrame = None, cache: FormulationCache = None,
+                horizon: int = None, step: int = None, workers: int = None,
+                solver: str = DEFAULT_SOLVER) -> PhasePlan:
+    """Cheapest feeding programme over ``stages`` from (``age_weeks``, ``weight``) to ``market_weight``.
+
+    ``stages`` is a sequence of stage names of ``species`` (see ``PROGRAMS``);
+    ``rules`` an inclusion-rule table (see ``load_rules``). Schedules that do
+    not reach market weight within ``horizon`` days rank last with a NaN cost.
+    Schedules that differ only in phases the animal never reaches are one
+    programme and listed once, with those phases marked ``UNUSED``.
+    """
+    horizon = horizon or PHASE_CONFIG["horizon"].get(species, 365)
+    step = step or PHASE_CONFIG["step"].get(species, 1)
+    workers = workers or PHASE_CONFIG["workers"]
+    phases = [phase_menu(matrix, species, stage, rules, cache, solver) for stage in stages]
+    choices, lengths = schedules(phases)
+    n_chunks = max(1, int(np.ceil(len(choices) / PHASE_CONFIG["chunk_rows"])))
+    bounds = np.linspace(0, len(choices), n_chunks + 1).astype(int)
+    args = [(model, phases, choices[a:b], lengths[a:b], age_weeks, weight, market_weight, horizon, step)
+            for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+    if len(args) > 1 and workers > 1:
+        # Tree traversal and the numpy stepping release the GIL, so threads run the chunks in parallel
+        with ThreadPoolExecutor(max_workers=min(workers, len(args))) as pool:
+            parts = list(pool.map(lambda a: _evaluate_chunk(*a), args))
+    else:
+        parts = [_evaluate_chunk(*a) for a in args]
+    scores = np.vstack(parts) if parts else np.zeros((0, 3))
+
+    # A phase is used if it starts before market weight; its length matters only if the next one is used
+    reached = np.where(np.isfinite(scores[:, 0]), scores[:, 0], np.inf)
+    starts = np.hstack([np.zeros((len(choices), 1), dtype=int), np.cumsum(lengths, axis=1)])
+    used = starts < reached[:, None]
+    out = {}
+    for k, p in enumerate(phases):
+        out[f"{p.stage} Formula"] = np.where(used[:, k], np.array(LEVELS, dtype=object)[choices[:, k]], UNUSED)
+        if k < len(phases) - 1:
+            out[f"{p.stage} Days"] = pd.Series(lengths[:, k], dtype="Int64").mask(~used[:, k + 1])
+    out["Days to Market"] = scores[:, 0]
+    out["Feed to Market (kg)"] = scores[:, 2]
+    out["Feed Cost to Market (₦)"] = scores[:, 1]
+    table = pd.DataFrame(out)
+    table["Cost per kg Gain (₦)"] = table["Feed Cost to Market (₦)"] / (market_weight - weight)
+    table = table.sort_values(["Feed Cost to Market (₦)", "Days to Market"], na_position="last", kind="stable")
+    table = table.drop_duplicates(subset=[c for c in table.columns if c.endswith((" Formula", " Days"))])
+    return PhasePlan(phases, table.reset_index(drop=True), market_weight, age_weeks, weight, step)
@@ -0,0 +1,144 @@
+"""
+Reference tables shared by the Streamlit pages and the headless formulation
+tools: breed profiles, per-stage nutrient requirements, and helpers that turn
+the requirement ranges (e.g. ``"16-18"``) into optimiser targets.
+"""
+from formulation_engine import NutrientTargets
+
+
+# ─────────────────────────────────────────────
+#  REFERENCE DATA
+# ─────────────────────────────────────────────
+def get_breed_database():
+    rabbit_breeds = {
+        "New Zealand White":{"Type":"Meat","Mature Weight (kg)":"4.5-5.5","Growth Rate":"Fast","Feed Efficiency":"Excellent","Best For":"Commercial meat production","Recommended CP (%)":"16-18","Market Age (weeks)":"10-12"},
+        "Californian":      {"Type":"Meat","Mature Weight (kg)":"4.0-5.0","Growth Rate":"Fast","Feed Efficiency":"Excellent","Best For":"Meat and show","Recommended CP (%)":"16-18","Market Age (weeks)":"10-12"},
+        "Flemish Giant":    {"Type":"Meat","Mature Weight (kg)":"6.0-10.0","Growth Rate":"Moderate","Feed Efficiency":"Good","Best For":"Large-scale meat production","Recommended CP (%)":"17-19","Market Age (weeks)":"14-16"},
+        "Dutch":            {"Type":"Pet/Show","Mature Weight (kg)":"2.0-2.5","Growth Rate":"Moderate","Feed Efficiency":"Good","Best For":"Pets and breeding","Recommended CP (%)":"15-17","Market Age (weeks)":"8-10"},
+        "Rex":              {"Type":"Meat/Fur","Mature Weight (kg)":"3.5-4.5","Growth Rate":"Moderate","Feed Efficiency":"Good","Best For":"Fur and meat","Recommended CP (%)":"16-18","Market Age (weeks)":"10-12"},
+    }
+    poultry_breeds = {
+        "Broiler (Cobb 500)":   {"Type":"Meat","Mature Weight (kg)":"2.5-3.0","Growth Rate":"Very Fast","Feed Efficiency":"Excellent (FCR 1.6-1.8)","Best For":"Commercial meat production","Recommended CP (%)":"20-22","Market Age (weeks)":"5-6"},
+        "Broiler (Ross 308)":   {"Type":"Meat","Mature Weight (kg)":"2.3-2.8","Growth Rate":"Very Fast","Feed Efficiency":"Excellent (FCR 1.65-1.85)","Best For":"Commercial meat production","Recommended CP (%)":"20-22","Market Age (weeks)":"5-6"},
+        "Layer (Isa Brown)":    {"Type":"Eggs","Mature Weight (kg)":"1.8-2.0","Growth Rate":"Moderate","Feed Efficiency":"Good","Best For":"High egg production (300+ eggs/year)","Recommended CP (%)":"16-18","Market Age (weeks)":"18-20 (point of lay)"},
+        "Layer (Lohmann Brown)":{"Type":"Eggs","Mature Weight (kg)":"1.9-2.1","Growth Rate":"Moderate","Feed Efficiency":"Excellent","Best For":"Egg production (320+ eggs/year)","Recommended CP (%)":"16-18","Market Age (weeks)":"18-20 (point of lay)"},
+        "Noiler":               {"Type":"Dual Purpose","Mature Weight (kg)":"2.0-2.5","Growth Rate":"Fast","Feed Efficiency":"Good","Best For":"Meat and eggs (Nigerian adapted)","Recommended CP (%)":"18-20","Market Age (weeks)":"12-16"},
+        "Kuroiler":             {"Type":"Dual Purpose","Mature Weight (kg)":"2.5-3.5","Growth Rate":"Moderate","Feed Efficiency":"Good","Best For":"Free-range, dual purpose","Recommended CP (%)":"16-18","Market Age (weeks)":"14-18"},
+        "Local Nigerian":       {"Type":"Dual Purpose","Mature Weight (kg)":"1.2-1.8","Growth Rate":"Slow","Feed Efficiency":"Moderate","Best For":"Free-range, disease resistant","Recommended CP (%)":"14-16","Market Age (weeks)":"20-24"},
+    }
+    cattle_breeds = {
+        "White Fulani":          {"Type":"Beef/Dairy","Mature Weight (kg)":"300-450","Growth Rate":"Moderate","Feed Efficiency":"Good","Best For":"Milk and beef (Nigerian indigenous)","Recommended CP (%)":"14-16","Market Age (months)":"24-30"},
+        "Red Bororo":            {"Type":"Beef","Mature Weight (kg)":"250-350","Growth Rate":"Moderate","Feed Efficiency":"Good","Best For":"Beef production (heat tolerant)","Recommended CP (%)":"13-15","Market Age (months)":"24-28"},
+        "Sokoto Gudali":         {"Type":"Beef","Mature Weight (kg)":"350-500","Growth Rate":"Moderate-Fast","Feed Efficiency":"Good","Best For":"Beef (large frame)","Recommended CP (%)":"14-16","Market Age (months)":"24-30"},
+        "N'Dama":                {"Type":"Beef/Draft","Mature Weight (kg)":"300-400","Growth Rate":"Moderate","Feed Efficiency":"Good","Best For":"Trypanosomiasis resistant","Recommended CP (%)":"12-14","Market Age (months)":"30-36"},
+        "Muturu":                {"Type":"Beef/Draft","Mature Weight (kg)":"200-300","Growth Rate":"Slow","Feed Efficiency":"Moderate","Best For":"Small-holder, disease resistant","Recommended CP (%)":"12-14","Market Age (months)":"30-36"},
+        "Holstein Friesian (Cross)":{"Type":"Dairy","Mature Weight (kg)":"450-650","Growth Rate":"Fast","Feed Efficiency":"Excellent","Best For":"High milk production","Recommended CP (%)":"16-18","Market Age (months)":"24-28"},
+        "Brahman Cross":         {"Type":"Beef","Mature Weight (kg)":"400-550","Growth Rate":"Fast","Feed Efficiency":"Excellent","Best For":"Beef (heat adapted)","Recommended CP (%)":"14-16","Market Age (months)":"20-24"},
+    }
+    return {"Rabbit": rabbit_breeds, "Poultry": poultry_breeds, "Cattle": cattle_breeds}
+
+
+def get_nutrient_requirements():
+    rabbit_nutrients = {
+        "Grower (4-12 weeks)":    {"Crude Protein (%)":"16-18","Energy (kcal/kg)":"2500-2700","Crude Fiber (%)":"12-16","Calcium (%)":"0.4-0.8","Phosphorus (%)":"0.3-0.5","Lysine (%)":"0.65-0.75","Feed Intake (g/day)":"80-120"},
+        "Finisher (12-16 weeks)": {"Crude Protein (%)":"14-16","Energy (kcal/kg)":"2400-2600","Crude Fiber (%)":"14-18","Calcium (%)":"0.4-0.7","Phosphorus (%)":"0.3-0.5","Lysine (%)":"0.55-0.65","Feed Intake (g/day)":"120-180"},
+        "Doe (Maintenance)":      {"Crude Protein (%)":"15-16","Energy (kcal/kg)":"2500-2600","Crude Fiber (%)":"14-16","Calcium (%)":"0.5-0.8","Phosphorus (%)":"0.4-0.5","Lysine (%)":"0.60-0.70","Feed Intake (g/day)":"100-150"},
+        "Doe (Pregnant)":         {"Crude Protein (%)":"16-18","Energy (kcal/kg)":"2600-2800","Crude Fiber (%)":"12-15","Calcium (%)":"0.8-1.2","Phosphorus (%)":"0.5-0.7","Lysine (%)":"0.70-0.80","Feed Intake (g/day)":"150-200"},
+        "Doe (Lactating)":        {"Crude Protein (%)":"17-19","Energy (kcal/kg)":"2700-3000","Crude Fiber (%)":"12-14","Calcium (%)":"1.0-1.5","Phosphorus (%)":"0.6-0.8","Lysine (%)":"0.75-0.90","Feed Intake (g/day)":"200-400"},
+        "Buck (Breeding)":        {"Crude Protein (%)":"15-17","Energy (kcal/kg)":"2500-2700","Crude Fiber (%)":"14-16","Calcium (%)":"0.5-0.8","Phosphorus (%)":"0.4-0.6","Lysine (%)":"0.65-0.75","Feed Intake (g/day)":"120-170"},
+    }
+    poultry_nutrients = {
+        "Broiler Starter (0-3 weeks)":    {"Crude Protein (%)":"22-24","Energy (kcal/kg)":"3000-3200","Crude Fiber (%)":"3-4","Calcium (%)":"0.9-1.0","Phosphorus (%)":"0.45-0.50","Lysine (%)":"1.20-1.35","Methionine (%)":"0.50-0.55","Feed Intake (g/day)":"25-35"},
+        "Broiler Grower (3-6 weeks)":     {"Crude Protein (%)":"20-22","Energy (kcal/kg)":"3100-3300","Crude Fiber (%)":"3-5","Calcium (%)":"0.85-0.95","Phosphorus (%)":"0.40-0.45","Lysine (%)":"1.05-1.20","Methionine (%)":"0.45-0.50","Feed Intake (g/day)":"80-120"},
+        "Broiler Finisher (6+ weeks)":    {"Crude Protein (%)":"18-20","Energy (kcal/kg)":"3200-3400","Crude Fiber (%)":"3-5","Calcium (%)":"0.80-0.90","Phosphorus (%)":"0.35-0.40","Lysine (%)":"0.95-1.10","Methionine (%)":"0.40-0.45","Feed Intake (g/day)":"140-180"},
+        "Layer Starter (0-6 weeks)":      {"Crude Protein (%)":"18-20","Energy (kcal/kg)":"2800-3000","Crude Fiber (%)":"3-5","Calcium (%)":"0.9-1.0","Phosphorus (%)":"0.45-0.50","Lysine (%)":"0.95-1.05","Methionine (%)":"0.40-0.45","Feed Intake (g/day)":"20-40"},
+        "Layer Grower (6-18 weeks)":      {"Crude Protein (%)":"16-18","Energy (kcal/kg)":"2700-2900","Crude Fiber (%)":"4-6","Calcium (%)":"0.8-0.9","Phosphorus (%)":"0.40-0.45","Lysine (%)":"0.75-0.85","Methionine (%)":"0.35-0.40","Feed Intake (g/day)":"60-90"},
+        "Layer Production (18+ weeks)":   {"Crude Protein (%)":"16-18","Energy (kcal/kg)":"2750-2900","Crude Fiber (%)":"4-6","Calcium (%)":"3.5-4.0","Phosphorus (%)":"0.35-0.40","Lysine (%)":"0.75-0.85","Methionine (%)":"0.38-0.42","Feed Intake (g/day)":"110-130"},
+    }
+    cattle_nutrients = {
+        "Calf Starter (0-3 months)":{"Crude Protein (%)":"18-20","Energy (kcal/kg)":"3000-3200","Crude Fiber (%)":"8-12","Calcium (%)":"0.7-1.0","Phosphorus (%)":"0.4-0.6","TDN (%)":"72-78","Feed Intake (kg/day)":"0.5-1.5"},
+        "Calf Grower (3-6 months)": {"Crude Protein (%)":"16-18","Energy (kcal/kg)":"2800-3000","Crude Fiber (%)":"10-15","Calcium (%)":"0.6-0.9","Phosphorus (%)":"0.35-0.50","TDN (%)":"68-74","Feed Intake (kg/day)":"2-4"},
+        "Heifer (6-12 months)":     {"Crude Protein (%)":"14-16","Energy (kcal/kg)":"2600-2800","Crude Fiber (%)":"12-18","Calcium (%)":"0.5-0.8","Phosphorus (%)":"0.30-0.45","TDN (%)":"65-70","Feed Intake (kg/day)":"4-7"},
+        "Bull (Breeding)":          {"Crude Protein (%)":"12-14","Energy (kcal/kg)":"2500-2700","Crude Fiber (%)":"15-20","Calcium (%)":"0.4-0.7","Phosphorus (%)":"0.25-0.40","TDN (%)":"62-68","Feed Intake (kg/day)":"8-12"},
+        "Cow (Dry)":                {"Crude Protein (%)":"10-12","Energy (kcal/kg)":"2400-2600","Crude Fiber (%)":"18-25","Calcium (%)":"0.4-0.6","Phosphorus (%)":"0.25-0.35","TDN (%)":"58-65","Feed Intake (kg/day)":"10-15"},
+        "Cow (Lactating)":          {"Crude Protein (%)":"14-18","Energy (kcal/kg)":"2700-3000","Crude Fiber (%)":"15-22","Calcium (%)":"0.6-0.9","Phosphorus (%)":"0.35-0.50","TDN (%)":"68-75","Feed Intake (kg/day)":"12-20"},
+        "Beef Finisher":            {"Crude Protein (%)":"12-14","Energy (kcal/kg)":"2800-3100","Crude Fiber (%)":"8-15","Calcium (%)":"0.5-0.7","Phosphorus (%)":"0.30-0.45","TDN (%)":"70-78","Feed Intake (kg/day)":"8-14"},
+    }
+    return {"Rabbit": rabbit_nutrients, "Poultry": poultry_nutrients, "Cattle": cattle_nutrients}
+
+
+# ─────────────────────────────────────────────
+#  RANGE PARSING & STAGE TARGETS
+# ─────────────────────────────────────────────
+def parse_range(val_str) -> tuple:
+    """``"16-18"`` → ``(16.0, 18.0)``; a single number gives ``(v, v)``."""
+    try:
+        parts = str(val_str).split("-")
+        return float(parts[0]), float(parts[-1])
+    except (TypeError, ValueError):
+        return 0.0, 0.0
+
+
+def parse_mid(val_str) -> float:
+    lo, hi = parse_range(val_str)
+    return round((lo + hi) / 2, 1)
+
+
+# Stage-table keys → optimiser nutrient names (see formulation_engine.NUTRIENT_COLUMNS).
+# Feed intake rows describe the animal, not the feed, so they are not constraints.
+STAGE_NUTRIENTS = {
+    "Crude Protein (%)": "CP",
+    "Energy (kcal/kg)":  "Energy",
+    "Crude Fiber (%)":   "Fiber",
+    "Calcium (%)":       "Calcium",
+    "Phosphorus (%)":    "Phosphorus",
+    "Lysine (%)":        "Lysine",
+    "Methionine (%)":    "Methionine",
+    "TDN (%)":           "TDN",
+}
+
+
+def range_targets(stage_data: dict, skip=("CP", "Energy", "Fiber")) -> NutrientTargets:
+    """Min/max constraints for every nutrient range in a stage, except those in ``skip``."""
+    targets = NutrientTargets()
+    for key, val in stage_data.items():
+        nutrient = STAGE_NUTRIENTS.get(key)
+        if nutrient and nutrient not in skip:
+            targets.minimum[nutrient], targets.maximum[nutrient] = parse_range(val)
+    return targets
+
+
+def stage_targets(stage_data: dict, breed_info: dict = None, use_fiber: bool = False,
+                  full: bool = True) -> NutrientTargets:
+    """Optimiser targets for a stage, as the optimiser tab pre-fills them.
+
+    CP and energy minimums sit at the range midpoint; a breed's recommended CP
+    range replaces the stage's when given. Fiber is bounded by the stage range
+    only when ``use_fiber`` is set. With ``full`` every other range in the
+    stage (calcium, phosphorus, lysine, methionine, TDN) becomes a min/max
+    pair, and CP/energy are capped at the top of their ranges.
+    """
+    cp_range = (breed_info or {}).get("Recommended CP (%)", stage_data.get("Crude Protein (%)", "16-18"))
+    energy_range = stage_data.get("Energy (kcal/kg)", "2500-2700")
+    targets = range_targets(stage_data) if full else NutrientTargets()
+    targets.minimum.update({"CP": parse_mid(cp_range), "Energy": parse_mid(energy_range)})
+    if full:
+        targets.maximum.update({"CP": parse_range(cp_range)[1], "Energy": parse_range(energy_range)[1]})
+    if use_fiber and "Crude Fiber (%)" in stage_data:
+        targets.minimum["Fiber"], targets.maximum["Fiber"] = parse_range(stage_data["Crude Fiber (%)"])
+    return targets
+
+
+def stage_range_targets(stage_data: dict, cp_min: float, energy_min: float) -> NutrientTargets:
+    """Full stage ranges around user-chosen CP/energy minimums.
+
+    The caps stay at the top of the stage's CP/energy ranges unless the
+    minimum asked for is higher, so the targets can never contradict.
+    """
+    targets = range_targets(stage_data)
+    targets.minimum.update({"CP": cp_min, "Energy": energy_min})
+    targets.maximum.update({
+        "CP":     max(cp_min, parse_range(stage_data.get("Crude Protein (%)", "16-18"))[1]),
+        "Energy": max(energy_min, parse_range(stage_data.get("Energy (kcal/kg)", "2500-2700"))[1]),
+    })
+    return targets
@@ -0,0 +1,193 @@
+"""
+Bounded background queue for formulation solves.
+
+The optimiser tab submits a job and gets a job ID back straight away; the
+solve runs in a small pool of worker processes, so a slow MILP never holds a
+Streamlit script thread and concurrent sessions cannot start more solver
+processes than ``workers``. Jobs beyond the pool wait in a queue of at most
+``max_pending``; past that ``submit`` raises ``QueueFull`` and the caller
+asks the user to retry. Results go through the shared ``FormulationCache``,
+so a repeated request completes without touching the pool.
+"""
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import CancelledError, Future
+from concurrent.futures.process import BrokenProcessPool
+from concurrent.futures import wait as _wait
+from dataclasses import dataclass, field
+
+from formulation_batch import _pool
+from formulation_cache import FormulationCache, result_key
+from formulation_engine import DEFAULT_SOLVER, IngredientMatrix, NutrientTargets, formulate
+from formulation_metrics import METRICS
+
+QUEUE_CONFIG = {
+    "workers":      int(os.environ.get("SOLVE_QUEUE_WORKERS", min(4, os.cpu_count() or 1))),
+    "max_pending":  32,    # queued + running jobs before submit() pushes back
+    "max_finished": 256,   # finished jobs kept for polling before the oldest are dropped
+}
+
+ACTIVE_STATES = ("Queued", "Running")
+
+
+class QueueFull(RuntimeError):
+    """Raised by ``SolveQueue.submit`` when ``max_pending`` jobs are already waiting."""
+
+
+@dataclass
+class SolveJob:
+    job_id: str
+    species: str
+    future: Future
+    submitted: float
+    time_limit: float = None
+    cache_hit: bool = False
+    finished: float = None
+    cancel_requested: bool = False
+    error: str = field(default=None, repr=False)
+
+
+class SolveQueue:
+    """Job IDs, status polling and cancellation over a bounded process pool.
+
+    Queued jobs cancel immediately. A job already running in a worker cannot
+    be interrupted; cancelling it marks it ``Cancelled`` and its result is
+    discarded (MILP solves are bounded by their time limit regardless).
+    """
+
+    def __init__(self, workers: int = None, max_pending: int = None,
+                 cache: FormulationCache = None, solver: str = DEFAULT_SOLVER):
+        self.workers = workers or QUEUE_CONFIG["workers"]
+        self.max_pending = max_pending or QUEUE_CONFIG["max_pending"]
+        self.cache = cache
+        self.solver = solver
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _pool(self):
+        # Started on first use so importing the app never spawns workers
+        if self._executor is None:
+            self._executor = _pool(self.workers)
+        return self._executor
+
+    def _replace_pool(self, broken) -> None:
+        # A crashed worker breaks the whole executor for good; start a fresh one (caller holds the lock)
+        if self._executor is broken:
+            self._executor = None
+            broken.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, fn, *args, **kwargs) -> Future:
+        # Caller holds the lock
+        pool = self._pool()
+        try:
+            return pool.submit(fn, *args, **kwargs)
+        except BrokenProcessPool:
+            self._replace_pool(pool)
+            return self._pool().submit(fn, *args, **kwargs)
+
+    def warm(self) -> None:
+        """Start the workers now (non-blocking) so the first solve skips process start-up."""
+        with self._lock:
+            for _ in range(self.workers):
+                self._submit(os.getpid)
+
+    def submit(self, matrix: IngredientMatrix, targets: NutrientTargets, species: str = None,
+               solve=formulate, **options) -> str:
+        """Queue ``solve(matrix, targets, solver=..., **options)`` and return its job ID.
+
+        ``solve`` is ``formulate`` or a drop-in such as ``formulate_robust``;
+        it must be a module-level function so worker processes can import it.
+        """
+        key = result_key(matrix, targets, **options) if solve is formulate else \
+            result_key(matrix, targets, solve=f"{solve.__module__}.{solve.__name__}", **options)
+        cached = self.cache.get(key, matrix) if self.cache is not None else None
+        with self._lock:
+            if cached is not None:
+                future = Future()
+                future.set_result(cached)
+            else:
+                if sum(not j.future.done() for j in self._jobs.values()) >= self.max_pending:
+                    raise QueueFull(f"{self.max_pending} formulations are already waiting; please retry shortly.")
+                future = self._submit(solve, matrix, targets, solver=self.solver, **options)
+            job_id = f"job-{next(self._ids)}"
+            job = SolveJob(job_id, species, future, time.time(), options.get("time_limit"),
+                           cache_hit=cached is not None)
+            self._jobs[job_id] = job
+            self._prune()
+        future.add_done_callback(lambda f: self._finish(job, key, f))
+        return job_id
+
+    def _finish(self, job: SolveJob, key: str, future: Future) -> None:
+        job.finished = time.time()
+        if future.cancelled() or job.cancel_requested:
+            return
+        if future.exception() is not None:
+            job.error = str(future.exception())
+        elif not job.cache_hit:
+            # Workers record into their own process; mirror the record here for the app's percentiles
+            METRICS.observe(future.result().stats)
+            if self.cache is not None and future.result().proven:
+                self.cache.put(key, future.result(), job.species)
+
+    def _prune(self) -> None:
+        finished = [jid for jid, job in self._jobs.items() if job.future.done()]
+        for jid in finished[:max(0, len(finished) - QUEUE_CONFIG["max_finished"])]:
+            del self._jobs[jid]
+
+    def _job(self, job_id: str) -> SolveJob:
+        with self._lock:
+            if job_id not in self._jobs:
+                raise KeyError(f"unknown or expired job {job_id!r}")
+            return self._jobs[job_id]
+
+    def status(self, job_id: str) -> dict:
+        """``state`` (Queued/Running/Done/Failed/Cancelled), queue ``position``,
+        ``elapsed`` seconds and, for time-limited solves, ``progress`` in [0, 1].
+        """
+        job = self._job(job_id)
+        fut = job.future
+        if fut.cancelled() or job.cancel_requested:
+            state = "Cancelled"
+        elif fut.done():
+            state = "Failed" if fut.exception() is not None else "Done"
+        else:
+            state = "Running" if fut.running() else "Queued"
+        with self._lock:
+            ahead = [j for j in self._jobs.values()
+                     if not j.future.done() and not j.future.running() and j.submitted < job.submitted]
+        elapsed = (job.finished or time.time()) - job.submitted
+        out = {"job_id": job_id, "state": state, "position": len(ahead) if state == "Queued" else 0,
+               "elapsed": elapsed, "cache_hit": job.cache_hit, "error": job.error}
+        if job.time_limit:
+            out["progress"] = 1.0 if fut.done() else min(elapsed / job.time_limit, 1.0)
+        return out
+
+    def wait(self, job_id: str, timeout: float = None) -> bool:
+        """Block up to ``timeout`` seconds; True once the job has finished."""
+        return bool(_wait([self._job(job_id).future], timeout=timeout).done)
+
+    def result(self, job_id: str) -> tuple:
+        """``(FormulationResult, cache_hit)`` of a finished job; re-raises its error."""
+        job = self._job(job_id)
+        if job.cancel_requested:
+            raise CancelledError(job_id)
+        return job.future.result(timeout=0), job.cache_hit
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a job; True unless it had already finished."""
+        job = self._job(job_id)
+        if job.future.done():
+            return False
+        job.cancel_requested = True
+        job.future.cancel()
+        return True
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
@@ -1,14 +1,33 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-from pulp import LpProblem, LpMinimize, LpVariable, lpSum, LpStatus, value
 import plotly.express as px
 import plotly.graph_objects as go
-from sklearn.ensemble import RandomForestRegressor
 from datetime import datetime, timedelta
 import time
 import re
 import html
+import os
+from concurrent.futures import CancelledError
+
+from formulation_batch import PRICE_VOLATILITY, simulate_price_risk, sweep_targets
+from formulation_cache import FormulationCache
+from formulation_diagnosis import bound_check, diagnose
+from formulation_engine import (MIP_CONFIG, IngredientMatrix, NutrientTargets, formulate, load_composition,
+                                load_rules, stage_rules)
+from formulation_growth import GROWTH_SEARCH_CONFIG, optimize_cost_per_gain
+from formulation_metrics import METRICS
+from formulation_robust import ROBUST_CONFIG, delivery_profile, formulate_robust, load_variability, nutrient_sd
+from growth_model import MODEL_CONFIG
+from growth_simulation import simulate_growth
+from growth_training import LiveModel, validate_trials
+from ingredient_store import IngredientStore
+from mill_planner import ProductOrder, plan_production
+from mixer_batch import MIXER_CONFIG, batch_sheet
+from phase_planner import PHASE_CONFIG, PROGRAMS, plan_phases
+from reference_data import (get_breed_database, get_nutrient_requirements, parse_mid, stage_range_targets,
+                            stage_targets)
+from solve_queue import ACTIVE_STATES, QueueFull, SolveQueue
 
 # ─────────────────────────────────────────────
 #  RATE LIMITER
@@ -18,6 +37,7 @@ RATE_LIMIT_CONFIG = {
     "predict":     {"max_calls": 20, "window_seconds": 60},
     "save_db":     {"max_calls": 5,  "window_seconds": 60},
     "report":      {"max_calls": 15, "window_seconds": 60},
+    "ingest":      {"max_calls": 3,  "window_seconds": 300},
 }
 
 def _rl_key(action: str) -> str:
@@ -594,87 +614,96 @@ st.markdown(CSS, unsafe_allow_html=True)
 # ─────────────────────────────────────────────
 #  DATA LOADING & ML
 # ─────────────────────────────────────────────
+@st.cache_resource
+def get_ingredient_store():
+    # Per-species versions in SQLite, shared by every session and worker process
+    return IngredientStore()
+
+@st.cache_data(max_entries=12)
+def load_catalogue(species, version):
+    # Keyed on the species' version: saving one catalogue re-reads that one only
+    return get_ingredient_store().load(species, version)
+
 @st.cache_data
-def load_data():
-    rabbit  = pd.read_csv("rabbit_ingredients.csv")
-    poultry = pd.read_csv("poultry_ingredients.csv")
-    cattle  = pd.read_csv("cattle_ingredients.csv")
+def load_reference_data():
     ml_data = pd.read_csv("livestock_feed_training_dataset.csv")
-    return rabbit, poultry, cattle, ml_data
+    return ml_data, load_composition(), load_variability(), load_rules()
 
-rabbit_df, poultry_df, cattle_df, ml_df = load_data()
+catalogue_versions = get_ingredient_store().versions()
+rabbit_df, poultry_df, cattle_df = (load_catalogue(sp, catalogue_versions[sp]) for sp in ("Rabbit", "Poultry", "Cattle"))
+ml_df, composition_df, variability_df, rules_df = load_reference_data()
 
 @st.cache_resource
-def train_model(data):
-    X = data[["Age_Weeks","Body_Weight_kg","CP_Requirement_%","Energy_Requirement_Kcal",
-               "Feed_Intake_kg","Ingredient_CP_%","Ingredient_Energy"]]
-    y = data["Expected_Daily_Gain_g"]
-    model = RandomForestRegressor(n_estimators=200, random_state=42)
-    model.fit(X, y)
-    return model
-
-model = train_model(ml_df)
-
+def get_live_model():
+    # Loads (or trains) in the background and swaps in retrained models without blocking sessions
+    live = LiveModel()
+    live.warm()
+    return live
+
+def get_growth_model():
+    return get_live_model().get()
+
+@st.fragment(run_every=1.0)
+def show_ingest_progress(future):
+    """Polls a background trial ingest, then reruns the page to show its report."""
+    if future.done():
+        st.rerun()
+    st.info("⚙️ Appending trials and updating the growth model… predictions keep using the current model.")
 
-# ─────────────────────────────────────────────
-#  REFERENCE DATA
-# ─────────────────────────────────────────────
-def get_breed_database():
-    rabbit_breeds = {
-        "New Zealand White":{"Type":"Meat","Mature Weight (kg)":"4.5-5.5","Growth Rate":"Fast","Feed Efficiency":"Excellent","Best For":"Commercial meat production","Recommended CP (%)":"16-18","Market Age (weeks)":"10-12"},
-        "Californian":      {"Type":"Meat","Mature Weight (kg)":"4.0-5.0","Growth Rate":"Fast","Feed Efficiency":"Excellent","Best For":"Meat and show","Recommended CP (%)":"16-18","Market Age (weeks)":"10-12"},
-        "Flemish Giant":    {"Type":"Meat","Mature Weight (kg)":"6.0-10.0","Growth Rate":"Moderate","Feed Efficiency":"Good","Best For":"Large-scale meat production","Recommended CP (%)":"17-19","Market Age (weeks)":"14-16"},
-        "Dutch":            {"Type":"Pet/Show","Mature Weight (kg)":"2.0-2.5","Growth Rate":"Moderate","Feed Efficiency":"Good","Best For":"Pets and breeding","Recommended CP (%)":"15-17","Market Age (weeks)":"8-10"},
-        "Rex":              {"Type":"Meat/Fur","Mature Weight (kg)":"3.5-4.5","Growth Rate":"Moderate","Feed Efficiency":"Good","Best For":"Fur and meat","Recommended CP (%)":"16-18","Market Age (weeks)":"10-12"},
-    }
-    poultry_breeds = {
-        "Broiler (Cobb 500)":   {"Type":"Meat","Mature Weight (kg)":"2.5-3.0","Growth Rate":"Very Fast","Feed Efficiency":"Excellent (FCR 1.6-1.8)","Best For":"Commercial meat production","Recommended CP (%)":"20-22","Market Age (weeks)":"5-6"},
-        "Broiler (Ross 308)":   {"Type":"Meat","Mature Weight (kg)":"2.3-2.8","Growth Rate":"Very Fast","Feed Efficiency":"Excellent (FCR 1.65-1.85)","Best For":"Commercial meat production","Recommended CP (%)":"20-22","Market Age (weeks)":"5-6"},
-        "Layer (Isa Brown)":    {"Type":"Eggs","Mature Weight (kg)":"1.8-2.0","Growth Rate":"Moderate","Feed Efficiency":"Good","Best For":"High egg production (300+ eggs/year)","Recommended CP (%)":"16-18","Market Age (weeks)":"18-20 (point of lay)"},
-        "Layer (Lohmann Brown)":{"Type":"Eggs","Mature Weight (kg)":"1.9-2.1","Growth Rate":"Moderate","Feed Efficiency":"Excellent","Best For":"Egg production (320+ eggs/year)","Recommended CP (%)":"16-18","Market Age (weeks)":"18-20 (point of lay)"},
-        "Noiler":               {"Type":"Dual Purpose","Mature Weight (kg)":"2.0-2.5","Growth Rate":"Fast","Feed Efficiency":"Good","Best For":"Meat and eggs (Nigerian adapted)","Recommended CP (%)":"18-20","Market Age (weeks)":"12-16"},
-        "Kuroiler":             {"Type":"Dual Purpose","Mature Weight (kg)":"2.5-3.5","Growth Rate":"Moderate","Feed Efficiency":"Good","Best For":"Free-range, dual purpose","Recommended CP (%)":"16-18","Market Age (weeks)":"14-18"},
-        "Local Nigerian":       {"Type":"Dual Purpose","Mature Weight (kg)":"1.2-1.8","Growth Rate":"Slow","Feed Efficiency":"Moderate","Best For":"Free-range, disease resistant","Recommended CP (%)":"14-16","Market Age (weeks)":"20-24"},
-    }
-    cattle_breeds = {
-        "White Fulani":          {"Type":"Beef/Dairy","Mature Weight (kg)":"300-450","Growth Rate":"Moderate","Feed Efficiency":"Good","Best For":"Milk and beef (Nigerian indigenous)","Recommended CP (%)":"14-16","Market Age (months)":"24-30"},
-        "Red Bororo":            {"Type":"Beef","Mature Weight (kg)":"250-350","Growth Rate":"Moderate","Feed Efficiency":"Good","Best For":"Beef production (heat tolerant)","Recommended CP (%)":"13-15","Market Age (months)":"24-28"},
-        "Sokoto Gudali":         {"Type":"Beef","Mature Weight (kg)":"350-500","Growth Rate":"Moderate-Fast","Feed Efficiency":"Good","Best For":"Beef (large frame)","Recommended CP (%)":"14-16","Market Age (months)":"24-30"},
-        "N'Dama":                {"Type":"Beef/Draft","Mature Weight (kg)":"300-400","Growth Rate":"Moderate","Feed Efficiency":"Good","Best For":"Trypanosomiasis resistant","Recommended CP (%)":"12-14","Market Age (months)":"30-36"},
-        "Muturu":                {"Type":"Beef/Draft","Mature Weight (kg)":"200-300","Growth Rate":"Slow","Feed Efficiency":"Moderate","Best For":"Small-holder, disease resistant","Recommended CP (%)":"12-14","Market Age (months)":"30-36"},
-        "Holstein Friesian (Cross)":{"Type":"Dairy","Mature Weight (kg)":"450-650","Growth Rate":"Fast","Feed Efficiency":"Excellent","Best For":"High milk production","Recommended CP (%)":"16-18","Market Age (months)":"24-28"},
-        "Brahman Cross":         {"Type":"Beef","Mature Weight (kg)":"400-550","Growth Rate":"Fast","Feed Efficiency":"Excellent","Best For":"Beef (heat adapted)","Recommended CP (%)":"14-16","Market Age (months)":"20-24"},
-    }
-    return {"Rabbit": rabbit_breeds, "Poultry": poultry_breeds, "Cattle": cattle_breeds}
+@st.cache_resource
+def get_formulation_cache():
+    # Backed by a SQLite file, so results are shared across sessions and worker processes
+    return FormulationCache()
 
+@st.cache_resource
+def get_solve_queue():
+    # One bounded worker pool for the whole server; sessions queue behind it
+    queue = SolveQueue(cache=get_formulation_cache())
+    queue.warm()
+    return queue
+
+@st.fragment(run_every=0.5)
+def show_solve_progress(job_id):
+    """Polls a background solve, then reruns the page to show its results."""
+    status = get_solve_queue().status(job_id)
+    if status["state"] not in ACTIVE_STATES:
+        st.rerun()
+    if status["state"] == "Queued":
+        st.info(f"⏳ Queued — {status['position']} job(s) ahead · {status['elapsed']:.1f}s")
+    else:
+        st.info(f"⚙️ Solving… {status['elapsed']:.1f}s")
+    if "progress" in status:
+        st.progress(status["progress"], text="of the solver time limit")
+    if st.button("✖ Cancel", key="cancel_opt"):
+        get_solve_queue().cancel(job_id)
+        st.rerun()
 
-def get_nutrient_requirements():
-    rabbit_nutrients = {
-        "Grower (4-12 weeks)":    {"Crude Protein (%)":"16-18","Energy (kcal/kg)":"2500-2700","Crude Fiber (%)":"12-16","Calcium (%)":"0.4-0.8","Phosphorus (%)":"0.3-0.5","Lysine (%)":"0.65-0.75","Feed Intake (g/day)":"80-120"},
-        "Finisher (12-16 weeks)": {"Crude Protein (%)":"14-16","Energy (kcal/kg)":"2400-2600","Crude Fiber (%)":"14-18","Calcium (%)":"0.4-0.7","Phosphorus (%)":"0.3-0.5","Lysine (%)":"0.55-0.65","Feed Intake (g/day)":"120-180"},
-        "Doe (Maintenance)":      {"Crude Protein (%)":"15-16","Energy (kcal/kg)":"2500-2600","Crude Fiber (%)":"14-16","Calcium (%)":"0.5-0.8","Phosphorus (%)":"0.4-0.5","Lysine (%)":"0.60-0.70","Feed Intake (g/day)":"100-150"},
-        "Doe (Pregnant)":         {"Crude Protein (%)":"16-18","Energy (kcal/kg)":"2600-2800","Crude Fiber (%)":"12-15","Calcium (%)":"0.8-1.2","Phosphorus (%)":"0.5-0.7","Lysine (%)":"0.70-0.80","Feed Intake (g/day)":"150-200"},
-        "Doe (Lactating)":        {"Crude Protein (%)":"17-19","Energy (kcal/kg)":"2700-3000","Crude Fiber (%)":"12-14","Calcium (%)":"1.0-1.5","Phosphorus (%)":"0.6-0.8","Lysine (%)":"0.75-0.90","Feed Intake (g/day)":"200-400"},
-        "Buck (Breeding)":        {"Crude Protein (%)":"15-17","Energy (kcal/kg)":"2500-2700","Crude Fiber (%)":"14-16","Calcium (%)":"0.5-0.8","Phosphorus (%)":"0.4-0.6","Lysine (%)":"0.65-0.75","Feed Intake (g/day)":"120-170"},
-    }
-    poultry_nutrients = {
-        "Broiler Starter (0-3 weeks)":    {"Crude Protein (%)":"22-24","Energy (kcal/kg)":"3000-3200","Crude Fiber (%)":"3-4","Calcium (%)":"0.9-1.0","Phosphorus (%)":"0.45-0.50","Lysine (%)":"1.20-1.35","Methionine (%)":"0.50-0.55","Feed Intake (g/day)":"25-35"},
-        "Broiler Grower (3-6 weeks)":     {"Crude Protein (%)":"20-22","Energy (kcal/kg)":"3100-3300","Crude Fiber (%)":"3-5","Calcium (%)":"0.85-0.95","Phosphorus (%)":"0.40-0.45","Lysine (%)":"1.05-1.20","Methionine (%)":"0.45-0.50","Feed Intake (g/day)":"80-120"},
-        "Broiler Finisher (6+ weeks)":    {"Crude Protein (%)":"18-20","Energy (kcal/kg)":"3200-3400","Crude Fiber (%)":"3-5","Calcium (%)":"0.80-0.90","Phosphorus (%)":"0.35-0.40","Lysine (%)":"0.95-1.10","Methionine (%)":"0.40-0.45","Feed Intake (g/day)":"140-180"},
-        "Layer Starter (0-6 weeks)":      {"Crude Protein (%)":"18-20","Energy (kcal/kg)":"2800-3000","Crude Fiber (%)":"3-5","Calcium (%)":"0.9-1.0","Phosphorus (%)":"0.45-0.50","Lysine (%)":"0.95-1.05","Methionine (%)":"0.40-0.45","Feed Intake (g/day)":"20-40"},
-        "Layer Grower (6-18 weeks)":      {"Crude Protein (%)":"16-18","Energy (kcal/kg)":"2700-2900","Crude Fiber (%)":"4-6","Calcium (%)":"0.8-0.9","Phosphorus (%)":"0.40-0.45","Lysine (%)":"0.75-0.85","Methionine (%)":"0.35-0.40","Feed Intake (g/day)":"60-90"},
-        "Layer Production (18+ weeks)":   {"Crude Protein (%)":"16-18","Energy (kcal/kg)":"2750-2900","Crude Fiber (%)":"4-6","Calcium (%)":"3.5-4.0","Phosphorus (%)":"0.35-0.40","Lysine (%)":"0.75-0.85","Methionine (%)":"0.38-0.42","Feed Intake (g/day)":"110-130"},
-    }
-    cattle_nutrients = {
-        "Calf Starter (0-3 months)":{"Crude Protein (%)":"18-20","Energy (kcal/kg)":"3000-3200","Crude Fiber (%)":"8-12","Calcium (%)":"0.7-1.0","Phosphorus (%)":"0.4-0.6","TDN (%)":"72-78","Feed Intake (kg/day)":"0.5-1.5"},
-        "Calf Grower (3-6 months)": {"Crude Protein (%)":"16-18","Energy (kcal/kg)":"2800-3000","Crude Fiber (%)":"10-15","Calcium (%)":"0.6-0.9","Phosphorus (%)":"0.35-0.50","TDN (%)":"68-74","Feed Intake (kg/day)":"2-4"},
-        "Heifer (6-12 months)":     {"Crude Protein (%)":"14-16","Energy (kcal/kg)":"2600-2800","Crude Fiber (%)":"12-18","Calcium (%)":"0.5-0.8","Phosphorus (%)":"0.30-0.45","TDN (%)":"65-70","Feed Intake (kg/day)":"4-7"},
-        "Bull (Breeding)":          {"Crude Protein (%)":"12-14","Energy (kcal/kg)":"2500-2700","Crude Fiber (%)":"15-20","Calcium (%)":"0.4-0.7","Phosphorus (%)":"0.25-0.40","TDN (%)":"62-68","Feed Intake (kg/day)":"8-12"},
-        "Cow (Dry)":                {"Crude Protein (%)":"10-12","Energy (kcal/kg)":"2400-2600","Crude Fiber (%)":"18-25","Calcium (%)":"0.4-0.6","Phosphorus (%)":"0.25-0.35","TDN (%)":"58-65","Feed Intake (kg/day)":"10-15"},
-        "Cow (Lactating)":          {"Crude Protein (%)":"14-18","Energy (kcal/kg)":"2700-3000","Crude Fiber (%)":"15-22","Calcium (%)":"0.6-0.9","Phosphorus (%)":"0.35-0.50","TDN (%)":"68-75","Feed Intake (kg/day)":"12-20"},
-        "Beef Finisher":            {"Crude Protein (%)":"12-14","Energy (kcal/kg)":"2800-3100","Crude Fiber (%)":"8-15","Calcium (%)":"0.5-0.7","Phosphorus (%)":"0.30-0.45","TDN (%)":"70-78","Feed Intake (kg/day)":"8-14"},
-    }
-    return {"Rabbit": rabbit_nutrients, "Poultry": poultry_nutrients, "Cattle": cattle_nutrients}
+def show_diagnosis(diagnosis):
+    """Explain an infeasible run: the conflicting targets and the smallest fix."""
+    if diagnosis.screened:
+        st.error("❌ These targets are out of reach of every ingredient in the catalogue:")
+    elif not diagnosis.conflicts.empty:
+        st.error("❌ No feasible solution. These targets conflict — the smallest change that fixes it:")
+    else:
+        st.error("❌ No feasible solution within the ingredient limit.")
+    if not diagnosis.conflicts.empty:
+        st.dataframe(diagnosis.conflicts.round(3), use_container_width=True, hide_index=True)
+        st.caption("Targets with zero relaxation are part of the conflict but cheapest to keep as they are.")
+    for note in diagnosis.notes:
+        st.info(note)
+    if diagnosis.result is not None and diagnosis.result.feasible:
+        st.caption(f"With these changes the least-cost formula is ₦{diagnosis.result.cost_per_kg:.2f}/kg.")
+
+
+def show_solve_debug(stats, cache_hit=False):
+    """Phase timings and model size of one solve, beside p50/p95 over recent solves."""
+    with st.expander("🔧 Solver Debug — timings & model size", expanded=True):
+        if cache_hit:
+            st.caption("Served from cache: the figures below are from the original solve.")
+        st.dataframe(pd.DataFrame({"Field": list(stats), "Value": [str(v) for v in stats.values()]}),
+                     use_container_width=True, hide_index=True)
+        st.caption(f"Latency over the last {len(METRICS)} solves in this app process, by call path:")
+        st.dataframe(METRICS.summary(), use_container_width=True, hide_index=True)
 
 
 # ─────────────────────────────────────────────
@@ -687,6 +716,27 @@ if "formulation_history" not in st.session_state:
 if "dark_mode" not in st.session_state:
     st.session_state.dark_mode = False
 
+def drop_stale_results(versions):
+    """Forget this session's results solved on an older version of a species' catalogue."""
+    seen = st.session_state.get("catalogue_versions", versions)
+    changed = {sp for sp, v in versions.items() if seen.get(sp) != v}
+    st.session_state["catalogue_versions"] = dict(versions)
+    if not changed:
+        return
+    inputs = st.session_state.get("optimization_inputs")
+    if inputs is not None and inputs[0] in changed:
+        for key in ("optimization_result", "total_cost", "total_cp", "total_energy", "optimization_inputs", "price_risk"):
+            st.session_state.pop(key, None)
+    job = st.session_state.get("opt_job")
+    if job is not None and job["animal"] in changed:
+        del st.session_state["opt_job"]
+    for key in ("sweep", "gain_search", "phase_plan", "batch_sheet"):
+        if key in st.session_state and st.session_state[key][0] in changed:
+            del st.session_state[key]
+    st.session_state.pop("mill_plan", None)   # drawn from every catalogue
+
+drop_stale_results(catalogue_versions)
+
 # Inject data-theme attribute for CSS targeting
 _dm = st.session_state.dark_mode
 st.markdown(
@@ -699,7 +749,7 @@ st.markdown(
 #  REPORT GENERATOR
 # ─────────────────────────────────────────────
 def generate_report(animal, age, weight, cp_req, energy_req, feed_intake,
-                    result_df=None, total_cost=None, prediction=None):
+                    result_df=None, total_cost=None, prediction=None, trajectory=None):
     report = (
         "═" * 50 + "\n"
         "          NECSTECH FEED OPTIMIZER REPORT\n"
@@ -712,11 +762,18 @@ def generate_report(animal, age, weight, cp_req, energy_req, feed_intake,
         report += f"Total Cost/kg: ₦{total_cost:.2f}  |  Daily Cost: ₦{total_cost * feed_intake:.2f}\n"
         for _, row in result_df.iterrows():
             report += f"  {row['Ingredient']}: {row['Proportion (%)']:.2f}% (₦{row['Cost Contribution (₦)']:.2f})\n"
-    if prediction is not None:
+    if trajectory is not None:
+        prediction   = trajectory.gain[0, 0]
+        weekly_gain  = (trajectory.weight_at(7)[0] - trajectory.weight[0, 0]) * 1000
+        monthly_gain = (trajectory.weight_at(30)[0] - trajectory.weight[0, 0]) * 1000
+        projected    = trajectory.weight_at(90)[0]
+        fcr = float(np.nan_to_num(trajectory.fcr(90)[0]))
+    elif prediction is not None:
         weekly_gain  = prediction * 7
         monthly_gain = prediction * 30
         projected    = weight + (monthly_gain * 3 / 1000)
         fcr = (feed_intake * 1000) / prediction if prediction > 0 else 0
+    if prediction is not None:
         report += (
             f"Daily Gain: {prediction:.1f} g  |  Weekly: {weekly_gain:.0f} g  |  Monthly: {monthly_gain/1000:.2f} kg\n"
             f"90-Day Weight: {projected:.1f} kg  |  FCR: {fcr:.2f}:1\n"
@@ -977,6 +1034,8 @@ def show_nutrient_guide():
 # ─────────────────────────────────────────────
 def show_formulator():
     render_navbar()
+    get_solve_queue()  # first visit starts the solver workers while the form is filled in
+    get_live_model()   # and the growth model loading in the background
     st.markdown('<div class="page-header"><div class="page-title">🔬 Feed Formulation Centre</div><div class="page-desc">Configure your animal parameters in the sidebar, then use the tabs below to optimise, analyse, and export your custom feed formula.</div></div>', unsafe_allow_html=True)
 
     animal = st.selectbox("🐾 Select Animal Type", ["Rabbit", "Poultry", "Cattle"])
@@ -1025,7 +1084,15 @@ def show_formulator():
     if st.sidebar.button("🐾 Breed Database", use_container_width=True):
         st.session_state.page = "breed_database"; st.rerun()
 
-    tab1, tab2, tab3, tab4 = st.tabs(["🔬 Feed Optimizer","📋 Ingredient Database","📈 Growth Prediction","📊 Cost Dashboard"])
+    def current_diet():
+        """CP and energy the growth model sees: this animal's optimised formula, else the catalogue average."""
+        inputs = st.session_state.get("optimization_inputs")
+        if inputs is not None and inputs[0] == animal and "total_cp" in st.session_state:
+            return st.session_state["total_cp"], st.session_state["total_energy"], "formula"
+        return (sanitize_numeric(df["CP"].mean(), 0, 100, 18), sanitize_numeric(df["Energy"].mean(), 0, 10000, 2800),
+                "catalogue")
+
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["🔬 Feed Optimizer","📋 Ingredient Database","📈 Growth Prediction","📊 Cost Dashboard","🏭 Mill Planner"])
 
     # ── TAB 1: OPTIMIZER ─────────────────────
     with tab1:
@@ -1059,13 +1126,6 @@ def show_formulator():
                 st.markdown(f'<div class="nutrient-chip"><div class="nutrient-chip-label">{short_k}</div><div class="nutrient-chip-value">{v}</div></div>', unsafe_allow_html=True)
         st.markdown('</div>', unsafe_allow_html=True)
 
-        def parse_mid(val_str):
-            try:
-                parts = str(val_str).split("-")
-                return round((float(parts[0]) + float(parts[-1])) / 2, 1)
-            except Exception:
-                return 0.0
-
         st.markdown('<div class="nutrient-panel" style="margin-top:.75rem;">', unsafe_allow_html=True)
         st.markdown('<div class="nutrient-panel-title">🧪 Step 2 — Set Nutrient Targets</div>', unsafe_allow_html=True)
         st.caption("Auto-filled from the selected stage. Adjust freely before running the optimiser.")
@@ -1092,7 +1152,7 @@ def show_formulator():
                 0.01, 30.0, 0.5)
         st.session_state["feed_intake_val"] = intake_inp
 
-        n_col4, n_col5, _ = st.columns(3)
+        n_col4, n_col5, n_col6 = st.columns(3)
         with n_col4:
             use_fiber = st.checkbox("📏 Set Fiber Targets", key="ni_use_fiber")
             if use_fiber:
@@ -1104,15 +1164,62 @@ def show_formulator():
                     0.0, 40.0, fiber_default + 4)
             else:
                 min_fiber, max_fiber = 0.0, 40.0
+            use_ranges = st.checkbox("🧬 Enforce stage mineral & amino-acid ranges", value=True, key="ni_use_ranges")
+            if use_ranges:
+                st.caption("Calcium, phosphorus, lysine, methionine and TDN held within the stage ranges above; "
+                           "CP and energy capped at the top of theirs.")
+            use_rules = st.checkbox("⚖️ Apply ingredient inclusion limits & ratios", value=True, key="ni_use_rules")
+            stage_limits = stage_rules(rules_df, animal, selected_stage) if use_rules else None
+            if stage_limits is not None:
+                with st.expander(f"{len(stage_limits.names)} limits for this stage (inclusion_rules.csv)"):
+                    st.dataframe(stage_limits.to_frame(), use_container_width=True, hide_index=True)
         with n_col5:
             limit_ingredients = st.checkbox("🔢 Limit Ingredient Count", key="ni_limit")
             max_ingredients   = st.slider("Max ingredients", 3, 15, 8, key="ni_max_ingr") if limit_ingredients else 15
+            min_inclusion_pct = sanitize_numeric(
+                st.number_input("Min inclusion per ingredient (%)", 0.0, 10.0, 1.0, 0.5, key="ni_min_incl"),
+                0.0, 10.0, 1.0) if limit_ingredients else 0.0
+        with n_col6:
+            if limit_ingredients:
+                mip_time_limit = sanitize_numeric(
+                    st.slider("Solver time limit (s)", 1, 60, int(MIP_CONFIG["time_limit"]), key="ni_time_limit"),
+                    1.0, 60.0, MIP_CONFIG["time_limit"])
+                mip_gap_pct = sanitize_numeric(
+                    st.number_input("Max optimality gap (%)", 0.0, 10.0, MIP_CONFIG["mip_gap"] * 100, 0.5, key="ni_mip_gap"),
+                    0.0, 10.0, MIP_CONFIG["mip_gap"] * 100)
+                st.caption("Exact ingredient cap — solved as a mixed-integer programme within these budgets.")
+            else:
+                mip_time_limit, mip_gap_pct = MIP_CONFIG["time_limit"], MIP_CONFIG["mip_gap"] * 100
+
+        r_col1, r_col2 = st.columns([1, 2])
+        with r_col1:
+            use_robust = st.checkbox("🛡️ Robust to ingredient variability", key="ni_robust")
+        with r_col2:
+            if use_robust:
+                robust_conf = sanitize_numeric(
+                    st.slider("Confidence each minimum is met (%)", 50, 99, int(ROBUST_CONFIG["confidence"] * 100),
+                              key="ni_robust_conf"), 50.0, 99.0, ROBUST_CONFIG["confidence"] * 100) / 100
+                st.caption("Uses the batch-to-batch spread in ingredient_variability.csv, so formulas sized "
+                           "exactly at a target no longer fall short about half the time.")
+            else:
+                robust_conf = None
         st.markdown('</div>', unsafe_allow_html=True)
         st.markdown("<br>", unsafe_allow_html=True)
 
-        run_col, _ = st.columns([1, 2])
+        def current_targets():
+            """Targets as set on this tab, shared by the optimiser, the sweep and the batch sheet."""
+            targets = stage_range_targets(stage_data, cp_req_inp, energy_inp) if use_ranges \
+                else NutrientTargets(minimum={"CP": cp_req_inp, "Energy": energy_inp})
+            if use_fiber and "Fiber" in df.columns:
+                targets.minimum["Fiber"], targets.maximum["Fiber"] = min_fiber, max_fiber
+            targets.rules = stage_limits
+            return targets
+
+        run_col, debug_col = st.columns([1, 2])
         with run_col:
             run_btn = st.button("🚀 Optimise Feed Formula", type="primary", use_container_width=True, key="run_opt")
+        with debug_col:
+            show_debug = st.checkbox("🔧 Show solver debug panel", key="ni_debug")
 
         if run_btn:
             # ── RATE LIMIT CHECK ──
@@ -1120,100 +1227,407 @@ def show_formulator():
             if not allowed:
                 st.warning(msg)
             else:
-                with st.spinner("Calculating optimal feed mix…"):
-                    try:
-                        prob        = LpProblem("FeedMix", LpMinimize)
-                        ingredients = df["Ingredient"].tolist()
-                        vars_       = LpVariable.dicts("Ingr", ingredients, lowBound=0, upBound=1)
-                        prob += lpSum(vars_[i] * df[df["Ingredient"]==i]["Cost"].values[0] for i in ingredients)
-                        prob += lpSum(vars_[i] for i in ingredients) == 1
-                        prob += lpSum(vars_[i] * df[df["Ingredient"]==i]["CP"].values[0] for i in ingredients) >= cp_req_inp
-                        prob += lpSum(vars_[i] * df[df["Ingredient"]==i]["Energy"].values[0] for i in ingredients) >= energy_inp
-                        if use_fiber and "Fiber" in df.columns:
-                            prob += lpSum(vars_[i] * df[df["Ingredient"]==i]["Fiber"].values[0] for i in ingredients) >= min_fiber
-                            prob += lpSum(vars_[i] * df[df["Ingredient"]==i]["Fiber"].values[0] for i in ingredients) <= max_fiber
-                        prob.solve()
-
-                        if LpStatus[prob.status] == "Optimal":
-                            result = {i: vars_[i].value() for i in ingredients if vars_[i].value() > 0.001}
-                            if limit_ingredients and len(result) > max_ingredients:
-                                st.warning(f"⚠️ Solution uses {len(result)} ingredients (limit: {max_ingredients}).")
-                            result_df_out = pd.DataFrame(result.items(), columns=["Ingredient","Proportion"])
-                            result_df_out["Proportion (%)"]       = (result_df_out["Proportion"] * 100).round(2)
-                            result_df_out["Cost/kg (₦)"]          = result_df_out["Ingredient"].apply(lambda x: df[df["Ingredient"]==x]["Cost"].values[0])
-                            result_df_out["Cost Contribution (₦)"] = (result_df_out["Proportion"] * result_df_out["Cost/kg (₦)"]).round(2)
-                            result_df_out["CP Contribution"]      = result_df_out["Ingredient"].apply(lambda x: df[df["Ingredient"]==x]["CP"].values[0]) * result_df_out["Proportion"]
-                            result_df_out["Energy Contribution"]  = result_df_out["Ingredient"].apply(lambda x: df[df["Ingredient"]==x]["Energy"].values[0]) * result_df_out["Proportion"]
-                            total_cp     = result_df_out["CP Contribution"].sum()
-                            total_energy = result_df_out["Energy Contribution"].sum()
-                            result_df_out = result_df_out.sort_values("Proportion", ascending=False)
-                            total_cost   = value(prob.objective)
-
-                            st.session_state["optimization_result"] = result_df_out
-                            st.session_state["total_cost"]          = total_cost
-                            st.session_state["total_cp"]            = total_cp
-                            st.session_state["total_energy"]        = total_energy
-                            st.session_state.formulation_history.append({
-                                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M"),
-                                "animal": animal, "age": age, "weight": weight,
-                                "cp_req": cp_req_inp, "energy_req": energy_inp, "total_cost": total_cost,
-                            })
-
-                            col1, col2, col3, col4 = st.columns(4)
-                            with col1: st.metric("💰 Feed Cost/kg",   f"₦{total_cost:.2f}")
-                            with col2: st.metric("📅 Daily Feed Cost", f"₦{total_cost * intake_inp:.2f}")
-                            with col3: st.metric("📦 Ingredients Used", len(result))
-                            with col4: st.metric("📆 Monthly Cost",   f"₦{total_cost * intake_inp * 30:.2f}")
-                            st.markdown("---")
-                            st.subheader("✅ Nutritional Achievement")
-                            col1, col2 = st.columns(2)
-                            with col1:
-                                cp_pct = (total_cp / cp_req_inp * 100) if cp_req_inp > 0 else 0
-                                st.metric("Crude Protein", f"{total_cp:.2f}%", delta=f"{cp_pct:.1f}% of requirement")
-                            with col2:
-                                energy_pct = (total_energy / energy_inp * 100) if energy_inp > 0 else 0
-                                st.metric("Energy", f"{total_energy:.0f} kcal/kg", delta=f"{energy_pct:.1f}% of requirement")
-                            st.success(f"✅ Optimisation complete! Total cost: ₦{total_cost:.2f}/kg")
-                            st.dataframe(result_df_out[["Ingredient","Proportion (%)","Cost/kg (₦)","Cost Contribution (₦)"]],
+                try:
+                    matrix  = IngredientMatrix.from_frame(df, composition=composition_df)
+                    targets = current_targets()
+                    mip_options = dict(max_ingredients=max_ingredients, min_inclusion=min_inclusion_pct / 100,
+                                       time_limit=mip_time_limit, mip_gap=mip_gap_pct / 100) if limit_ingredients else {}
+                    if not bound_check(matrix, targets).empty:
+                        # Impossible on its own: no need to spend a solve on it
+                        show_diagnosis(diagnose(matrix, targets))
+                    else:
+                        robust = dict(sd=nutrient_sd(matrix, variability_df), confidence=robust_conf) if use_robust else {}
+                        job_id = get_solve_queue().submit(matrix, targets, species=animal,
+                                                          solve=formulate_robust if use_robust else formulate,
+                                                          **robust, **mip_options)
+                        st.session_state["opt_job"] = {"id": job_id, "animal": animal, "matrix": matrix,
+                                                       "targets": targets, "options": mip_options, "robust": robust,
+                                                       "cp": cp_req_inp, "energy": energy_inp}
+                        # Most solves finish well within this; slower ones move to the progress panel
+                        with st.spinner("Calculating optimal feed mix…"):
+                            get_solve_queue().wait(job_id, timeout=2.0)
+                except QueueFull as e:
+                    st.warning(f"⏳ The optimiser is busy: {e}")
+                except Exception as e:
+                    st.error(f"❌ Error during optimisation: {str(e)}")
+
+        opt_job = st.session_state.get("opt_job")
+        if opt_job is not None and opt_job["animal"] == animal:
+            try:
+                job_state = get_solve_queue().status(opt_job["id"])["state"]
+            except KeyError:
+                job_state = None
+                del st.session_state["opt_job"]
+            if job_state in ACTIVE_STATES:
+                show_solve_progress(opt_job["id"])
+            elif job_state is not None:
+                # Collected once, like a button press: the results show on this run only
+                del st.session_state["opt_job"]
+                matrix, targets = opt_job["matrix"], opt_job["targets"]
+                job_cp, job_energy = opt_job["cp"], opt_job["energy"]
+                try:
+                    formulation, cache_hit = get_solve_queue().result(opt_job["id"])
+
+                    if formulation.feasible:
+                        result_df_out = formulation.to_frame()
+                        total_cp     = formulation.nutrient_levels["CP"]
+                        total_energy = formulation.nutrient_levels["Energy"]
+                        total_cost   = formulation.cost_per_kg
+
+                        st.session_state["optimization_result"] = result_df_out
+                        st.session_state["total_cost"]          = total_cost
+                        st.session_state["total_cp"]            = total_cp
+                        st.session_state["total_energy"]        = total_energy
+                        st.session_state["optimization_inputs"] = (animal, matrix, targets)
+                        st.session_state.formulation_history.append({
+                            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M"),
+                            "animal": animal, "age": age, "weight": weight,
+                            "cp_req": job_cp, "energy_req": job_energy, "total_cost": total_cost,
+                        })
+
+                        col1, col2, col3, col4 = st.columns(4)
+                        with col1: st.metric("💰 Feed Cost/kg",   f"₦{total_cost:.2f}")
+                        with col2: st.metric("📅 Daily Feed Cost", f"₦{total_cost * intake_inp:.2f}")
+                        with col3: st.metric("📦 Ingredients Used", len(result_df_out))
+                        with col4: st.metric("📆 Monthly Cost",   f"₦{total_cost * intake_inp * 30:.2f}")
+                        if not formulation.optimal:
+                            st.warning(f"⏱️ The time limit ran out before this formula was proven optimal: it is the best "
+                                       f"found, within {formulation.stats.get('mip_gap', float('nan')) * 100:.2f}% of the "
+                                       "optimum. Raise the time limit to close the gap.")
+                        if "mip_gap" in formulation.stats:
+                            col1, col2, _ = st.columns([1, 1, 2])
+                            with col1: st.metric("🎯 Optimality Gap", f"{formulation.stats['mip_gap'] * 100:.2f}%")
+                            with col2: st.metric("⏱️ Solve Time",     f"{formulation.stats['solve_time']:.2f} s")
+                        st.markdown("---")
+                        st.subheader("✅ Nutritional Achievement")
+                        col1, col2 = st.columns(2)
+                        with col1:
+                            cp_pct = (total_cp / job_cp * 100) if job_cp > 0 else 0
+                            st.metric("Crude Protein", f"{total_cp:.2f}%", delta=f"{cp_pct:.1f}% of requirement")
+                        with col2:
+                            energy_pct = (total_energy / job_energy * 100) if job_energy > 0 else 0
+                            st.metric("Energy", f"{total_energy:.0f} kcal/kg", delta=f"{energy_pct:.1f}% of requirement")
+                        if opt_job["robust"]:
+                            st.caption(f"🛡️ Every minimum holds with at least {opt_job['robust']['confidence']:.0%} "
+                                       "probability given ingredient variability; maximums hold on average.")
+                            st.dataframe(delivery_profile(formulation, targets, **opt_job["robust"]),
                                          use_container_width=True, hide_index=True)
-                            col1, col2 = st.columns(2)
-                            with col1:
-                                fig_pie = px.pie(result_df_out, values="Proportion (%)", names="Ingredient",
-                                                 title="Feed Composition", color_discrete_sequence=px.colors.sequential.Greens)
-                                fig_pie.update_layout(template="plotly_white")
-                                st.plotly_chart(fig_pie, use_container_width=True)
-                            with col2:
-                                fig_bar = px.bar(result_df_out, x="Ingredient", y="Cost Contribution (₦)",
-                                                 title="Cost Breakdown by Ingredient",
-                                                 color="Cost Contribution (₦)", color_continuous_scale="Greens")
-                                fig_bar.update_layout(xaxis_tickangle=-45, template="plotly_white")
-                                st.plotly_chart(fig_bar, use_container_width=True)
-                            col1, col2 = st.columns(2)
-                            with col1:
-                                csv_out = result_df_out.to_csv(index=False)
-                                st.download_button("📥 Download Formula (CSV)", csv_out,
-                                                   f"{animal}_feed_formula_{datetime.now().strftime('%Y%m%d')}.csv",
-                                                   "text/csv", use_container_width=True)
-                            with col2:
-                                # Rate-limit report download generation
-                                allowed_r, msg_r = check_rate_limit("report")
-                                if allowed_r:
-                                    report = generate_report(animal, age, weight, cp_req_inp, energy_inp,
-                                                             intake_inp, result_df_out, total_cost)
-                                    st.download_button("📄 Download Report (TXT)", report,
-                                                       f"{animal}_feed_report_{datetime.now().strftime('%Y%m%d')}.txt",
-                                                       "text/plain", use_container_width=True)
-                                else:
-                                    st.warning(msg_r)
                         else:
-                            st.error("❌ No feasible solution found. Try relaxing your nutrient targets or constraints.")
-                    except Exception as e:
-                        st.error(f"❌ Error during optimisation: {str(e)}")
+                            st.dataframe(formulation.nutrient_profile(targets), use_container_width=True, hide_index=True)
+                        st.success(f"✅ Optimisation complete! Total cost: ₦{total_cost:.2f}/kg"
+                                   + (" (served from cache)" if cache_hit else ""))
+                        st.dataframe(result_df_out[["Ingredient","Proportion (%)","Cost/kg (₦)","Cost Contribution (₦)"]],
+                                     use_container_width=True, hide_index=True)
+                        if formulation.sensitivity is not None:
+                            with st.expander("📐 Sensitivity Analysis — shadow prices & price ranges"):
+                                st.caption("Read from this same solve — no extra optimisation runs. "
+                                           "Shadow price: change in ₦/kg of feed per extra unit of a target, valid over the range shown. "
+                                           "Entry price: price at which an unused ingredient would join the mix.")
+                                st.dataframe(formulation.constraint_sensitivity(), use_container_width=True, hide_index=True)
+                                st.dataframe(formulation.ingredient_sensitivity(), use_container_width=True, hide_index=True)
+                        col1, col2 = st.columns(2)
+                        with col1:
+                            fig_pie = px.pie(result_df_out, values="Proportion (%)", names="Ingredient",
+                                             title="Feed Composition", color_discrete_sequence=px.colors.sequential.Greens)
+                            fig_pie.update_layout(template="plotly_white")
+                            st.plotly_chart(fig_pie, use_container_width=True)
+                        with col2:
+                            fig_bar = px.bar(result_df_out, x="Ingredient", y="Cost Contribution (₦)",
+                                             title="Cost Breakdown by Ingredient",
+                                             color="Cost Contribution (₦)", color_continuous_scale="Greens")
+                            fig_bar.update_layout(xaxis_tickangle=-45, template="plotly_white")
+                            st.plotly_chart(fig_bar, use_container_width=True)
+                        col1, col2 = st.columns(2)
+                        with col1:
+                            csv_out = result_df_out.to_csv(index=False)
+                            st.download_button("📥 Download Formula (CSV)", csv_out,
+                                               f"{animal}_feed_formula_{datetime.now().strftime('%Y%m%d')}.csv",
+                                               "text/csv", use_container_width=True)
+                        with col2:
+                            # Rate-limit report download generation
+                            allowed_r, msg_r = check_rate_limit("report")
+                            if allowed_r:
+                                report = generate_report(animal, age, weight, job_cp, job_energy,
+                                                         intake_inp, result_df_out, total_cost)
+                                st.download_button("📄 Download Report (TXT)", report,
+                                                   f"{animal}_feed_report_{datetime.now().strftime('%Y%m%d')}.txt",
+                                                   "text/plain", use_container_width=True)
+                            else:
+                                st.warning(msg_r)
+                    elif formulation.status == "Not Solved":
+                        st.error("❌ The solver time limit ran out before any formula was found. Raise the time limit or the ingredient cap.")
+                    else:
+                        diagnosis = diagnose(matrix, targets, **opt_job["options"])
+                        if opt_job["robust"] and diagnosis.feasible:
+                            st.error(f"❌ These targets can be met on average, but not with "
+                                     f"{opt_job['robust']['confidence']:.0%} confidence. "
+                                     "Lower the confidence level or widen the target ranges.")
+                        else:
+                            show_diagnosis(diagnosis)
+                    if show_debug:
+                        show_solve_debug(formulation.stats, cache_hit)
+                except CancelledError:
+                    st.info("✖ Optimisation cancelled.")
+                except Exception as e:
+                    st.error(f"❌ Error during optimisation: {str(e)}")
+
+        with st.expander("📈 Cost Frontier Sweep — how cost/kg moves with the targets"):
+            st.caption("Solves a whole grid of targets in one run (other targets as set above). "
+                       "Breakpoints mark where the set of ingredients in the mix changes.")
+            sweep_mode = st.radio("Sweep", ["Crude Protein", "Energy", "Crude Protein × Energy"],
+                                  horizontal=True, key="sweep_mode")
+            sw_col1, sw_col2 = st.columns(2)
+            with sw_col1:
+                cp_lo, cp_hi = st.slider("CP range (%)", 8.0, 35.0, (14.0, 24.0), 0.5, key="sweep_cp")
+            with sw_col2:
+                en_lo, en_hi = st.slider("Energy range (kcal/kg)", 1500, 4500, (2500, 3300), 50, key="sweep_en")
+            sweep_steps = sanitize_int(st.slider("Grid points per axis", 5, 41, 21, key="sweep_steps"), 5, 41, 21)
+            if st.button("📈 Run Sweep", key="run_sweep"):
+                allowed_sw, msg_sw = check_rate_limit("optimize")
+                if not allowed_sw:
+                    st.warning(msg_sw)
+                else:
+                    base = current_targets()
+                    axes = {}
+                    if sweep_mode != "Energy":
+                        axes["CP"] = np.linspace(sanitize_numeric(cp_lo, 8, 35, 14), sanitize_numeric(cp_hi, 8, 35, 24), sweep_steps)
+                    if sweep_mode != "Crude Protein":
+                        axes["Energy"] = np.linspace(sanitize_numeric(en_lo, 1500, 4500, 2500), sanitize_numeric(en_hi, 1500, 4500, 3300), sweep_steps)
+                    with st.spinner(f"Solving {sweep_steps ** len(axes):,} grid points…"):
+                        st.session_state["sweep"] = (animal, sweep_targets(IngredientMatrix.from_frame(df, composition=composition_df), base, axes))
+            if "sweep" in st.session_state and st.session_state["sweep"][0] == animal:
+                sweep_df = st.session_state["sweep"][1]
+                axis_cols = [c for c in ("CP", "Energy") if c in sweep_df.columns]
+                if len(axis_cols) == 1:
+                    x_col = axis_cols[0]
+                    fig = go.Figure()
+                    fig.add_trace(go.Scatter(x=sweep_df[x_col], y=sweep_df["Cost/kg (₦)"], mode="lines+markers",
+                                             name="Least cost", line=dict(color="#208550", width=3),
+                                             customdata=sweep_df["Mix"], hovertemplate="%{x}: ₦%{y:.2f}<br>%{customdata}"))
+                    bp = sweep_df[sweep_df["Breakpoint"]]
+                    fig.add_trace(go.Scatter(x=bp[x_col], y=bp["Cost/kg (₦)"], mode="markers", name="Mix changes",
+                                             marker=dict(size=12, color="#dc2626", symbol="diamond")))
+                    fig.update_layout(xaxis_title=x_col, yaxis_title="Cost/kg (₦)", template="plotly_white")
+                else:
+                    grid = sweep_df.pivot(index="CP", columns="Energy", values="Cost/kg (₦)")
+                    fig = go.Figure(go.Heatmap(z=grid.values, x=grid.columns, y=grid.index,
+                                               colorscale="Greens", colorbar=dict(title="₦/kg")))
+                    bp = sweep_df[sweep_df["Breakpoint"]]
+                    fig.add_trace(go.Scatter(x=bp["Energy"], y=bp["CP"], mode="markers", name="Mix changes",
+                                             marker=dict(size=7, color="#dc2626", symbol="x")))
+                    fig.update_layout(xaxis_title="Energy (kcal/kg)", yaxis_title="CP (%)", template="plotly_white")
+                st.plotly_chart(fig, use_container_width=True)
+                st.dataframe(sweep_df[sweep_df["Breakpoint"] | (sweep_df["Status"] != "Optimal")],
+                             use_container_width=True, hide_index=True)
+
+        with st.expander("🎯 Cost per kg Gain — let the growth model choose CP & energy"):
+            st.caption("The cheapest feed per kg is not always the cheapest per kg of gain. This searches CP × energy "
+                       "levels (other targets and limits as set above): each level is solved for its least-cost formula, "
+                       "then growth on that formula is predicted for the animal in the sidebar. The ingredient cap and "
+                       "robustness options are not applied here.")
+            g_col1, g_col2, g_col3 = st.columns(3)
+            with g_col1:
+                g_cp_lo, g_cp_hi = st.slider("CP range (%)", 8.0, 35.0,
+                                             (max(8.0, cp_req_inp - 2), min(35.0, cp_req_inp + 4)), 0.5, key="gain_cp")
+            with g_col2:
+                g_en_lo, g_en_hi = st.slider("Energy range (kcal/kg)", 1500, 4500,
+                                             (int(max(1500, energy_inp - 150)), int(min(4500, energy_inp + 300))), 50,
+                                             key="gain_en")
+            with g_col3:
+                gain_days = sanitize_int(st.slider("Horizon (days)", 14, 180, GROWTH_SEARCH_CONFIG["days"], key="gain_days"),
+                                         14, 180, GROWTH_SEARCH_CONFIG["days"])
+            if st.button("🎯 Find Lowest Cost per kg Gain", key="run_gain_opt"):
+                allowed_g, msg_g = check_rate_limit("optimize")
+                if not allowed_g:
+                    st.warning(msg_g)
+                else:
+                    matrix = IngredientMatrix.from_frame(df, composition=composition_df)
+                    base = current_targets()
+                    with st.spinner("Solving candidate formulas and simulating growth on each…"):
+                        search = optimize_cost_per_gain(
+                            get_growth_model(), matrix, base,
+                            dict(age_weeks=age, weight=weight, cp_req=cp_req, energy_req=energy_req, feed_intake=feed_intake),
+                            cp_range=(sanitize_numeric(g_cp_lo, 8, 35, 14), sanitize_numeric(g_cp_hi, 8, 35, 24)),
+                            energy_range=(sanitize_numeric(g_en_lo, 1500, 4500, 2500), sanitize_numeric(g_en_hi, 1500, 4500, 3300)),
+                            days=gain_days, processes=os.cpu_count())
+                    st.session_state["gain_search"] = (animal, search, gain_days)
+                    if search.optimal:
+                        # The winner becomes the current formula, so the growth and cost tabs use it
+                        best = search.best
+                        st.session_state["optimization_result"] = best.to_frame()
+                        st.session_state["total_cost"]          = best.cost_per_kg
+                        st.session_state["total_cp"]            = best.nutrient_levels["CP"]
+                        st.session_state["total_energy"]        = best.nutrient_levels["Energy"]
+                        st.session_state["optimization_inputs"] = (animal, matrix, search.targets)
+            if "gain_search" in st.session_state and st.session_state["gain_search"][0] == animal:
+                _, search, gain_days = st.session_state["gain_search"]
+                if not search.optimal:
+                    st.error("❌ No feasible formula in this CP × energy range. Widen the ranges or relax the targets above.")
+                else:
+                    top, base_row = search.summary, search.baseline
+                    has_base = np.isfinite(base_row["Cost per kg Gain (₦)"])
+                    col1, col2, col3, col4 = st.columns(4)
+                    with col1: st.metric("Cost per kg Gain", f"₦{top['Cost per kg Gain (₦)']:,.2f}",
+                                         delta=f"₦{top['Cost per kg Gain (₦)'] - base_row['Cost per kg Gain (₦)']:+,.2f} vs least-cost"
+                                         if has_base else None, delta_color="inverse")
+                    with col2: st.metric("Feed Cost/kg", f"₦{top['Feed Cost/kg (₦)']:.2f}",
+                                         delta=f"₦{top['Feed Cost/kg (₦)'] - base_row['Feed Cost/kg (₦)']:+.2f}"
+                                         if has_base else None, delta_color="inverse")
+                    with col3: st.metric("Diet CP / Energy", f"{top['Diet CP (%)']:.1f}% · {top['Diet Energy (kcal/kg)']:.0f}")
+                    with col4: st.metric(f"FCR over {gain_days} days", f"{top['FCR']:.2f}:1",
+                                         delta=f"{top['FCR'] - base_row['FCR']:+.2f}" if has_base else None,
+                                         delta_color="inverse")
+                    st.caption(f"{len(search.candidates)} candidate formulas evaluated. This formula is now the current "
+                               "formula for the Growth Prediction and Cost Dashboard tabs.")
+                    scored = search.candidates.dropna(subset=["Cost per kg Gain (₦)"])
+                    fig = go.Figure(go.Scatter(x=scored["Diet Energy (kcal/kg)"], y=scored["Diet CP (%)"], mode="markers",
+                                               marker=dict(color=scored["Cost per kg Gain (₦)"], colorscale="Greens_r",
+                                                           size=8, colorbar=dict(title="₦/kg gain")),
+                                               hovertemplate="CP %{y:.2f}% · %{x:.0f} kcal: ₦%{marker.color:,.2f}/kg gain"))
+                    fig.add_trace(go.Scatter(x=[top["Diet Energy (kcal/kg)"]], y=[top["Diet CP (%)"]], mode="markers",
+                                             name="Best", marker=dict(size=16, color="#dc2626", symbol="star")))
+                    fig.update_layout(xaxis_title="Diet energy (kcal/kg)", yaxis_title="Diet CP (%)", showlegend=False,
+                                      template="plotly_white")
+                    st.plotly_chart(fig, use_container_width=True)
+                    st.dataframe(search.best.to_frame()[["Ingredient", "Proportion (%)", "Cost/kg (₦)", "Cost Contribution (₦)"]],
+                                 use_container_width=True, hide_index=True)
+                    if st.toggle("Show all candidates", key="gain_all"):
+                        st.dataframe(search.candidates.round(3), use_container_width=True, hide_index=True)
+
+        with st.expander("🗓️ Phase-Feeding Programme — which formula each stage, and for how long"):
+            st.caption("Plans the whole programme to market weight for the animal in the sidebar: each stage gets a lean, "
+                       "standard and dense least-cost formula (bottom, middle and top of its CP and energy ranges), and "
+                       "every combination of formulas and stage lengths is simulated with the growth model. The cheapest "
+                       "programme is the lowest total feed cost per animal, not the cheapest feed per stage.")
+            ph_col1, ph_col2 = st.columns(2)
+            with ph_col1:
+                program = st.selectbox("Programme", list(PROGRAMS[animal]), key="phase_program")
+            with ph_col2:
+                default_market = PHASE_CONFIG["market_weight"][animal]
+                market_weight = sanitize_numeric(
+                    st.number_input("Market weight (kg)", 0.5, 1000.0, default_market, 0.1, key=f"phase_market_{animal}"),
+                    0.5, 1000.0, default_market)
+            program_stages = PROGRAMS[animal][program]
+            st.caption(" → ".join(program_stages) + f" · starting at {age} weeks and {weight:g} kg")
+            if st.button("🗓️ Plan Cheapest Programme", key="run_phase_plan"):
+                allowed_p, msg_p = check_rate_limit("optimize")
+                if not allowed_p:
+                    st.warning(msg_p)
+                elif market_weight <= weight:
+                    st.warning("⚠️ Market weight must be above the starting body weight in the sidebar.")
+                else:
+                    with st.spinner("Solving stage formulas and simulating every programme…"):
+                        plan = plan_phases(get_growth_model(), IngredientMatrix.from_frame(df, composition=composition_df),
+                                           animal, program_stages, age, weight, market_weight,
+                                           rules=rules_df if use_rules else None, cache=get_formulation_cache())
+                    st.session_state["phase_plan"] = (animal, plan)
+            if "phase_plan" in st.session_state and st.session_state["phase_plan"][0] == animal:
+                _, plan = st.session_state["phase_plan"]
+                if not plan.feasible:
+                    st.error(f"❌ No programme reaches {plan.market_weight:g} kg within "
+                             f"{PHASE_CONFIG['horizon'][animal]} days, or a stage has no feasible formula.")
+                else:
+                    best, nominal = plan.best, plan.nominal()
+                    has_nominal = nominal is not None and np.isfinite(nominal["Feed Cost to Market (₦)"])
+                    col1, col2, col3, col4 = st.columns(4)
+                    with col1: st.metric("Feed Cost to Market", f"₦{best['Feed Cost to Market (₦)']:,.0f}",
+                                         delta=f"₦{best['Feed Cost to Market (₦)'] - nominal['Feed Cost to Market (₦)']:+,.0f} "
+                                               "vs standard programme" if has_nominal else None, delta_color="inverse")
+                    with col2: st.metric("Days to Market", f"{best['Days to Market']:.0f}",
+                                         delta=f"{best['Days to Market'] - nominal['Days to Market']:+.0f}"
+                                         if has_nominal else None, delta_color="inverse")
+                    with col3: st.metric("Feed to Market", f"{best['Feed to Market (kg)']:,.1f} kg")
+                    with col4: st.metric("Cost per kg Gain", f"₦{best['Cost per kg Gain (₦)']:,.2f}")
+                    st.caption(f"{len(plan.schedules)} distinct programmes evaluated. The standard programme feeds the "
+                               "middle formula for each stage's nominal length.")
+                    programme, trajectory = plan.programme(get_growth_model())
+                    st.dataframe(programme.round(2), use_container_width=True, hide_index=True)
+                    fig = go.Figure(go.Scatter(x=trajectory.days, y=trajectory.weight[0], mode="lines", name="Body weight",
+                                               line=dict(color="#16a34a", width=3)))
+                    for _, row in programme.iloc[1:].iterrows():
+                        fig.add_vline(x=row["Start Day"], line_dash="dot", line_color="#94a3b8",
+                                      annotation_text=row["Phase"], annotation_position="top left")
+                    fig.add_hline(y=plan.market_weight, line_dash="dash", line_color="#dc2626",
+                                  annotation_text="Market weight")
+                    fig.update_layout(xaxis_title="Day", yaxis_title="Body weight (kg)", template="plotly_white",
+                                      showlegend=False)
+                    st.plotly_chart(fig, use_container_width=True)
+                    ph_stage = st.selectbox("Show formula for", programme["Phase"], key="phase_show")
+                    ph_level = programme.set_index("Phase").loc[ph_stage, "Formula"]
+                    st.dataframe(plan.formula(ph_stage, ph_level).to_frame()[
+                                     ["Ingredient", "Proportion (%)", "Cost/kg (₦)", "Cost Contribution (₦)"]],
+                                 use_container_width=True, hide_index=True)
+                    if st.toggle("Show all programmes", key="phase_all"):
+                        st.dataframe(plan.schedules.round(2), use_container_width=True, hide_index=True)
+
+        with st.expander("🧺 Mixer Batch Sheet — whole bags and kilograms for one mix"):
+            st.caption("Solves for exact bag counts and weigh-outs that still meet every target above, "
+                       "instead of rounding the percentages by hand.")
+            mx_col1, mx_col2, mx_col3 = st.columns(3)
+            with mx_col1:
+                mixer_kg = sanitize_numeric(
+                    st.number_input("Mixer capacity (kg)", 50.0, 10_000.0, MIXER_CONFIG["capacity"], 50.0, key="mix_capacity"),
+                    50.0, 10_000.0, MIXER_CONFIG["capacity"])
+            with mx_col2:
+                mix_bag_kg = sanitize_numeric(
+                    st.number_input("Bag size (kg)", 1.0, 100.0, MIXER_CONFIG["bag_kg"], 5.0, key="mix_bag"),
+                    1.0, 100.0, MIXER_CONFIG["bag_kg"])
+            with mx_col3:
+                mix_time_limit = sanitize_numeric(st.slider("Solver time limit (s)", 1, 30, 5, key="mix_time_limit"), 1, 30, 5)
+            pack_overrides = {}
+            if st.toggle("Set pack sizes per ingredient", key="mix_custom_packs"):
+                st.caption("Blank = automatic (whole bags for ingredients used at a bag or more, weighed for the rest); "
+                           f"{MIXER_CONFIG['weigh_kg']:g} kg = weigh on the scale; 0 = leave out.")
+                packs_in = st.data_editor(pd.DataFrame({"Ingredient": df["Ingredient"], "Pack (kg)": np.nan}),
+                                          key="mix_packs", hide_index=True, disabled=["Ingredient"],
+                                          use_container_width=True)
+                pack_overrides = {str(r["Ingredient"]): sanitize_numeric(r["Pack (kg)"], 0.0, 1000.0, 0.0)
+                                  for _, r in packs_in.dropna().iterrows()}
+            if st.button("🧺 Build Batch Sheet", key="run_batch_sheet"):
+                allowed_b, msg_b = check_rate_limit("optimize")
+                if not allowed_b:
+                    st.warning(msg_b)
+                else:
+                    mix_targets = current_targets()
+                    with st.spinner(f"Fitting a {mixer_kg:,.0f} kg batch…"):
+                        sheet = batch_sheet(IngredientMatrix.from_frame(df, composition=composition_df), mix_targets,
+                                            mixer_kg, pack_overrides or None, bag_kg=mix_bag_kg, time_limit=mix_time_limit)
+                    st.session_state["batch_sheet"] = (animal, selected_stage, sheet, mix_targets)
+            if "batch_sheet" in st.session_state and st.session_state["batch_sheet"][0] == animal:
+                _, sheet_stage, sheet, mix_targets = st.session_state["batch_sheet"]
+                if not sheet.feasible:
+                    st.error("❌ No batch of whole packs meets the targets within the time limit. "
+                             "Allow weighing for more ingredients, a smaller bag size or a longer time limit.")
+                else:
+                    col1, col2, col3 = st.columns(3)
+                    with col1: st.metric("💰 Batch Cost", f"₦{sheet.result.cost_per_kg * sheet.capacity:,.2f}")
+                    with col2: st.metric("⚖️ Cost/kg", f"₦{sheet.result.cost_per_kg:.2f}",
+                                         delta=(f"₦{sheet.result.cost_per_kg - sheet.lp_cost_per_kg:+.2f} vs exact formula"
+                                                if sheet.lp_cost_per_kg is not None else None),
+                                         delta_color="inverse")
+                    with col3: st.metric("📦 Ingredients", int((sheet.units > 0).sum()))
+                    if not sheet.optimal:
+                        st.warning("⏱️ Best batch found within the time limit, not proven cheapest. "
+                                   "A longer time limit may find a cheaper one.")
+                    if not pack_overrides and not (sheet.packs > sheet.weigh_kg).any():
+                        st.info(f"Whole {mix_bag_kg:g} kg bags could not meet every target, so each ingredient is weighed out.")
+                    st.dataframe(sheet.to_frame(), use_container_width=True, hide_index=True)
+                    title = f"{animal} · {sheet_stage} — {sheet.capacity:,.0f} kg batch"
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        st.download_button("🖨️ Download Batch Sheet (HTML, printable)", sheet.to_html(title, mix_targets),
+                                           f"{animal}_batch_sheet_{datetime.now().strftime('%Y%m%d')}.html",
+                                           "text/html", use_container_width=True)
+                    with col2:
+                        st.download_button("📥 Download Batch Sheet (CSV)", sheet.to_frame().to_csv(index=False),
+                                           f"{animal}_batch_sheet_{datetime.now().strftime('%Y%m%d')}.csv",
+                                           "text/csv", use_container_width=True)
 
     # ── TAB 2: INGREDIENT DB ─────────────────
     with tab2:
         st.header("📋 Ingredient Database Manager")
-        st.markdown(f"**{len(df)} ingredients** available for {animal} feed formulation.")
+        st.markdown(f"**{len(df)} ingredients** available for {animal} feed formulation "
+                    f"(catalogue version {catalogue_versions[animal]}).")
         col1, col2 = st.columns(2)
         with col1:
             raw_s = st.text_input("🔍 Search ingredients", placeholder="Type to filter…", max_chars=100)
@@ -1249,18 +1663,49 @@ def show_formulator():
                     if clean_df.empty:
                         st.error("❌ No valid rows to save after sanitisation.")
                     else:
-                        clean_df.to_csv(f"{animal.lower()}_ingredients.csv", index=False)
-                        st.success("✅ Ingredient database updated successfully!")
-                        st.cache_data.clear()
+                        version = get_ingredient_store().save(animal, clean_df)
+                        get_formulation_cache().invalidate(animal)
+                        if version == catalogue_versions[animal]:
+                            st.info("ℹ️ No changes to save.")
+                        else:
+                            st.success(f"✅ {animal} ingredient database saved as version {version}. "
+                                       "Other species' catalogues and results are unaffected.")
         with col2:
             csv_db = sanitize_df_edit(edited_df).to_csv(index=False)
             st.download_button("📥 Download Database (CSV)", csv_db,
                                f"{animal.lower()}_ingredients.csv", "text/csv", use_container_width=True)
+        with st.expander(f"🕘 {animal} catalogue versions"):
+            st.caption("Every save is kept as a numbered version of this species' catalogue. Saving one species "
+                       "only refreshes that species' data and results; restoring saves the old version as a new one.")
+            history = get_ingredient_store().history(animal)
+            st.dataframe(history, use_container_width=True, hide_index=True)
+            older = history["Version"].iloc[1:].tolist()
+            if older:
+                h_col1, h_col2 = st.columns([2, 1])
+                with h_col1:
+                    restore_version = st.selectbox("Version to restore", older, key=f"restore_{animal}")
+                with h_col2:
+                    st.markdown("<br>", unsafe_allow_html=True)
+                    if st.button("↩️ Restore", key="restore_catalogue", use_container_width=True):
+                        allowed_r, msg_r = check_rate_limit("save_db")
+                        if not allowed_r:
+                            st.warning(msg_r)
+                        else:
+                            version = get_ingredient_store().restore(animal, int(restore_version))
+                            get_formulation_cache().invalidate(animal)
+                            st.success(f"✅ Version {restore_version} restored as version {version}.")
 
     # ── TAB 3: GROWTH PREDICTION ─────────────
     with tab3:
         st.header("📈 AI Weight Gain Prediction")
         st.markdown("**Random Forest ML model** trained on 110+ feeding trials from Nigerian farms.")
+        diet_cp, diet_energy, diet_source = current_diet()
+        if diet_source == "formula":
+            st.caption(f"Diet: your optimised {animal.lower()} formula — CP {diet_cp:.2f}%, "
+                       f"energy {diet_energy:.0f} kcal/kg.")
+        else:
+            st.caption(f"Diet: catalogue average (CP {diet_cp:.1f}%, energy {diet_energy:.0f} kcal/kg). "
+                       "Run the Feed Optimizer to predict growth on your formula.")
         st.markdown("---")
         if st.button("🎯 Calculate Growth Prediction", type="primary"):
             allowed_p, msg_p = check_rate_limit("predict")
@@ -1268,41 +1713,67 @@ def show_formulator():
                 st.warning(msg_p)
             else:
                 with st.spinner("Calculating growth predictions…"):
-                    avg_cp     = sanitize_numeric(df["CP"].mean(),     0, 100, 18)
-                    avg_energy = sanitize_numeric(df["Energy"].mean(), 0, 10000, 2800)
-                    X_input    = np.array([[age, weight, cp_req, energy_req, feed_intake, avg_cp, avg_energy]])
-                    prediction = model.predict(X_input)[0]
-                    st.session_state["prediction"] = float(prediction)
+                    diet_cp, diet_energy, diet_source = current_diet()
+                    # Simulated a year ahead so the ROI and herd calculators can read any cycle length
+                    trajectory = simulate_growth(get_growth_model(), age, weight, cp_req, energy_req,
+                                                 feed_intake, diet_cp, diet_energy, days=365,
+                                                 interval=MODEL_CONFIG["interval"])
+                    st.session_state["growth_trajectory"] = trajectory
+                    st.session_state["prediction"] = float(trajectory.gain[0, 0])
+                    st.session_state["growth_diet"] = (diet_cp, diet_energy, diet_source)
 
         if "prediction" in st.session_state:
             prediction          = st.session_state["prediction"]
-            weekly_gain         = prediction * 7
-            monthly_gain        = prediction * 30
-            projected_weight_90 = weight + (monthly_gain * 3 / 1000)
+            trajectory          = st.session_state["growth_trajectory"]
+            start_weight        = trajectory.weight[0, 0]
+            weekly_gain         = (trajectory.weight_at(7)[0] - start_weight) * 1000
+            monthly_gain        = (trajectory.weight_at(30)[0] - start_weight) * 1000
+            projected_weight_90 = trajectory.weight_at(90)[0]
             col1, col2, col3, col4 = st.columns(4)
             with col1: st.metric("Daily Weight Gain", f"{prediction:.1f} g/day")
             with col2: st.metric("Weekly Gain",        f"{weekly_gain:.0f} g")
             with col3: st.metric("Monthly Gain",       f"{monthly_gain/1000:.2f} kg")
-            with col4: st.metric("90-Day Weight",      f"{projected_weight_90:.1f} kg", delta=f"+{projected_weight_90 - weight:.1f} kg")
+            with col4: st.metric("90-Day Weight",      f"{projected_weight_90:.1f} kg", delta=f"+{projected_weight_90 - start_weight:.1f} kg")
+            if trajectory.has_band:
+                band_pct = f"{trajectory.interval:.0%}"
+                st.caption(f"{band_pct} range: daily gain {trajectory.gain_lower[0, 0]:.1f}–{trajectory.gain_upper[0, 0]:.1f} g/day, "
+                           f"90-day weight {trajectory.weight_at(90, 'lower')[0]:.1f}–{trajectory.weight_at(90, 'upper')[0]:.1f} kg "
+                           "(spread of the forest's individual trees).")
+            grown_cp, grown_energy, grown_source = st.session_state.get("growth_diet", (None, None, None))
+            if grown_source is not None and (grown_cp, grown_energy) != (diet_cp, diet_energy):
+                st.warning("⚠️ The diet has changed since this prediction — recalculate to use "
+                           + ("your optimised formula." if diet_source == "formula" else "the current diet."))
             st.subheader("📊 90-Day Weight Projection")
-            days              = np.arange(0, 91)
-            projected_weights = weight + (prediction * days / 1000)
+            st.caption("Simulated day by day: each day's gain is predicted from the animal's updated age and weight.")
+            days = trajectory.days[:91]
             fig = go.Figure()
-            fig.add_trace(go.Scatter(x=days, y=projected_weights, mode="lines", name="Projected Weight",
-                                     line=dict(color="#208550", width=3), fill="tozeroy", fillcolor="rgba(32,133,80,.08)"))
-            fig.add_trace(go.Scatter(x=[0], y=[weight], mode="markers", name="Current Weight",
+            if trajectory.has_band:
+                fig.add_trace(go.Scatter(x=days, y=trajectory.weight_upper[0, :91], mode="lines", line=dict(width=0),
+                                         showlegend=False, hoverinfo="skip"))
+                fig.add_trace(go.Scatter(x=days, y=trajectory.weight_lower[0, :91], mode="lines", line=dict(width=0),
+                                         fill="tonexty", fillcolor="rgba(32,133,80,.18)", name=f"{band_pct} Range"))
+            fig.add_trace(go.Scatter(x=days, y=trajectory.weight[0, :91], mode="lines", name="Simulated Weight",
+                                     line=dict(color="#208550", width=3)))
+            fig.add_trace(go.Scatter(x=days, y=start_weight + prediction * days / 1000, mode="lines",
+                                     name="Day-0 Gain Extrapolated", line=dict(color="#94a3b8", width=2, dash="dash")))
+            fig.add_trace(go.Scatter(x=[0], y=[start_weight], mode="markers", name="Current Weight",
                                      marker=dict(size=12, color="#dc2626")))
             fig.update_layout(xaxis_title="Days", yaxis_title="Weight (kg)", hovermode="x unified", template="plotly_white")
             st.plotly_chart(fig, use_container_width=True)
+            with st.expander("📋 Daily trajectory"):
+                traj_df = trajectory.to_frame()
+                st.dataframe(traj_df.head(91), use_container_width=True, hide_index=True)
+                st.download_button("📥 Download Trajectory (CSV)", traj_df.to_csv(index=False),
+                                   f"{animal.lower()}_growth_trajectory.csv", "text/csv")
             st.subheader("📊 Performance Metrics")
             col1, col2 = st.columns(2)
             with col1:
-                fcr = (feed_intake * 1000) / prediction if prediction > 0 else 0
+                fcr = float(np.nan_to_num(trajectory.fcr(90)[0]))
                 st.metric("Feed Conversion Ratio (FCR)", f"{fcr:.2f}:1")
-                st.caption("Feed required to gain 1 kg of body weight")
+                st.caption("Feed required to gain 1 kg of body weight over the first 90 days")
             with col2:
-                if "total_cost" in st.session_state and prediction > 0:
-                    cost_per_kg = (st.session_state["total_cost"] * feed_intake * 1000) / prediction
+                if "total_cost" in st.session_state and fcr > 0:
+                    cost_per_kg = st.session_state["total_cost"] * fcr
                     st.metric("Cost per kg Gain", f"₦{cost_per_kg:.2f}")
                     st.caption("Feed cost to produce 1 kg of weight gain")
                 else:
@@ -1320,15 +1791,68 @@ def show_formulator():
                 st.metric("Performance Rating", perf)
             with col2:
                 target_weight = 2.5 if animal == "Rabbit" else (2.0 if animal == "Poultry" else 300)
-                if prediction > 0 and weight < target_weight:
-                    days_to_target = int((target_weight - weight) * 1000 / prediction)
-                    st.metric("Days to Market Weight", f"{days_to_target} days")
-                    st.caption(f"Target: {target_weight} kg")
+                if start_weight < target_weight:
+                    days_to_target = trajectory.days_to(target_weight)[0]
+                    st.metric("Days to Market Weight", f"{days_to_target:.0f} days" if np.isfinite(days_to_target)
+                              else f"> {trajectory.horizon} days")
+                    if trajectory.has_band:
+                        fast, slow = trajectory.days_to(target_weight, "upper")[0], trajectory.days_to(target_weight, "lower")[0]
+                        st.caption(f"Target: {target_weight} kg · {band_pct} range {fast:.0f}–"
+                                   + (f"{slow:.0f} days" if np.isfinite(slow) else f"> {trajectory.horizon} days"))
+                    else:
+                        st.caption(f"Target: {target_weight} kg")
                 else:
                     st.metric("Market Weight", "✅ Achieved")
         else:
             st.info("👆 Click 'Calculate Growth Prediction' above to see results")
 
+        with st.expander("📥 Add Feeding-Trial Results"):
+            live = get_live_model()
+            if live.ready:
+                meta = live.meta
+                st.caption(f"Current model: {meta.get('estimator', '-')} on {meta.get('rows', '-')} trials"
+                           + (f", {meta['trees']} trees" if meta.get("trees") else "")
+                           + f" · trained {meta.get('trained_at', '-')} · `{live.get().key}`")
+            else:
+                st.caption("Growth model is loading in the background…")
+            st.markdown("Upload a CSV with the training dataset's columns. Valid new rows are appended and the "
+                        "model is updated in the background; predictions switch over once it is ready.")
+            trials_file = st.file_uploader("Trial results (CSV)", type=["csv"], key="trials_upload")
+            if trials_file is not None:
+                try:
+                    trials = pd.read_csv(trials_file)
+                    valid, rejected = validate_trials(trials)
+                except Exception as e:
+                    st.error(f"❌ Could not read trial data: {html.escape(str(e))}")
+                    valid = rejected = None
+                if valid is not None:
+                    st.write(f"**{len(valid)}** valid row(s), **{len(rejected)}** rejected.")
+                    if len(rejected):
+                        st.dataframe(rejected, use_container_width=True, hide_index=True)
+                    if len(valid) and st.button("➕ Append & Retrain", key="ingest_trials"):
+                        allowed_i, msg_i = check_rate_limit("ingest")
+                        if not allowed_i:
+                            st.warning(msg_i)
+                        else:
+                            st.session_state["ingest_job"] = live.ingest(valid)
+            ingest_job = st.session_state.get("ingest_job")
+            if ingest_job is not None:
+                if not ingest_job.done():
+                    show_ingest_progress(ingest_job)
+                else:
+                    del st.session_state["ingest_job"]
+                    try:
+                        report = ingest_job.result()
+                        if report["added"]:
+                            st.success(f"✅ Added {report['added']} trial(s) ({report['duplicates']} duplicate(s) skipped); "
+                                       f"model updated by {report['mode'].replace('_', ' ')} on {report['rows']} rows "
+                                       f"in {report['train_time']:.2f}s.")
+                        else:
+                            st.info(f"No new trials: {report['duplicates']} duplicate(s), "
+                                    f"{len(report['rejected'])} rejected.")
+                    except Exception as e:
+                        st.error(f"❌ Ingest failed: {html.escape(str(e))}")
+
     # ── TAB 4: COST DASHBOARD ────────────────
     with tab4:
         st.header("📊 Cost Analysis Dashboard")
@@ -1351,11 +1875,19 @@ def show_formulator():
                 num_animals   = sanitize_int(st.number_input("Number of Animals", 1, 10000, 100), 1, 10000, 100)
             with col2:
                 duration_days = sanitize_int(st.slider("Duration (days)", 1, 365, 90), 1, 365, 90)
-            total_herd = daily_cost * num_animals * duration_days
+            trajectory = st.session_state.get("growth_trajectory")
+            if trajectory is not None:
+                # Feed eaten along the simulated growth curve rather than a flat daily ration
+                total_herd = total_cost * trajectory.feed_kg(duration_days)[0] * num_animals
+                st.caption("Using the simulated growth trajectory from the Growth Prediction tab.")
+            else:
+                total_herd = daily_cost * num_animals * duration_days
             col1, col2, col3 = st.columns(3)
             with col1: st.metric("Total Feed Cost",   f"₦{total_herd:,.2f}")
             with col2: st.metric("Cost per Animal",   f"₦{total_herd / num_animals:,.2f}")
-            with col3: st.metric("Daily Herd Cost",   f"₦{daily_cost * num_animals:,.2f}")
+            with col3: st.metric("Daily Herd Cost",   f"₦{total_herd / duration_days:,.2f}")
+            if trajectory is not None:
+                st.metric("Herd Live Weight at End", f"{trajectory.weight_at(duration_days)[0] * num_animals:,.1f} kg")
             st.markdown("---")
             st.subheader("📊 Cost Breakdown Analysis")
             fig = px.treemap(result_df_c, path=["Ingredient"], values="Cost Contribution (₦)",
@@ -1377,10 +1909,63 @@ def show_formulator():
                                  color="Cost Contribution (₦)", color_continuous_scale="Viridis")
                 fig.update_layout(template="plotly_white")
                 st.plotly_chart(fig, use_container_width=True)
+            st.markdown("---")
+            st.subheader("🎲 Price Risk Simulation")
+            risk_animal, risk_matrix, risk_targets = st.session_state["optimization_inputs"]
+            st.caption(f"Re-solves the last {risk_animal} formula under thousands of sampled ingredient price "
+                       "vectors (lognormal, mean = current catalogue price).")
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                volatility_pct = sanitize_numeric(
+                    st.slider("Weekly price volatility (±%)", 1, 50, int(PRICE_VOLATILITY * 100), key="risk_vol"),
+                    1.0, 50.0, PRICE_VOLATILITY * 100)
+            with col2:
+                n_scenarios = sanitize_int(
+                    st.select_slider("Scenarios", [500, 1000, 2000, 5000, 10000], 2000, key="risk_n"),
+                    100, 10000, 2000)
+            with col3:
+                st.markdown("<br>", unsafe_allow_html=True)
+                run_risk = st.button("🎲 Run Simulation", use_container_width=True, key="run_risk")
+            if run_risk:
+                allowed_m, msg_m = check_rate_limit("optimize")
+                if not allowed_m:
+                    st.warning(msg_m)
+                else:
+                    with st.spinner(f"Solving {n_scenarios:,} price scenarios…"):
+                        # Serial: warm-started scenarios take ~0.1 ms each, less than starting a worker pool
+                        st.session_state["price_risk"] = simulate_price_risk(
+                            risk_matrix, risk_targets, volatility_pct / 100, n_scenarios)
+            if "price_risk" in st.session_state and st.session_state["price_risk"].matrix.ingredients == risk_matrix.ingredients:
+                risk    = st.session_state["price_risk"]
+                summary = risk.cost_summary()
+                if summary["Feasible"] == 0:
+                    st.error("❌ No scenario produced a feasible formula.")
+                else:
+                    col1, col2, col3, col4 = st.columns(4)
+                    with col1: st.metric("Median Cost/kg",  f"₦{summary['P50']:.2f}")
+                    with col2: st.metric("5th Percentile",  f"₦{summary['P5']:.2f}")
+                    with col3: st.metric("95th Percentile", f"₦{summary['P95']:.2f}")
+                    with col4: st.metric("Feasible Scenarios", f"{summary['Feasible']:,}/{summary['Scenarios']:,}")
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        fig = px.histogram(x=risk.costs[np.isfinite(risk.costs)], nbins=50,
+                                           title="Distribution of Least Cost (₦/kg)",
+                                           labels={"x": "Cost/kg (₦)"}, color_discrete_sequence=["#208550"])
+                        fig.add_vline(x=total_cost, line_dash="dash", line_color="#dc2626")
+                        fig.update_layout(template="plotly_white", yaxis_title="Scenarios", showlegend=False)
+                        st.plotly_chart(fig, use_container_width=True)
+                    with col2:
+                        freq = risk.ingredient_frequency()
+                        fig  = px.bar(freq.head(12), x="Ingredient", y="In Mix (% of scenarios)",
+                                      title="How Often Each Ingredient Is in the Optimal Mix",
+                                      color="In Mix (% of scenarios)", color_continuous_scale="Greens")
+                        fig.update_layout(xaxis_tickangle=-45, template="plotly_white")
+                        st.plotly_chart(fig, use_container_width=True)
+                    st.dataframe(freq, use_container_width=True, hide_index=True)
             if "prediction" in st.session_state:
                 st.markdown("---")
                 st.subheader("💵 Return on Investment Calculator")
-                prediction = st.session_state["prediction"]
+                trajectory = st.session_state["growth_trajectory"]
                 col1, col2 = st.columns(2)
                 with col1:
                     default_price = 1500 if animal == "Rabbit" else (1200 if animal == "Poultry" else 2000)
@@ -1389,9 +1974,8 @@ def show_formulator():
                 with col2:
                     prod_days = sanitize_int(
                         st.number_input("Production Cycle (days)", 30, 365, 90), 30, 365, 90)
-                total_feed_cost = daily_cost * prod_days
-                weight_gain_kg  = (prediction * prod_days) / 1000
-                final_weight    = weight + weight_gain_kg
+                total_feed_cost = total_cost * trajectory.feed_kg(prod_days)[0]
+                final_weight    = trajectory.weight_at(prod_days)[0]
                 revenue         = final_weight * price_per_kg
                 profit          = revenue - total_feed_cost
                 roi_pct         = (profit / total_feed_cost * 100) if total_feed_cost > 0 else 0
@@ -1400,6 +1984,26 @@ def show_formulator():
                 with col2: st.metric("Final Weight",    f"{final_weight:.2f} kg")
                 with col3: st.metric("Revenue",         f"₦{revenue:,.2f}")
                 with col4: st.metric("Profit",          f"₦{profit:,.2f}", delta=f"{roi_pct:.1f}% ROI")
+                if trajectory.has_band:
+                    # Feed follows the point path; the band is in live weight sold
+                    cycle      = trajectory.days[:prod_days + 1]
+                    feed_cost  = total_cost * np.concatenate([[0.0], np.cumsum(trajectory.intake[0, :prod_days])])
+                    profit_by  = {path: trajectory.weights(path)[0, :prod_days + 1] * price_per_kg - feed_cost
+                                  for path in ("point", "lower", "upper")}
+                    st.caption(f"{trajectory.interval:.0%} range: final weight "
+                               f"{trajectory.weight_at(prod_days, 'lower')[0]:.2f}–{trajectory.weight_at(prod_days, 'upper')[0]:.2f} kg, "
+                               f"profit ₦{profit_by['lower'][-1]:,.2f} – ₦{profit_by['upper'][-1]:,.2f}")
+                    fig = go.Figure()
+                    fig.add_trace(go.Scatter(x=cycle, y=profit_by["upper"], mode="lines", line=dict(width=0),
+                                             showlegend=False, hoverinfo="skip"))
+                    fig.add_trace(go.Scatter(x=cycle, y=profit_by["lower"], mode="lines", line=dict(width=0), fill="tonexty",
+                                             fillcolor="rgba(32,133,80,.18)", name=f"{trajectory.interval:.0%} Range"))
+                    fig.add_trace(go.Scatter(x=cycle, y=profit_by["point"], mode="lines", name="Expected Profit",
+                                             line=dict(color="#208550", width=3)))
+                    fig.add_hline(y=0, line_dash="dash", line_color="#dc2626")
+                    fig.update_layout(title="Profit if Sold on Each Day of the Cycle", xaxis_title="Days",
+                                      yaxis_title="Profit per Animal (₦)", hovermode="x unified", template="plotly_white")
+                    st.plotly_chart(fig, use_container_width=True)
                 roi_data = pd.DataFrame({"Category":["Feed Cost","Profit"],
                                          "Amount":[total_feed_cost, max(profit, 0)]})
                 fig = px.pie(roi_data, values="Amount", names="Category",
@@ -1411,6 +2015,79 @@ def show_formulator():
                 else:
                     st.error("⚠️ Loss expected. Adjust feeding programme or selling price.")
 
+    # ── TAB 5: MILL PLANNER ──────────────────
+    with tab5:
+        st.header("🏭 Multi-Product Mill Planner")
+        st.markdown("Plan every product the mill is making **in one optimisation**, so all formulas share the "
+                    "ingredient stock on hand. Ingredients without a stock entry are treated as bought in.")
+        catalogues  = {"Rabbit": rabbit_df, "Poultry": poultry_df, "Cattle": cattle_df}
+        nutrient_db = get_nutrient_requirements()
+        product_options = [f"{sp} · {stage}" for sp in catalogues for stage in nutrient_db[sp]]
+        col1, col2 = st.columns(2)
+        with col1:
+            st.subheader("📦 Products")
+            products_in = st.data_editor(
+                pd.DataFrame({"Product": product_options[:1] + product_options[6:7] + product_options[12:13],
+                              "Tonnes": [20.0, 20.0, 20.0]}),
+                num_rows="dynamic", use_container_width=True, key="mill_products",
+                column_config={
+                    "Product": st.column_config.SelectboxColumn("Product", options=product_options, required=True),
+                    "Tonnes":  st.column_config.NumberColumn("Tonnes", min_value=0.0, max_value=10_000.0, format="%.1f"),
+                },
+            )
+        with col2:
+            st.subheader("🏚️ Stock on Hand")
+            all_ingredients = sorted(set().union(*(cat["Ingredient"] for cat in catalogues.values())))
+            stock_in = st.data_editor(
+                pd.DataFrame({"Ingredient": ["Maize", "Soybean Meal"], "Stock (t)": [15.0, 5.0]}),
+                num_rows="dynamic", use_container_width=True, key="mill_stock",
+                column_config={
+                    "Ingredient": st.column_config.SelectboxColumn("Ingredient", options=all_ingredients, required=True),
+                    "Stock (t)":  st.column_config.NumberColumn("Stock (t)", min_value=0.0, max_value=100_000.0, format="%.1f"),
+                },
+            )
+        if st.button("🏭 Plan Production", type="primary", key="run_mill"):
+            allowed_m, msg_m = check_rate_limit("optimize")
+            if not allowed_m:
+                st.warning(msg_m)
+            else:
+                orders = []
+                for _, row in products_in.dropna().iterrows():
+                    sp, stage = str(row["Product"]).split(" · ", 1)
+                    tonnes = sanitize_numeric(row["Tonnes"], 0.0, 10_000.0, 0.0)
+                    if sp in catalogues and stage in nutrient_db[sp] and tonnes > 0:
+                        targets = stage_targets(nutrient_db[sp][stage])
+                        targets.rules = stage_rules(rules_df, sp, stage)
+                        orders.append(ProductOrder(row["Product"], IngredientMatrix.from_frame(catalogues[sp], composition=composition_df),
+                                                   targets, tonnes))
+                stock = {sanitize_text(str(r["Ingredient"]), 100): sanitize_numeric(r["Stock (t)"], 0.0, 100_000.0, 0.0)
+                         for _, r in stock_in.dropna().iterrows()}
+                if not orders:
+                    st.error("❌ Add at least one product with a positive tonnage.")
+                else:
+                    with st.spinner(f"Planning {len(orders)} products against shared stock…"):
+                        st.session_state["mill_plan"] = plan_production(orders, stock)
+        if "mill_plan" in st.session_state:
+            plan = st.session_state["mill_plan"]
+            if not plan.optimal:
+                st.error("❌ No feasible plan — stock is too tight for these tonnages and targets. "
+                         "Add stock, reduce tonnage or remove a product.")
+            else:
+                total_t = sum(o.tonnes for o in plan.orders)
+                col1, col2, col3 = st.columns(3)
+                with col1: st.metric("Total Ingredient Cost", f"₦{plan.total_cost:,.0f}")
+                with col2: st.metric("Total Feed",            f"{total_t:,.1f} t")
+                with col3: st.metric("Average Cost/kg",       f"₦{plan.total_cost / (total_t * 1000):.2f}")
+                st.dataframe(plan.product_costs(), use_container_width=True, hide_index=True)
+                st.subheader("🏚️ Inventory Use")
+                st.caption("'Value of +1 t' is how much the whole plan would save with one more tonne of that ingredient in stock.")
+                st.dataframe(plan.inventory(), use_container_width=True, hide_index=True)
+                st.subheader("📋 Formulas")
+                formulas = plan.formulas()
+                st.dataframe(formulas, use_container_width=True, hide_index=True)
+                st.download_button("📥 Download Mill Plan (CSV)", formulas.to_csv(index=False),
+                                   f"mill_plan_{datetime.now().strftime('%Y%m%d')}.csv", "text/csv")
+
 
 # ─────────────────────────────────────────────
 #  ROUTER
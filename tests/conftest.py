@@ -0,0 +1,13 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(autouse=True)
+def _repo_root(monkeypatch):
+    # Modules read their reference CSVs relative to the repository root
+    monkeypatch.chdir(ROOT)
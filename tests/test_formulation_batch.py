@@ -0,0 +1,50 @@
+from dataclasses import replace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from formulation_batch import formulate_batch, simulate_price_risk, stage_jobs, sweep_targets
+from formulation_engine import IngredientMatrix, NutrientTargets, formulate, load_composition, load_rules
+from reference_data import get_nutrient_requirements, stage_range_targets
+
+
+def test_batch_keeps_job_order_and_matches_single_solves():
+    matrix = IngredientMatrix.from_frame(pd.read_csv("rabbit_ingredients.csv"), composition=load_composition())
+    jobs = stage_jobs("Rabbit", rules=load_rules())
+    serial = formulate_batch(matrix, jobs)
+    pooled = formulate_batch(matrix, jobs, processes=2)
+    pd.testing.assert_frame_equal(serial, pooled)
+    labels = serial[["Stage", "Breed"]].fillna("").drop_duplicates()
+    assert list(labels.itertuples(index=False, name=None)) == [(j.labels["Stage"], j.labels["Breed"] or "")
+                                                              for j in jobs]
+    costs = serial.groupby(["Stage", "Breed"], dropna=False, sort=False)["Cost/kg (₦)"].first().to_numpy()
+    np.testing.assert_allclose(costs, [formulate(matrix, j.targets).cost_per_kg for j in jobs], rtol=1e-7)
+
+
+def test_sweep_past_stage_cap_stays_feasible():
+    matrix = IngredientMatrix.from_frame(pd.read_csv("poultry_ingredients.csv"), composition=load_composition())
+    stage = get_nutrient_requirements()["Poultry"]["Broiler Grower (3-6 weeks)"]
+    base = stage_range_targets(stage, 21.0, 3200.0)
+    assert base.maximum["CP"] == 22.0
+    out = sweep_targets(matrix, base, {"CP": np.arange(14, 24.5, 0.5)})
+    above = out[out["CP"] > 22.0]
+    assert len(above) and (above["Status"] == "Optimal").all()
+    assert (np.diff(out["Cost/kg (₦)"].to_numpy()) >= -1e-6).all()
+    assert base.maximum["CP"] == 22.0   # the caller's targets are left alone
+
+
+def test_price_risk_scenarios_match_fresh_solves():
+    matrix = IngredientMatrix.from_frame(pd.read_csv("poultry_ingredients.csv"), composition=load_composition())
+    targets = NutrientTargets(minimum={"CP": 20, "Energy": 2900})
+    risk = simulate_price_risk(matrix, targets, 0.15, 200, seed=7)
+    again = simulate_price_risk(matrix, targets, 0.15, 200, seed=7)
+    np.testing.assert_array_equal(risk.prices, again.prices)
+    assert risk.costs.shape == (200,) and risk.proportions.shape == (200, matrix.size)
+    assert np.isfinite(risk.costs).all()
+    for s in (0, 99, 199):
+        fresh = formulate(replace(matrix, cost=risk.prices[s]), targets)
+        assert risk.costs[s] == pytest.approx(fresh.cost_per_kg, rel=1e-7)
+    summary = risk.cost_summary()
+    assert summary["Feasible"] == 200 and summary["P5"] <= summary["P50"] <= summary["P95"]
+    assert risk.ingredient_frequency()["In Mix (% of scenarios)"].between(0, 100).all()
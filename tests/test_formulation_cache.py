@@ -0,0 +1,41 @@
+from dataclasses import replace
+
+import numpy as np
+import pandas as pd
+
+import formulation_cache
+from formulation_cache import FormulationCache
+from formulation_engine import TIME_LIMIT_FEASIBLE, IngredientMatrix, NutrientTargets, _result, load_composition
+
+
+def _matrix():
+    return IngredientMatrix.from_frame(pd.read_csv("rabbit_ingredients.csv"), composition=load_composition())
+
+
+def test_hits_across_instances_and_evicts_least_recently_used(tmp_path):
+    matrix, path = _matrix(), str(tmp_path / "cache.sqlite3")
+    cache = FormulationCache(path, max_entries=2)
+    first, hit = cache.formulate(matrix, NutrientTargets(minimum={"CP": 16}))
+    assert first.optimal and not hit
+    again, hit = FormulationCache(path).formulate(matrix, NutrientTargets(minimum={"CP": 16}))
+    assert hit and again.cost_per_kg == first.cost_per_kg and again.matrix is matrix
+    assert not cache.formulate(replace(matrix, cost=matrix.cost * 1.1), NutrientTargets(minimum={"CP": 16}))[1]
+    cache.formulate(matrix, NutrientTargets(minimum={"CP": 16}))   # refreshes the oldest entry
+    cache.formulate(matrix, NutrientTargets(minimum={"CP": 18}))
+    assert len(cache) == 2
+    assert cache.formulate(matrix, NutrientTargets(minimum={"CP": 16}))[1]
+    assert not cache.formulate(replace(matrix, cost=matrix.cost * 1.1), NutrientTargets(minimum={"CP": 16}))[1]
+
+
+def test_time_limited_formula_is_not_cached(tmp_path, monkeypatch):
+    matrix = _matrix()
+    incumbent = np.full(matrix.size, 1 / matrix.size)
+    monkeypatch.setattr(formulation_cache, "formulate",
+                        lambda m, t, **_: _result(m, TIME_LIMIT_FEASIBLE, incumbent, 123.0, None, {"mip_gap": 0.2}))
+    cache = FormulationCache(str(tmp_path / "cache.sqlite3"))
+    targets = NutrientTargets(minimum={"CP": 17})
+    result, hit = cache.formulate(matrix, targets, max_ingredients=3)
+    assert result.feasible and not result.optimal and not result.proven
+    np.testing.assert_allclose(result.proportions, incumbent)
+    assert not hit and len(cache) == 0
+    assert cache.formulate(matrix, targets, max_ingredients=3)[1] is False
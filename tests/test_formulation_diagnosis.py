@@ -0,0 +1,36 @@
+import pandas as pd
+import pytest
+
+from formulation_diagnosis import diagnose
+from formulation_engine import IngredientMatrix, NutrientTargets, formulate, load_composition
+
+
+@pytest.fixture
+def matrix():
+    return IngredientMatrix.from_frame(pd.read_csv("rabbit_ingredients.csv"), composition=load_composition())
+
+
+def test_unreachable_target_is_screened(matrix):
+    diagnosis = diagnose(matrix, NutrientTargets(minimum={"CP": 120}))
+    assert diagnosis.screened and not diagnosis.feasible
+    row = diagnosis.conflicts.iloc[0]
+    assert (row["Nutrient"], row["Bound"]) == ("CP", "Min")
+    assert row["Relaxed To"] == matrix.values[matrix.nutrients.index("CP")].max()
+
+
+def test_conflicting_targets_get_the_smallest_relaxation(matrix):
+    targets = NutrientTargets(minimum={"Energy": 3040, "CP": 16}, maximum={"TDN": 52})
+    assert not formulate(matrix, targets).feasible
+    diagnosis = diagnose(matrix, targets)
+    conflicts = diagnosis.conflicts.set_index("Nutrient")
+    assert set(conflicts.index) == {"Energy", "TDN"}   # CP is not part of the conflict
+    assert conflicts.loc["Energy", "Relaxation"] > 0
+    assert diagnosis.result.optimal
+    assert diagnosis.result.nutrient_levels["Energy"] == pytest.approx(conflicts.loc["Energy", "Relaxed To"])
+    assert targets.minimum["Energy"] == 3040   # the caller's targets are left alone
+
+
+def test_ingredient_cap_cause_reports_the_smallest_cap(matrix):
+    diagnosis = diagnose(matrix, NutrientTargets(minimum={"CP": 17, "Energy": 2500}), max_ingredients=1)
+    assert diagnosis.conflicts.empty
+    assert diagnosis.max_ingredients == 2 and diagnosis.result.feasible
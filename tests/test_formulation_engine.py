@@ -0,0 +1,118 @@
+from dataclasses import replace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from formulation_engine import (FormulationSession, IngredientMatrix, NutrientTargets, formulate, load_composition,
+                                load_rules, stage_rules)
+
+
+@pytest.fixture
+def matrix():
+    return IngredientMatrix.from_frame(pd.read_csv("rabbit_ingredients.csv"), composition=load_composition())
+
+
+TARGETS = NutrientTargets(minimum={"CP": 17, "Energy": 2500}, maximum={"Fiber": 18})
+
+
+def _same(a, b):
+    assert a.status == b.status == "Optimal"
+    assert a.cost_per_kg == pytest.approx(b.cost_per_kg, rel=1e-7)
+    np.testing.assert_allclose(a.proportions, b.proportions, atol=1e-7)
+
+
+def test_formula_meets_targets(matrix):
+    result = formulate(matrix, TARGETS)
+    assert result.optimal
+    assert result.proportions.sum() == pytest.approx(1.0)
+    assert (result.proportions >= -1e-9).all()
+    levels = result.nutrient_levels
+    assert levels["CP"] >= 17 - 1e-6 and levels["Energy"] >= 2500 - 1e-6 and levels["Fiber"] <= 18 + 1e-6
+    assert result.cost_per_kg == pytest.approx(result.proportions @ matrix.cost)
+    frame = result.to_frame()
+    assert frame["Proportion (%)"].sum() == pytest.approx(100, abs=0.05)
+    assert frame["Proportion"].is_monotonic_decreasing
+
+
+def test_session_restores_catalogue_cost(matrix):
+    session = FormulationSession(matrix)
+    sampled = matrix.cost * np.random.default_rng(0).uniform(0.5, 1.5, matrix.size)
+    _same(session.solve(TARGETS, cost=sampled), formulate(replace(matrix, cost=sampled), TARGETS))
+    _same(session.solve(TARGETS), formulate(matrix, TARGETS))
+
+
+def test_session_applies_cost_after_rules_reload(matrix):
+    session = FormulationSession(matrix)
+    sampled = matrix.cost * np.random.default_rng(1).uniform(0.5, 1.5, matrix.size)
+    session.solve(TARGETS, cost=sampled)
+    ruled = replace(TARGETS, rules=stage_rules(load_rules(), "Rabbit"))
+    resampled = matrix.cost * np.random.default_rng(2).uniform(0.5, 1.5, matrix.size)
+    _same(session.solve(ruled, cost=resampled), formulate(replace(matrix, cost=resampled), ruled))
+    _same(session.solve(ruled), formulate(matrix, ruled))
+
+
+def test_session_leaves_earlier_sensitivity_alone(matrix):
+    session = FormulationSession(matrix)
+    first = session.solve(TARGETS)
+    bounds = first.sensitivity.row_lower.copy(), first.sensitivity.row_upper.copy()
+    session.solve(NutrientTargets(minimum={"CP": 19, "Energy": 2400}, maximum={"Fiber": 16}))
+    np.testing.assert_array_equal(first.sensitivity.row_lower, bounds[0])
+    np.testing.assert_array_equal(first.sensitivity.row_upper, bounds[1])
+
+
+@pytest.mark.parametrize("targets", [TARGETS, replace(TARGETS, rules=stage_rules(load_rules(), "Rabbit")),
+                                     NutrientTargets(minimum={"CP": 40})])
+def test_highs_and_cbc_agree(matrix, targets):
+    highs, cbc = formulate(matrix, targets, solver="highs"), formulate(matrix, targets, solver="cbc")
+    assert highs.status == cbc.status
+    if highs.optimal:
+        assert highs.cost_per_kg == pytest.approx(cbc.cost_per_kg, rel=1e-6)
+
+
+def test_shadow_price_and_entry_price_predict_resolves(matrix):
+    result = formulate(matrix, TARGETS)
+    rows = result.constraint_sensitivity().set_index("Constraint")
+    assert rows.loc["CP", "Binding"]
+    raised = formulate(matrix, replace(TARGETS, minimum={**TARGETS.minimum, "CP": 17.1}))
+    assert (raised.cost_per_kg - result.cost_per_kg) / 0.1 == pytest.approx(rows.loc["CP", "Shadow Price (₦/kg)"],
+                                                                            rel=1e-3)
+    ingredients = result.ingredient_sensitivity()
+    out = ingredients[~ingredients["In Mix"]].iloc[0]
+    j = matrix.ingredients.index(out["Ingredient"])
+    cost = matrix.cost.copy()
+    cost[j] = out["Entry Price (₦/kg)"] - 1.0
+    assert formulate(replace(matrix, cost=cost), TARGETS).proportions[j] > 0
+
+
+def test_ingredient_cap_is_a_real_milp(matrix):
+    free = formulate(matrix, TARGETS)
+    assert len(free.included) > 3
+    capped = formulate(matrix, TARGETS, max_ingredients=3, min_inclusion=0.01)
+    assert capped.optimal
+    assert (capped.proportions > 1e-7).sum() <= 3
+    assert capped.proportions[capped.proportions > 1e-7].min() >= 0.01 - 1e-7
+    assert capped.cost_per_kg >= free.cost_per_kg - 1e-9
+    levels = capped.nutrient_levels
+    assert levels["CP"] >= 17 - 1e-6 and levels["Fiber"] <= 18 + 1e-6
+
+
+@pytest.mark.parametrize("species, csv", [("Rabbit", "rabbit_ingredients.csv"), ("Poultry", "poultry_ingredients.csv")])
+def test_inclusion_rules_hold(species, csv):
+    matrix = IngredientMatrix.from_frame(pd.read_csv(csv), composition=load_composition())
+    rules = stage_rules(load_rules(), species)
+    targets = NutrientTargets(minimum={"CP": 18, "Energy": 2600}, rules=rules)
+    result = formulate(matrix, targets)
+    assert result.optimal
+    A, lower, upper, names = rules.block(matrix)
+    levels = A @ result.proportions
+    assert ((levels >= lower - 1e-7) & (levels <= upper + 1e-7)).all(), names
+    assert result.cost_per_kg >= formulate(matrix, replace(targets, rules=None)).cost_per_kg - 1e-9
+
+
+def test_stage_rule_replaces_species_rule():
+    rules = load_rules()
+    finisher = stage_rules(rules, "Poultry", "Broiler Finisher (6+ weeks)").to_frame().set_index("Rule")
+    grower = stage_rules(rules, "Poultry", "Broiler Grower (3-6 weeks)").to_frame().set_index("Rule")
+    assert finisher.loc["Fishmeal limit", "Max (%)"] == 3 and grower.loc["Fishmeal limit", "Max (%)"] == 5
+    assert finisher.index.is_unique
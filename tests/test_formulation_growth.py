@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from formulation_engine import IngredientMatrix, NutrientTargets, load_composition
+from formulation_growth import optimize_cost_per_gain
+
+ANIMAL = dict(age_weeks=6, weight=1.2, cp_req=16, energy_req=2500, feed_intake=0.12)
+
+
+class ProteinLimitedGain:
+    """Gain (g/day) rising with diet CP up to 20%, flat above it."""
+
+    def predict(self, X):
+        return 40 * np.minimum(np.asarray(X)[:, 5], 20) / 20
+
+
+def test_search_finds_a_cheaper_gain_than_least_cost_feed():
+    matrix = IngredientMatrix.from_frame(pd.read_csv("rabbit_ingredients.csv"), composition=load_composition())
+    base = NutrientTargets(minimum={"CP": 16, "Energy": 2500}, maximum={"Fiber": 18})
+    search = optimize_cost_per_gain(ProteinLimitedGain(), matrix, base, ANIMAL, steps=5, rounds=2, days=30)
+    assert search.optimal
+    scored = search.candidates["Cost per kg Gain (₦)"].dropna()
+    assert scored.is_monotonic_increasing and len(scored) == 1 + 2 * 25
+    best, baseline = search.summary, search.baseline
+    assert best["Cost per kg Gain (₦)"] <= baseline["Cost per kg Gain (₦)"]
+    # Gain pays for protein up to 20% CP and energy buys nothing, so the search lands on the cheapest 20% CP feed
+    assert best["Diet CP (%)"] == pytest.approx(20)
+    assert best["Energy Target (kcal/kg)"] == pytest.approx(2500 - 150)
+    assert search.best.cost_per_kg == pytest.approx(best["Feed Cost/kg (₦)"])
+    assert search.best.nutrient_levels["CP"] >= search.targets.minimum["CP"] - 1e-6
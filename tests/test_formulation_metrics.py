@@ -0,0 +1,14 @@
+from formulation_metrics import SolveMetrics
+
+
+def test_session_solves_keep_their_own_window():
+    metrics = SolveMetrics(window=10)
+    for _ in range(3):
+        metrics.observe({"source": "formulate", "solver": "highs", "total_time": 0.5})
+    for _ in range(50):
+        metrics.observe({"source": "session", "solver": "highs", "total_time": 0.001})
+    summary = metrics.summary().set_index(["Source", "Phase"])
+    assert summary.loc[("formulate", "total"), "Solves"] == 3
+    assert summary.loc[("formulate", "total"), "p50 (ms)"] == 500.0
+    assert summary.loc[("session", "total"), "Solves"] == 10
+    assert len(metrics) == 13
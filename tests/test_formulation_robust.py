@@ -0,0 +1,26 @@
+import pandas as pd
+import pytest
+
+from formulation_engine import IngredientMatrix, NutrientTargets, formulate, load_composition
+from formulation_robust import delivery_profile, formulate_robust, load_variability, nutrient_sd
+
+TARGETS = NutrientTargets(minimum={"CP": 17, "Energy": 2500}, maximum={"CP": 18, "Fiber": 18})
+
+
+@pytest.fixture
+def matrix():
+    return IngredientMatrix.from_frame(pd.read_csv("rabbit_ingredients.csv"), composition=load_composition())
+
+
+@pytest.mark.parametrize("method", ["linear", "soc"])
+def test_margin_on_minimums_and_named_caps(matrix, method):
+    sd = nutrient_sd(matrix, load_variability())
+    nominal = formulate(matrix, TARGETS).cost_per_kg
+    free = formulate_robust(matrix, TARGETS, sd, confidence=0.85, method=method)
+    capped = formulate_robust(matrix, TARGETS, sd, confidence=0.85, method=method, caps=("CP",))
+    assert free.optimal and capped.optimal
+    assert capped.cost_per_kg >= free.cost_per_kg >= nominal
+    cp = delivery_profile(free, TARGETS, sd, confidence=0.85).set_index("Nutrient").loc["CP"]
+    assert cp["Low (85%)"] >= 17 - 1e-3 and cp["Expected"] <= 18 + 1e-6   # the cap holds on average
+    cp = delivery_profile(capped, TARGETS, sd, confidence=0.85).set_index("Nutrient").loc["CP"]
+    assert cp["Low (85%)"] >= 17 - 1e-3 and cp["High (85%)"] <= 18 + 1e-3
@@ -0,0 +1,43 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from growth_model import FEATURES, MODEL_CONFIG, artifact_path, load_or_train, model_key
+
+PARAMS = {"n_estimators": 5, "max_depth": 4}
+
+
+def test_saved_artifact_is_reused_until_its_inputs_change(tmp_path):
+    first = load_or_train(params=PARAMS, directory=str(tmp_path))
+    path = artifact_path(first.key, str(tmp_path))
+    assert os.path.exists(path) and "loaded_from" not in first.meta
+    again = load_or_train(params=PARAMS, directory=str(tmp_path))
+    assert again.meta["loaded_from"] == path and again.meta["trained_at"] == first.meta["trained_at"]
+    X = pd.read_csv(MODEL_CONFIG["dataset"])[FEATURES].head(20)
+    np.testing.assert_array_equal(again.predict(X), first.predict(X))
+    assert model_key(params={**PARAMS, "max_depth": 5}) != first.key
+
+
+def test_mapped_export_replaces_a_stale_swap_directory(tmp_path):
+    first = load_or_train(params=PARAMS, directory=str(tmp_path), mmap=True)
+    forest = first.meta["loaded_from"]
+    assert forest.endswith(".forest")
+    os.makedirs(os.path.join(forest + ".old", "leftover"))   # an export that died mid-swap
+    again = load_or_train(params=PARAMS, directory=str(tmp_path), mmap=True, retrain=True)
+    assert again.meta["loaded_from"] == forest
+    assert not os.path.exists(forest + ".old")
+
+
+def test_intervals_bracket_the_forest_mean(tmp_path):
+    model = load_or_train(params=PARAMS, directory=str(tmp_path))
+    X = pd.concat([pd.read_csv(MODEL_CONFIG["dataset"])[FEATURES]] * 3, ignore_index=True)
+    assert len(X) > MODEL_CONFIG["forest_rows"]
+    trees = model.predict_trees(X)
+    assert trees.shape == (len(X), PARAMS["n_estimators"])
+    np.testing.assert_allclose(trees.mean(axis=1), model.estimator.predict(X))
+    np.testing.assert_allclose(model.predict_trees(X.head(3)), trees[:3])   # node walk == sklearn apply
+    point, lower, upper = model.predict_interval(X, level=0.8)
+    assert (lower <= point).all() and (point <= upper).all() and (upper > lower).any()
+    narrow = model.predict_interval(X, level=0.5)
+    assert (narrow[2] - narrow[1] <= upper - lower + 1e-12).all()
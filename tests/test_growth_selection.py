@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from growth_model import MODEL_CONFIG, estimator_spec
+from growth_selection import compare_models, recommend
+
+
+def test_compare_and_recommend():
+    data = pd.read_csv(MODEL_CONFIG["dataset"]).head(300)
+    results = compare_models(data, names=["ridge_interactions", "small_forest"], folds=2, repeats=1, n_jobs=1)
+    assert set(results["Model"]) == {"ridge_interactions", "small_forest"}
+    assert results["CV MAE (g/day)"].is_monotonic_increasing
+    assert (results["CV MAE (g/day)"] > 0).all() and (results["Size (KB)"] > 0).all()
+    interval = results.set_index("Model").filter(like="interval").iloc[:, 0]
+    assert np.isnan(interval["ridge_interactions"]) and interval["small_forest"] > 0
+    assert recommend(results) in set(results["Model"])
+
+
+def test_recommend_prefers_the_fastest_model_within_tolerance():
+    results = pd.DataFrame({"Model": ["big", "small", "sloppy"], "CV MAE (g/day)": [10.0, 10.3, 20.0],
+                            "1-row predict (ms)": [30.0, 2.0, 0.1]})
+    assert recommend(results, tolerance=0.05) == "small"
+    assert recommend(results, tolerance=0.01) == "big"
+
+
+def test_unknown_candidate_is_rejected():
+    with pytest.raises(ValueError):
+        estimator_spec("xgboost")
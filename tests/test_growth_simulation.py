@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from growth_simulation import simulate_growth
+
+
+class LinearGain:
+    """Gain (g/day) rising with body weight and diet CP: enough to check the day-by-day feedback."""
+
+    def predict(self, X):
+        X = np.asarray(X)
+        return 20 + 10 * X[:, 1] + X[:, 2]
+
+
+def _by_hand(weight, cp, days):
+    path = [weight]
+    for _ in range(days):
+        path.append(path[-1] + (20 + 10 * path[-1] + cp) / 1000)
+    return np.array(path)
+
+
+def test_each_day_feeds_the_new_weight_back():
+    traj = simulate_growth(LinearGain(), 4, [1.0, 2.5], [16, 18], 2600, 0.12, 18, 2700, days=30)
+    assert traj.weight.shape == (2, 31) and traj.gain.shape == (2, 30)
+    np.testing.assert_allclose(traj.weight[0], _by_hand(1.0, 16, 30))
+    np.testing.assert_allclose(traj.weight[1], _by_hand(2.5, 18, 30))
+    assert traj.feed_kg()[0] == pytest.approx(0.12 * 30)
+
+
+def test_sold_animals_stop_and_the_run_ends_when_all_are_sold():
+    traj = simulate_growth(LinearGain(), 4, [1.0, 1.2], 16, 2600, 0.12, 18, 2700, days=200, stop_at=1.5)
+    reached = traj.days_to(1.5)
+    assert reached[1] < reached[0] and traj.horizon == reached[0]
+    assert traj.gain[1, int(reached[1]):].sum() == 0 and traj.intake[1, int(reached[1]):].sum() == 0
@@ -0,0 +1,29 @@
+import shutil
+
+import pandas as pd
+
+from growth_model import MODEL_CONFIG, TARGET, load_or_train
+from growth_training import TRAINING_CONFIG, ingest_trials
+
+PARAMS = {"n_estimators": 5, "max_depth": 4}
+
+
+def test_ingest_appends_new_rows_and_grows_the_forest(tmp_path):
+    dataset, models = str(tmp_path / "trials.csv"), str(tmp_path / "models")
+    shutil.copy(MODEL_CONFIG["dataset"], dataset)
+    with open(dataset, "rb") as f:
+        original = f.read()
+    base = load_or_train(dataset, params=PARAMS, directory=models)
+    existing = pd.read_csv(dataset)
+    new = existing.head(5).assign(**{TARGET: existing[TARGET].head(5) + 1.5})
+    bad = existing.head(1).assign(Animal_Type="Goat")
+    report = ingest_trials(pd.concat([new, existing.tail(2), bad]), dataset, models, params=PARAMS)
+    assert (report["added"], report["duplicates"], len(report["rejected"])) == (5, 2, 1)
+    assert report["mode"] == "warm_start" and report["trees"] == PARAMS["n_estimators"] + TRAINING_CONFIG["grow_trees"]
+    with open(dataset, "rb") as f:
+        assert f.read().startswith(original)
+    assert report["rows"] == len(existing) + 5
+    updated = load_or_train(dataset, params=PARAMS, directory=models)
+    assert updated.key == report["key"] != base.key
+    assert "loaded_from" in updated.meta   # saved by the ingest, not retrained on load
+    assert ingest_trials(new, dataset, models, params=PARAMS)["added"] == 0
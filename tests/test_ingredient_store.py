@@ -0,0 +1,28 @@
+import os
+import shutil
+import stat
+
+import pandas as pd
+
+from ingredient_store import IngredientStore
+
+
+def _store(tmp_path, mode):
+    csv = tmp_path / "rabbit_ingredients.csv"
+    shutil.copy("rabbit_ingredients.csv", csv)
+    os.chmod(csv, mode)
+    return IngredientStore(str(tmp_path / "store.sqlite3"), {"Rabbit": str(csv)}), csv
+
+
+def test_save_keeps_csv_mode(tmp_path):
+    store, csv = _store(tmp_path, 0o644)
+    frame = store.load("Rabbit")
+    frame.loc[0, "Cost"] += 1
+    assert store.save("Rabbit", frame) == 2
+    assert stat.S_IMODE(os.stat(csv).st_mode) == 0o644
+    assert pd.read_csv(csv).loc[0, "Cost"] == frame.loc[0, "Cost"]
+
+
+def test_save_unchanged_is_not_a_version(tmp_path):
+    store, _ = _store(tmp_path, 0o644)
+    assert store.save("Rabbit", store.load("Rabbit")) == 1
@@ -0,0 +1,38 @@
+import pandas as pd
+import pytest
+
+from formulation_engine import IngredientMatrix, NutrientTargets, formulate, load_composition
+from mill_planner import ProductOrder, plan_production
+
+
+@pytest.fixture
+def orders():
+    composition = load_composition()
+    rabbit = IngredientMatrix.from_frame(pd.read_csv("rabbit_ingredients.csv"), composition=composition)
+    poultry = IngredientMatrix.from_frame(pd.read_csv("poultry_ingredients.csv"), composition=composition)
+    return [ProductOrder("Rabbit", rabbit, NutrientTargets(minimum={"CP": 17, "Energy": 2500}), 10.0),
+            ProductOrder("Broiler", poultry, NutrientTargets(minimum={"CP": 21, "Energy": 3000}), 20.0)]
+
+
+def test_unlimited_stock_matches_separate_formulas(orders):
+    plan = plan_production(orders)
+    assert plan.optimal
+    separate = sum(formulate(o.matrix, o.targets).cost_per_kg * o.tonnes * 1000 for o in orders)
+    assert plan.total_cost == pytest.approx(separate, rel=1e-7)
+
+
+def test_shared_stock_is_never_overdrawn(orders):
+    free = plan_production(orders)
+    shared = set(orders[0].matrix.ingredients) & set(orders[1].matrix.ingredients)
+    used = free.inventory().set_index("Ingredient")["Used (t)"]
+    name = used[used.index.isin(shared)].idxmax()
+    plan = plan_production(orders, stock={name: used[name] / 2})
+    assert plan.optimal
+    drawn = sum(q[o.matrix.ingredients.index(name)] for o, q in zip(plan.orders, plan.quantities))
+    assert drawn <= used[name] / 2 + 1e-6
+    assert plan.total_cost > free.total_cost
+    assert plan.stock_duals[name] > 0
+    for order, qty in zip(plan.orders, plan.quantities):
+        assert qty.sum() == pytest.approx(order.tonnes)
+        levels = order.matrix.values @ qty / order.tonnes
+        assert levels[order.matrix.nutrients.index("CP")] >= order.targets.minimum["CP"] - 1e-6
@@ -0,0 +1,35 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+import mixer_batch
+from formulation_engine import IngredientMatrix, NutrientTargets, _result, load_composition
+from mixer_batch import BatchSheet, batch_sheet
+
+
+def _matrix():
+    return IngredientMatrix.from_frame(pd.read_csv("rabbit_ingredients.csv"), composition=load_composition())
+
+
+def test_fallbacks_share_the_time_limit(monkeypatch):
+    limits = []
+
+    def infeasible(matrix, targets, capacity, packs, weigh_kg, solver, time_limit, mip_gap=None):
+        limits.append(time_limit)
+        time.sleep(0.3)
+        return BatchSheet(_result(matrix, "Infeasible", np.zeros(matrix.size), 0.0, None, {}), capacity, packs,
+                          np.zeros(matrix.size), weigh_kg)
+
+    monkeypatch.setattr(mixer_batch, "_solve_batch", infeasible)
+    sheet = batch_sheet(_matrix(), NutrientTargets(minimum={"CP": 17}), 500, time_limit=0.5)
+    assert sheet.status == "Infeasible"
+    assert len(limits) == 2
+    assert limits[0] <= 0.5 and limits[1] <= 0.5 - 0.3
+
+
+def test_sheet_carries_the_exact_formula_cost():
+    sheet = batch_sheet(_matrix(), NutrientTargets(minimum={"CP": 17, "Energy": 2500}), 500)
+    assert sheet.optimal
+    assert sheet.result.cost_per_kg >= sheet.lp_cost_per_kg > 0
+    assert np.isclose(sheet.kg.sum(), 500)
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from formulation_engine import IngredientMatrix, load_composition, load_rules
+from phase_planner import PROGRAMS, plan_phases
+
+
+class SteadyGain:
+    """50 g/day whatever the diet: the cheapest programme is then the cheapest feed per day."""
+
+    def predict(self, X):
+        return np.full(len(X), 50.0)
+
+
+@pytest.fixture(scope="module")
+def plan():
+    matrix = IngredientMatrix.from_frame(pd.read_csv("poultry_ingredients.csv"), composition=load_composition())
+    return plan_phases(SteadyGain(), matrix, "Poultry", PROGRAMS["Poultry"]["Broiler"], 1, 0.2, 2.0,
+                       rules=load_rules(), workers=1)
+
+
+def test_best_programme_is_ranked_first_and_reaches_market_weight(plan):
+    assert plan.feasible
+    costs = plan.schedules["Feed Cost to Market (₦)"]
+    assert costs.dropna().is_monotonic_increasing
+    assert plan.best["Days to Market"] == np.ceil((2.0 - 0.2) / 0.05)
+    assert plan.best["Feed Cost to Market (₦)"] <= plan.nominal()["Feed Cost to Market (₦)"]
+    used = [plan.best[f"{p.stage} Formula"] for p in plan.phases]
+    assert all(f == "Lean" for f in used if f != "—")   # growth ignores the diet, so the cheapest feed wins
+
+
+def test_programme_table_adds_up_to_the_schedule(plan):
+    table, trajectory = plan.programme(SteadyGain())
+    assert table["Days"].sum() == plan.best["Days to Market"]
+    assert table["Feed Cost (₦)"].sum() == pytest.approx(plan.best["Feed Cost to Market (₦)"])
+    assert trajectory.weight[0, -1] >= 2.0
+
+
+def test_threaded_chunks_match_serial(plan):
+    matrix = IngredientMatrix.from_frame(pd.read_csv("poultry_ingredients.csv"), composition=load_composition())
+    threaded = plan_phases(SteadyGain(), matrix, "Poultry", PROGRAMS["Poultry"]["Broiler"], 1, 0.2, 2.0,
+                           rules=load_rules(), workers=4)
+    pd.testing.assert_frame_equal(threaded.schedules, plan.schedules)
@@ -0,0 +1,21 @@
+import pandas as pd
+import pytest
+
+from formulation_engine import IngredientMatrix, formulate, load_composition
+from ingredient_store import CATALOGUES
+from reference_data import STAGE_NUTRIENTS, get_nutrient_requirements, parse_range, stage_targets
+
+
+@pytest.mark.parametrize("species", list(CATALOGUES))
+def test_every_stage_range_is_enforced(species):
+    matrix = IngredientMatrix.from_frame(pd.read_csv(CATALOGUES[species]), composition=load_composition())
+    for stage, stage_data in get_nutrient_requirements()[species].items():
+        targets = stage_targets(stage_data)
+        ranged = {STAGE_NUTRIENTS[k]: parse_range(v) for k, v in stage_data.items()
+                  if STAGE_NUTRIENTS.get(k) not in (None, "CP", "Energy", "Fiber")}
+        assert all(targets.minimum[n] == lo and targets.maximum[n] == hi for n, (lo, hi) in ranged.items())
+        result = formulate(matrix, targets)
+        assert result.optimal, stage
+        levels = result.nutrient_levels
+        for n in targets.nutrients:
+            assert targets.minimum.get(n, -1e9) - 1e-6 <= levels[n] <= targets.maximum.get(n, 1e9) + 1e-6, (stage, n)
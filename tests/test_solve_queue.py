@@ -0,0 +1,25 @@
+import os
+
+import pandas as pd
+
+from formulation_engine import IngredientMatrix, NutrientTargets, formulate, load_composition
+from solve_queue import SolveQueue
+
+
+def _crash(*_args, **_kwargs):
+    os._exit(1)
+
+
+def test_queue_recovers_from_a_crashed_worker():
+    matrix = IngredientMatrix.from_frame(pd.read_csv("rabbit_ingredients.csv"), composition=load_composition())
+    queue = SolveQueue(workers=1)
+    try:
+        crashed = queue.submit(matrix, NutrientTargets(minimum={"CP": 16}), solve=_crash)
+        assert queue.wait(crashed, timeout=60)
+        assert queue.status(crashed)["state"] == "Failed"
+        job = queue.submit(matrix, NutrientTargets(minimum={"CP": 17}), solve=formulate)
+        queue.wait(job, timeout=60)
+        result, _ = queue.result(job)
+        assert result.optimal
+    finally:
+        queue._executor.shutdown(cancel_futures=True)